@@ -0,0 +1,154 @@
+"""
+Puente entre el broker local (control a latencia de LAN) y HiveMQ Cloud.
+
+En modo "bridge" el servidor atiende las órdenes en el broker de la Raspberry Pi y este
+puente, con un segundo cliente conectado a la nube, hace dos cosas:
+
+  - hacia la nube: reenvía un subconjunto de la telemetría local. Cada topic tiene un
+    intervalo mínimo; entre dos envíos solo se guarda el último mensaje (los intermedios
+    se descartan), así la nube recibe p. ej. un estado cada 10 s aunque localmente se
+    publique cada 0.5 s. Intervalo 0 = reenvío inmediato (respuestas de registro).
+  - desde la nube: republica en el broker local las órdenes de los usuarios remotos
+    (thermial/+/cmd, registro, energysupply) y los pedidos de historial, que el servidor
+    atiende como cualquier otro.
+
+Los dos sentidos usan topics distintos, así un mensaje nunca vuelve a su origen.
+El cliente local se suscribe con retain-as-published (MQTTv5): los mensajes llegan a la
+nube con el mismo retain con que los publicó el servidor (estado, registro aceptado), así
+un suscriptor nuevo en la nube recibe el último valor igual que en modo cloud.
+
+    bridge = CloudBridge(cloud_client, local_client)
+    await asyncio.gather(core.run(LOCAL_HOST, 1883), bridge.run(HIVEMQ_HOST, 8883))
+"""
+
+import asyncio
+import logging
+import time
+
+import paho.mqtt.client as paho
+from paho.mqtt.subscribeoptions import SubscribeOptions
+
+from server_core import AsyncioHelper
+
+logger = logging.getLogger("mqtt")
+
+# {topic local: segundos mínimos entre envíos a la nube}
+DEFAULT_OUTBOUND = {
+    "thermial/status": 10.0,
+    "thermial/metrics": 60.0,
+    "thermial/schema": 0,
+    "thermial/register/response": 0,
+    "thermial/shutdown/confirm": 0,
+    "thermial/history/response": 0,
+}
+# Topics de la nube que se republican en el broker local
+DEFAULT_INBOUND = ("thermial/+/cmd", "thermial/register", "thermial/energysupply", "thermial/history/request")
+
+
+class CloudBridge:
+    """
+    Reenvía telemetría local a la nube (con límite de frecuencia) y órdenes de la nube al broker local.
+    """
+    def __init__(self, cloud_client, local_client, outbound=None, inbound=DEFAULT_INBOUND):
+        """
+        :param cloud_client: cliente paho configurado para la nube (TLS, usuario)
+        :param local_client: cliente paho del servidor (el de ServerCore)
+        :param outbound: {topic: intervalo mínimo en s}; por defecto DEFAULT_OUTBOUND
+        :param inbound: topics (con comodines) que se traen desde la nube
+        """
+        self.cloud = cloud_client
+        self.local = local_client
+        self.outbound = dict(DEFAULT_OUTBOUND if outbound is None else outbound)
+        self.inbound = tuple(inbound)
+        self.latest = {}  # {topic: (payload, qos, retain)} esperando su turno
+        self.sent_at = {}  # {topic: monotonic del último envío}
+        self.stats = {'forwarded': 0, 'conflated': 0, 'inbound': 0, 'bytes_out': 0}
+
+        for topic in self.outbound:
+            self.local.message_callback_add(topic, self.on_local_message)
+        self._chain_on_connect(self.local, self._subscribe_local)
+        self._chain_on_connect(self.cloud, lambda client: [client.subscribe(t, qos=1) for t in self.inbound])
+        self.cloud.on_message = self.on_cloud_message
+
+    def _subscribe_local(self, client):
+        if client.protocol == paho.MQTTv5:
+            # Sin retainAsPublished el broker entrega retain=False en todo mensaje en vivo
+            options = SubscribeOptions(qos=1, retainAsPublished=True)
+            client.subscribe([(topic, options) for topic in self.outbound])
+        else:
+            for topic in self.outbound:
+                client.subscribe(topic, qos=1)
+
+    @staticmethod
+    def _chain_on_connect(client, subscribe):
+        # Se agrega la suscripción del puente sin reemplazar el on_connect que ya tenga el cliente
+        previous = client.on_connect
+
+        def on_connect(client, userdata, flags, rc, properties=None):
+            if previous is not None:
+                previous(client, userdata, flags, rc, properties)
+            if rc == 0:
+                subscribe(client)
+        client.on_connect = on_connect
+
+    # --- Local → nube ---
+    def on_local_message(self, client, userdata, msg):
+        interval = self.outbound.get(msg.topic, 0)
+        if not interval:
+            self._send(msg.topic, msg.payload, msg.qos, msg.retain)
+            return
+        if msg.topic in self.latest:
+            self.stats['conflated'] += 1
+        self.latest[msg.topic] = (msg.payload, msg.qos, msg.retain)
+        self.flush(msg.topic)
+
+    def flush(self, topic=None):
+        """Envía lo pendiente cuyo intervalo mínimo ya se cumplió."""
+        now = time.monotonic()
+        for name in ([topic] if topic else list(self.latest)):
+            if name not in self.latest:
+                continue
+            if now - self.sent_at.get(name, float("-inf")) < self.outbound.get(name, 0):
+                continue
+            payload, qos, retain = self.latest.pop(name)
+            self._send(name, payload, qos, retain)
+
+    def _send(self, topic, payload, qos, retain):
+        self.cloud.publish(topic, payload=payload, qos=qos, retain=retain)
+        self.sent_at[topic] = time.monotonic()
+        self.stats['forwarded'] += 1
+        self.stats['bytes_out'] += len(payload)
+
+    # --- Nube → local ---
+    def on_cloud_message(self, client, userdata, msg):
+        self.stats['inbound'] += 1
+        self.local.publish(msg.topic, payload=msg.payload, qos=msg.qos)
+
+    def get_stats(self):
+        return dict(self.stats, pending=sorted(self.latest))
+
+    async def run(self, host, port, keepalive=60):
+        """
+        Conecta el cliente de la nube y envía lo pendiente cada segundo hasta que se cancele.
+        Si la nube no responde se reintenta sin afectar al control local: la conexión
+        (TCP + TLS) corre en otro hilo (AsyncioHelper.connect).
+        """
+        helper = AsyncioHelper(asyncio.get_running_loop(), self.cloud)
+        delay = 1
+        while True:
+            try:
+                await helper.connect(host, port, keepalive)
+                break
+            except OSError as e:
+                logger.error(f"Cloud broker unreachable ({e}), retrying in {delay} s")
+                await asyncio.sleep(delay)
+                delay = min(helper.reconnect_max, delay * 2)
+        try:
+            while True:
+                await asyncio.sleep(1)
+                if self.cloud.is_connected():
+                    self.flush()
+        finally:
+            if helper.misc is not None:
+                helper.misc.cancel()
+            self.cloud.disconnect()
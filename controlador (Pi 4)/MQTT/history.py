@@ -0,0 +1,173 @@
+"""
+Historial reciente del estado en el servidor, servido por MQTT ya reducido.
+
+ServerCore guarda una muestra del estado MQTT cada interval segundos en un ColumnarLog
+(un día a 1 Hz son ~86 400 filas de float32, ~8 MB) y descarta lo más antiguo pasado
+max_samples. Un cliente (p. ej. el dashboard) pide una ventana en REQUEST_TOPIC y recibe
+cada serie reducida a `points` puntos (analysis.downsample, mínimo/máximo por tramo o
+LTTB), así un día entero llega en unos pocos kB y se dibuja sin trabajo en el navegador,
+sin perder el encendido de un calentador.
+
+Pedido (JSON):   {"request_id": "a1", "fields": ["heater1/temp_out", "pump1/flow"],
+                  "since": 1760000000, "until": null, "points": 800, "method": "minmax"}
+Respuesta (JSON en RESPONSE_TOPIC):
+                 {"request_id": "a1", "samples": 86400, "method": "minmax",
+                  "fields": {"heater1/temp_out": {"t": [epoch s, ...], "v": [..., null, ...]}}}
+
+Los campos son <módulo>/<campo> del estado MQTT (update_status_dict_mqtt); sin
+"fields" se devuelven todos. Un pedido no válido recibe {"request_id": ..., "error": ...}.
+
+La reducción de un día entero tarda del orden de un segundo en la Raspberry Pi, así que
+corre en un hilo propio (no el del bus ni el event loop) sobre una vista del log
+(ColumnarLog.snapshot); la respuesta se publica desde el event loop.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from data_store import ColumnarLog
+
+# El paquete analysis está en controlador (Pi 4), al lado de custom code
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis.downsample import downsample_indices, METHODS
+
+logger = logging.getLogger("mqtt")
+
+REQUEST_TOPIC = "thermial/history/request"
+RESPONSE_TOPIC = "thermial/history/response"
+MAX_POINTS = 2000  # tope de puntos por serie que puede pedir un cliente
+
+
+def mqtt_fields(registry):
+    """Campos del historial según el registro de dispositivos: ['pump1/duty', 'pump1/flow', ...]."""
+    return [f"{spec.name}/{channel.mqtt}" for spec in registry for channel in spec.channels if channel.mqtt]
+
+
+class History:
+    """Ventana móvil del estado, con pedidos por MQTT (ver módulo)."""
+    def __init__(self, client, fields, interval=1.0, max_samples=86400, points=800):
+        """
+        :param client: cliente paho del servidor (el de ServerCore)
+        :param fields: campos '<módulo>/<campo>' a guardar (ver mqtt_fields)
+        :param interval: s mínimos entre muestras
+        :param max_samples: muestras guardadas; las más antiguas se descartan
+        :param points: puntos por serie si el pedido no dice otra cosa
+        """
+        self.client = client
+        self.fields = tuple(fields)
+        self.interval = interval
+        self.max_samples = max_samples
+        self.points = points
+        self.log = ColumnarLog(self.fields, chunk_size=3600)
+        self.last_epoch = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+        self.stats = {'requests': 0, 'points_sent': 0, 'bytes_sent': 0, 'invalid': 0}
+
+        self.client.message_callback_add(REQUEST_TOPIC, self.on_request)
+        previous = client.on_connect
+
+        def on_connect(client, userdata, flags, rc, properties=None):
+            if previous is not None:
+                previous(client, userdata, flags, rc, properties)
+            if rc == 0:
+                client.subscribe(REQUEST_TOPIC, qos=1)
+        client.on_connect = on_connect
+
+    def record(self, data, epoch):
+        """
+        Guarda una muestra del estado MQTT si pasó interval desde la anterior.
+        :param data: dict de update_status_dict_mqtt ({módulo: {campo: valor}})
+        :param epoch: instante del barrido (Snapshot.timestamp)
+        """
+        if self.last_epoch is not None and epoch - self.last_epoch < self.interval:
+            return False
+        values = {}
+        for name in self.fields:
+            device, field = name.split("/", 1)
+            module = data.get(device)
+            if isinstance(module, dict) and isinstance(module.get(field), (int, float)):
+                values[name] = module[field]
+        self.log.append(values, epoch=epoch)
+        self.log.trim(self.max_samples)
+        self.last_epoch = epoch
+        return True
+
+    def query(self, fields=None, since=None, until=None, points=None, method="minmax", log=None):
+        """
+        Series de la ventana [since, until] reducidas a points puntos.
+        :param log: ColumnarLog a leer (por defecto el historial; ver on_request)
+        :return: {'samples': n, 'method': method, 'fields': {campo: {'t': [...], 'v': [...]}}}
+        """
+        log = log or self.log
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}'")
+        fields = list(fields or self.fields)
+        unknown = [name for name in fields if name not in log.index]
+        if unknown:
+            raise ValueError(f"Unknown history fields: {unknown}")
+        points = self.points if points is None else int(points)
+        if points < 2:
+            raise ValueError(f"points has to be at least 2, got {points}")
+        points = min(points, MAX_POINTS)
+
+        epochs = log.epochs()
+        start = 0 if since is None else int(np.searchsorted(epochs, round(since * 1000), side="left"))
+        stop = len(epochs) if until is None else int(np.searchsorted(epochs, round(until * 1000), side="right"))
+        epochs = epochs[start:stop]
+        series = {}
+        for name in fields:
+            values = log.column(name)[start:stop].astype(np.float64)
+            idx = downsample_indices(epochs, values, points, method)
+            series[name] = {
+                't': (epochs[idx] / 1000).tolist(),
+                'v': [None if np.isnan(v) else round(float(v), log.decimals) for v in values[idx]],
+            }
+        return {'samples': len(epochs), 'method': method, 'fields': series}
+
+    def answer(self, request, log=None):
+        """
+        Respuesta a un pedido ya decodificado; nunca lanza: un error va en la respuesta.
+        :param log: vista del historial (ColumnarLog.snapshot) si corre en otro hilo
+        """
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("history request has to be a JSON object")
+            return self.query(request.get("fields"), request.get("since"), request.get("until"),
+                              request.get("points"), request.get("method", "minmax"), log=log)
+        except Exception as e:
+            return {'error': f"{type(e).__name__}: {e}"}
+
+    def on_request(self, client, userdata, msg):
+        try:
+            request = json.loads(msg.payload.decode())
+        except Exception as e:  # JSON o UTF-8 no válidos
+            self.publish(None, {'error': f"{type(e).__name__}: {e}"})
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # cliente con su propio hilo de red (loop_start): responder aquí
+            self.publish(request, self.answer(request))
+            return
+        future = loop.run_in_executor(self.executor, self.answer, request, self.log.snapshot())
+        future.add_done_callback(lambda f: f.cancelled() or self.publish(request, f.result()))
+
+    def publish(self, request, response):
+        """Publica la respuesta (desde el event loop) y cuenta el pedido."""
+        response['request_id'] = request.get("request_id") if isinstance(request, dict) else None
+        if 'error' in response:
+            self.stats['invalid'] += 1
+            logger.warning(f"Invalid history request: {response['error']}")
+        payload = json.dumps(response, separators=(',', ':'))
+        self.client.publish(RESPONSE_TOPIC, payload=payload, qos=1)
+        self.stats['requests'] += 1
+        self.stats['points_sent'] += sum(len(s['v']) for s in response.get('fields', {}).values())
+        self.stats['bytes_sent'] += len(payload)
+
+    def get_stats(self):
+        return dict(self.stats, samples=len(self.log), memory=self.log.memory_summary())
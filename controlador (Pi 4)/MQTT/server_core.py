@@ -0,0 +1,398 @@
+"""
+Núcleo asyncio del servidor MQTT de Thermial.
+
+Antes, on_message ejecutaba las órdenes (escrituras I2C con esperas) en el hilo de red
+de paho mientras el hilo principal barría el bus con update_status_dict_mqtt(). Aquí todo
+corre en un solo event loop, con tareas separadas:
+
+  - MQTT I/O: el socket de paho integrado en el event loop (AsyncioHelper)
+  - dispatch: procesa los mensajes recibidos (registro, validación, órdenes)
+  - acquire: barrido periódico y publicación del estado (con un DeltaPublisher, barrido
+    cada publisher.interval y solo los dispositivos que cambiaron; ver status_publisher)
+  - housekeeping: timeout del usuario registrado
+  - history (opcional): el estado de cada barrido va a una ventana móvil que se sirve
+    reducida por thermial/history/request (ver history.History)
+  - bus owner: ÚNICA tarea que toca el bus; ejecuta en orden de prioridad los trabajos
+    de la cola (stop, luego órdenes, luego barridos) en un solo hilo, así una orden espera
+    como mucho el trabajo en curso y un barrido nunca se cruza con una escritura.
+
+Las órdenes se agrupan por actuador (thermial/pump1/cmd, valve2, ...): si llega un valor
+nuevo mientras el anterior sigue en la cola, lo reemplaza (gana el último) en vez de
+ejecutar cada valor intermedio de un slider. stop y energysupply van antes que todo y
+descartan las órdenes pendientes.
+
+    core = ServerCore(loop, client, STATUS_TOPIC, METRICS_TOPIC, status_interval=60)
+    asyncio.run(core.run(BROKER_HOST, BROKER_PORT))
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paho.mqtt.client as paho
+
+from metrics import Histogram
+import telemetry_codec
+
+logger = logging.getLogger("mqtt")
+
+# Prioridades de la cola del bus (menor = antes)
+PRIORITY_STOP = 0
+PRIORITY_COMMAND = 1
+PRIORITY_ACQUISITION = 2
+
+# Órdenes de apagado: prioridad absoluta, descartan los valores pendientes
+STOP_KEYS = ("stop", "energysupply")
+
+
+class AsyncioHelper:
+    """
+    Conecta el socket del cliente paho al event loop (en vez de client.loop_start()):
+    lecturas/escrituras con add_reader/add_writer y loop_misc() una vez por segundo.
+    Si la conexión se cae, reintenta reconnect() con espera creciente.
+
+    connect()/reconnect() bloquean hasta el timeout de TCP y el handshake TLS, así que
+    corren en un hilo aparte; los callbacks de socket que paho llama desde ese hilo se
+    pasan al event loop con call_soon_threadsafe.
+    """
+    def __init__(self, loop, client, reconnect_max=60):
+        self.loop = loop
+        self.client = client
+        self.reconnect_max = reconnect_max
+        self.misc = None
+        self._thread = threading.get_ident()  # hilo del event loop
+        self._fds = {}  # {socket: fd}; al cerrarse el socket ya no tiene fileno()
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def _in_loop(self, func, *args):
+        if threading.get_ident() == self._thread:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+    async def connect(self, host, port, keepalive=60):
+        """client.connect() en un hilo aparte; los errores (OSError) se propagan."""
+        await self.loop.run_in_executor(None, self.client.connect, host, port, keepalive)
+
+    def on_socket_open(self, client, userdata, sock):
+        self._fds[sock] = sock.fileno()
+        self._in_loop(self._open, client, self._fds[sock])
+
+    def _open(self, client, fd):
+        self.loop.add_reader(fd, client.loop_read)
+        if self.misc is None or self.misc.done():
+            self.misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        fd = self._fds.pop(sock, None)
+        if fd is not None:
+            self._in_loop(self.loop.remove_reader, fd)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        fd = self._fds.get(sock)
+        if fd is not None:
+            self._in_loop(self.loop.add_writer, fd, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        fd = self._fds.get(sock)
+        if fd is not None:
+            self._in_loop(self.loop.remove_writer, fd)
+
+    async def misc_loop(self):
+        delay = 1
+        while True:
+            if self.client.loop_misc() == paho.MQTT_ERR_SUCCESS:
+                delay = 1
+                await asyncio.sleep(1)
+                continue
+            logger.warning(f"MQTT connection lost, reconnecting in {delay} s")
+            await asyncio.sleep(delay)
+            delay = min(self.reconnect_max, delay * 2)
+            try:
+                await self.loop.run_in_executor(None, self.client.reconnect)
+            except OSError as e:
+                logger.error(f"MQTT reconnect failed: {e}")
+
+
+class BusOwner:
+    """
+    Dueño del bus I2C: una cola de prioridad y un solo hilo que ejecuta los trabajos
+    (las llamadas a Loop bloquean con time.sleep, por eso no corren en el event loop).
+    """
+    def __init__(self):
+        self.queue = asyncio.PriorityQueue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bus")
+        self._order = itertools.count()  # mismo orden de llegada dentro de una prioridad
+        self.busy_since = None
+
+    def submit(self, priority, func, *args):
+        """Encola func(*args); devuelve un asyncio.Future con el resultado."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((priority, next(self._order), func, args, future))
+        return future
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, func, args, future = await self.queue.get()
+            if future.cancelled():
+                continue
+            self.busy_since = time.monotonic()
+            try:
+                result = await loop.run_in_executor(self.executor, func, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.busy_since = None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class PendingCommand:
+    """Última orden recibida para un actuador que todavía no se ejecuta."""
+    def __init__(self, func, args, received):
+        self.func = func
+        self.args = args
+        self.received = received  # monotonic de la orden que se va a aplicar
+        self.future = None
+
+
+class ServerCore:
+    """
+    Servidor MQTT sobre asyncio para un ServerLoop (ver módulo).
+    """
+    def __init__(self, loop, client, status_topic, metrics_topic=None, status_interval=60.0,
+                 timeout_interval=5.0, publisher=None, encoding="json", bridge=None, history=None,
+                 stop_on=None):
+        """
+        :param loop: ServerLoop; sus órdenes de actuadores pasan por la cola del bus (loop.actuate)
+        :param client: cliente paho ya configurado (TLS, usuario, on_connect)
+        :param status_interval: segundos entre publicaciones del estado completo (keyframe)
+        :param timeout_interval: segundos entre revisiones del timeout del usuario
+        :param publisher: DeltaPublisher opcional para publicar por dispositivo entre keyframes
+        :param encoding: 'json' o 'binary' para el estado y las métricas (ver telemetry_codec)
+        :param bridge: CloudBridge del modo bridge (solo para sus estadísticas)
+        :param history: history.History opcional; guarda el estado de los barridos
+        :param stop_on: módulos cuya falla apaga la planta (loop.stop); la de los demás solo
+                        se publica (quality por módulo y errors). None = cualquier módulo
+        """
+        if encoding not in ("json", "binary"):
+            raise ValueError(f"Unknown status encoding: {encoding}")
+        self.loop = loop
+        self.client = client
+        self.status_topic = status_topic
+        self.metrics_topic = metrics_topic
+        self.status_interval = status_interval
+        self.timeout_interval = timeout_interval
+        self.publisher = publisher
+        self.encoding = encoding
+        self.bridge = bridge
+        self.history = history
+        self.stop_on = None if stop_on is None else frozenset(stop_on)
+        self.bus = None
+        self.inbox = None
+        self.error_reported = False
+        self.pending = {}  # {actuador: PendingCommand}
+        self.pending_lock = threading.Lock()  # el hilo del bus saca de pending al ejecutar
+        self.command_latency = Histogram()  # s desde que llegó la orden hasta que quedó aplicada
+        self.commands = {'received': 0, 'applied': 0, 'coalesced': 0, 'dropped': 0, 'failed': 0}
+
+    # --- Órdenes ---
+    def actuate(self, key, func, *args):
+        """
+        Reemplaza ServerLoop.actuate: encola la orden en el bus sin bloquear el dispatch.
+        :param key: actuador ('pump1', 'valve2', ...); una orden pendiente del mismo
+                    actuador se reemplaza. 'stop'/'energysupply' descartan las pendientes.
+        :return: asyncio.Future que termina cuando la orden (o la que la reemplazó) se aplicó
+        """
+        now = time.monotonic()
+        self.commands['received'] += 1
+        with self.pending_lock:
+            if key in STOP_KEYS:
+                for other, command in list(self.pending.items()):
+                    if other not in STOP_KEYS:
+                        command.future.cancel()
+                        del self.pending[other]
+            command = self.pending.get(key)
+            if command is not None:
+                command.func, command.args, command.received = func, args, now
+                self.commands['coalesced'] += 1
+                return command.future
+            command = self.pending[key] = PendingCommand(func, args, now)
+        priority = PRIORITY_STOP if key in STOP_KEYS else PRIORITY_COMMAND
+        command.future = self.bus.submit(priority, self._apply, key)
+        command.future.add_done_callback(lambda f: self._command_done(f, key))
+        return command.future
+
+    def _apply(self, key):
+        # Hilo del bus: toma el último valor y desde aquí ya no se puede reemplazar
+        with self.pending_lock:
+            command = self.pending.pop(key, None)
+        if command is None:  # descartada por un stop después de salir de la cola
+            return None
+        command.func(*command.args)
+        return time.monotonic() - command.received
+
+    def _command_done(self, future, key):
+        if future.cancelled():
+            self.commands['dropped'] += 1
+        elif future.exception() is not None:
+            self.commands['failed'] += 1
+            logger.error(f"Command {key} failed: {future.exception()}")
+        elif future.result() is not None:
+            self.commands['applied'] += 1
+            self.command_latency.record(future.result())
+
+    # --- Codificación ---
+    def encode_status(self, data):
+        if self.encoding == "binary":
+            return telemetry_codec.encode_status(data)
+        return json.dumps(data)
+
+    def encode_metrics(self, metrics):
+        if self.encoding == "binary":
+            return telemetry_codec.encode_metrics(metrics)
+        return json.dumps(metrics)
+
+    # --- Tareas ---
+    def on_message(self, client, userdata, msg):
+        # Corre en el event loop (AsyncioHelper): solo encola, el dispatch lo procesa
+        self.inbox.put_nowait(msg)
+
+    async def dispatch(self):
+        while True:
+            msg = await self.inbox.get()
+            try:
+                self.loop.on_message(self.client, None, msg)
+            except Exception as e:
+                logger.error(f"Error handling message on {msg.topic}: {e}")
+
+    async def acquire(self):
+        """
+        Barrido + publicación del estado completo cada status_interval (mismo flujo que el
+        antiguo main). Con publisher, se barre cada publisher.interval y entre keyframes solo
+        se publican los dispositivos que cambiaron; un cambio de ACTIVE/ERROR fuerza keyframe.
+        """
+        loop = self.loop
+        interval = self.publisher.interval if self.publisher else self.status_interval
+        last_keyframe = None
+        if self.encoding == "binary":
+            self.client.publish(telemetry_codec.SCHEMA_TOPIC, payload=json.dumps(telemetry_codec.schema()),
+                                qos=1, retain=True)
+        while True:
+            started = time.monotonic()
+            status_ok, data = await self.bus.submit(PRIORITY_ACQUISITION, loop.update_status_dict_mqtt,
+                                                    interval / 2)
+            now = time.monotonic()
+            keyframe = last_keyframe is None or now - last_keyframe >= self.status_interval
+
+            if status_ok == False and self.safety_failure():
+                if loop.status != "ERROR":
+                    keyframe = True
+                loop.status = "ERROR"
+                if not self.error_reported:
+                    logger.error(f"Error detected, {loop.errors.get('error_type')} "
+                                 f"(modules: {', '.join(loop.errors.get('modules', ())) or '-'}), stopping actuators")
+                    await self.actuate("stop", loop.stop)
+                    self.error_reported = True
+                # Se siguen publicando las lecturas de los módulos sanos (quality por módulo)
+                payload = {"status": "ERROR", "errors": loop.errors}
+                if loop.last_snapshot is not None:
+                    payload = dict(data, **payload)
+                if keyframe:
+                    self.client.publish(self.status_topic, payload=self.encode_status(payload), qos=1, retain=True)
+
+            else:
+                if loop.status == "ERROR":
+                    # Los actuadores quedan apagados hasta que el usuario los vuelva a mandar
+                    logger.info("Error cleared, safety-relevant modules responding again")
+                    loop.status = "ACTIVE"
+                    self.error_reported = False
+                    keyframe = True
+                data["status"] = loop.status
+                data["active_user"] = loop.active_user
+                if loop.errors:
+                    # Módulo fuera de stop_on (aislado o fallando): la planta sigue, quality lo marca
+                    data["errors"] = loop.errors
+                if keyframe:
+                    logger.debug(f"Publishing status: {data}\n")
+                    self.client.publish(self.status_topic, payload=self.encode_status(data), qos=1, retain=True)
+                    if self.metrics_topic:
+                        metrics = await self.bus.submit(PRIORITY_ACQUISITION, loop.get_metrics)
+                        metrics['server'] = self.get_stats()
+                        self.client.publish(self.metrics_topic, payload=self.encode_metrics(metrics), qos=0, retain=True)
+
+            if self.publisher and loop.last_snapshot is not None:
+                self.publisher.publish(data, keyframe, devices=loop.last_snapshot.values)
+            if self.history and loop.last_snapshot is not None:
+                self.history.record(data, loop.last_snapshot.timestamp)
+            if keyframe:
+                last_keyframe = now
+            await asyncio.sleep(max(0.0, started + interval - time.monotonic()))
+
+    def safety_failure(self):
+        """True si falló un módulo de stop_on en el último barrido (o no hay ninguna foto)."""
+        snapshot = self.loop.last_snapshot
+        if snapshot is None or self.stop_on is None:
+            return True
+        return not self.stop_on.isdisjoint(snapshot.errors)
+
+    async def housekeeping(self):
+        while True:
+            self.loop.check_user_timeout()
+            await asyncio.sleep(self.timeout_interval)
+
+    def get_stats(self):
+        """Profundidad de las colas, contadores de órdenes y latencia orden→aplicada."""
+        return {
+            'bus_queue_depth': self.bus.depth if self.bus else 0,
+            'inbox_depth': self.inbox.qsize() if self.inbox else 0,
+            'pending_commands': sorted(self.pending),
+            'commands': dict(self.commands),
+            'command_latency': self.command_latency.as_dict(),
+            'delta_status': self.publisher.get_stats() if self.publisher else None,
+            'cloud_bridge': self.bridge.get_stats() if self.bridge else None,
+            'history': self.history.get_stats() if self.history else None,
+        }
+
+    def start(self):
+        """Crea cola, bus owner y tareas en el event loop actual (sin conectar a MQTT)."""
+        self.bus = BusOwner()
+        self.inbox = asyncio.Queue()
+        self.loop.actuate = self.actuate
+        self.loop.status = "ACTIVE"
+        return [asyncio.create_task(coro) for coro in
+                (self.bus.run(), self.dispatch(), self.acquire(), self.housekeeping())]
+
+    async def run(self, host, port, keepalive=60):
+        """Conecta el cliente al broker y corre todas las tareas hasta que se cancelen."""
+        helper = AsyncioHelper(asyncio.get_running_loop(), self.client)
+        self.client.on_message = self.on_message
+        tasks = self.start()
+        await helper.connect(host, port, keepalive)
+        print("Running Loop. Publishing Status.")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if helper.misc is not None:
+                helper.misc.cancel()
+            self.client.disconnect()
+            self.bus.shutdown()
@@ -13,22 +13,32 @@ conflictos entre múltiples instancias que intenten escribir sobre el hardware.
 
 Conexión MQTT:
 
-Se conecta a un broker MQTT (BROKER_HOST / BROKER_PORT).
+Se conecta a un broker MQTT según MQTT_MODE (o --mode):
+  - cloud: HiveMQ Cloud por TLS (BROKER_HOST_HIVEMQ / BROKER_PORT_HIVEMQ)
+  - local: el broker de la LAN (BROKER_HOST_LOCAL / BROKER_PORT_LOCAL), sin nube
+  - bridge: las órdenes se atienden en el broker local (latencia de LAN) y
+    cloud_bridge.CloudBridge reenvía a HiveMQ el estado y las métricas con un
+    intervalo mínimo (CLOUD_STATUS_INTERVAL / CLOUD_METRICS_INTERVAL) y trae de
+    vuelta las órdenes de los usuarios remotos.
 
 Se suscribe al topic wildcard thermial/+/cmd para recibir comandos dirigidos
 a cualquier módulo (p. ej. thermial/pump1/cmd).
 
 Publica periódicamente el estado completo del lazo en thermial/status como
 JSON (retain=True, qos=1) para que nuevos suscriptores obtengan el último valor.
+Entre esos estados completos barre cada DELTA_INTERVAL y publica en
+thermial/status/<módulo> solo los módulos cuyos valores cambiaron más que su
+banda muerta (status_publisher.DeltaPublisher).
 
 Despacho de comandos:
 
 Cuando llega un mensaje en thermial/<module>/cmd, se extrae <module> y
 el payload y se llama a handle_command(module, payload).
 
-handle_command mapea módulos a métodos de la instancia Loop, validando
-el payload (se espera entero) y ejecutando la acción correspondiente
-(p. ej. set_potencia_bomba, set_potencia_calentador, abrir/cerrar válvula, etc.).
+handle_command valida el payload (se espera entero) y busca <module> en la
+tabla de órdenes del registro de dispositivos (commands en custom code/devices.toml),
+que dice qué método de Loop llamar (p. ej. valve2 -> set_valve(2, valor)). Un
+módulo nuevo en devices.toml se puede controlar sin tocar este archivo.
 
 Logging:
 
@@ -38,19 +48,33 @@ Ajusta la verbosidad cambiando logger.setLevel(...) (DEBUG, INFO, WARNING).
 
 Robustez y cierre:
 
-client.loop_start() corre el cliente MQTT en background.
+ServerCore (server_core.py) corre en un event loop asyncio la red MQTT, el despacho
+de comandos y el barrido periódico; solo una tarea usa el bus I2C, con las órdenes
+antes que los barridos, así un comando nunca se cruza con una lectura.
 
-Al recibir KeyboardInterrupt se detiene el loop MQTT y se llama a loop.stop()
+Al recibir KeyboardInterrupt se desconecta el cliente MQTT y se llama a loop.stop()
 para dejar el sistema en un estado seguro (actuadores en 0 / válvulas cerradas).
 
 Parámetros y configuración
 
-BROKER_HOST : dirección IP o hostname del broker MQTT (por defecto: "192.168.2.73").
+MQTT_MODE : "cloud" (por defecto), "local" o "bridge"; se puede cambiar con --mode.
 
-BROKER_PORT : puerto del broker (por defecto: 1883).
+BROKER_HOST_LOCAL / BROKER_PORT_LOCAL : broker de la LAN (por defecto: "localhost", 1883;
+también --broker/--port).
+
+BROKER_HOST_HIVEMQ / BROKER_PORT_HIVEMQ : HiveMQ Cloud (puerto 8883, TLS).
 
 STATUS_TOPIC : topic donde se publica el JSON de estado (por defecto: "thermial/status").
 
+STATUS_INTERVAL / DELTA_INTERVAL : segundos entre estados completos y entre barridos
+con publicación por módulo (por defecto: 60 y 0.5; DELTA_INTERVAL = None lo desactiva).
+
+STATUS_ENCODING : "json" (por defecto) o "binary"; los clientes decodifican con
+telemetry_codec.decode(payload), que acepta ambos.
+
+METRICS_TOPIC : topic con las latencias por periférico/comando y por método, publicado
+junto con el estado (por defecto: "thermial/metrics").
+
 CMD_TOPIC_WC : wildcard para comandos (por defecto: "thermial/+/cmd").
 
 Requisitos
@@ -76,12 +100,15 @@ Maneja excepciones dentro de la clase Loop para evitar publicar datos inválidos
 
 Ejemplo de ejecución
 
-$ python3 this_script.py
+$ python3 this_script.py                  # MQTT_MODE
+$ python3 this_script.py --mode bridge    # control local + telemetría a la nube
 """
 
 import os
 import sys
 import time
+import argparse
+import asyncio
 import json
 import logging
 #import paho.mqtt.client as mqtt
@@ -96,6 +123,10 @@ parent_dir  = os.path.dirname(current_dir)
 sys.path.append(os.path.join(parent_dir, 'custom code'))
 
 from thermial_error_handling import Loop as BaseLoop
+from server_core import ServerCore
+from status_publisher import DeltaPublisher
+from cloud_bridge import CloudBridge
+from history import History, mqtt_fields
 
 class ServerLoop(BaseLoop):
     def __init__(self, *args, **kwargs):
@@ -110,6 +141,14 @@ class ServerLoop(BaseLoop):
         print("[ServerLoop] Error handling active")
         print("[ServerLoop] User registration system active")
 
+    def actuate(self, key, func, *args):
+        """
+        Ejecuta una orden de actuador. ServerCore la reemplaza para encolarla en la tarea
+        dueña del bus, así on_message nunca bloquea ni se cruza con un barrido.
+        :param key: actuador ('pump1', 'valve2', 'stop', ...); ServerCore agrupa por key
+        """
+        return func(*args)
+
     def register_user(self, user_id, client):
         #registers a new client or denies access, when someone else is already registered
         if self.active_user is not None and self.active_user != user_id:
@@ -143,19 +182,15 @@ class ServerLoop(BaseLoop):
             logger.info(f"User '{user_id}' inactive, control released")
             #stops all actuators when user logs out
             logger.info("Stopping all actuators for safety.")
-            self.set_power_pump(1, 0)
-            self.set_power_pump(2, 0)
-            self.set_power_heater1(0)
-            self.set_power_heater2(0)
-            self.set_power_radiator1(0)
-            self.set_close_valve(1)
-            self.set_close_valve(2)
-            logger.info("All actuators stopped.")
-
-            # <<< confirm Shutdown
-            client.publish("thermial/shutdown/confirm", json.dumps({"status": "confirmed", "user_id": user_id}), qos=1)
-            logger.info("✓ Shutdown confirmation sent to client")
-            
+            done = self.actuate("stop", self.stop)
+            logger.info("Stop issued for all actuators.")
+
+            # <<< confirm Shutdown, solo cuando el stop ya se aplicó sin errores
+            if isinstance(done, asyncio.Future):
+                done.add_done_callback(lambda future: self.confirm_shutdown(future, user_id, client))
+            else:
+                self.confirm_shutdown(None, user_id, client)  # sin ServerCore el stop ya se ejecutó
+
             self.active_user = None
             self.last_activity = None
 
@@ -171,6 +206,18 @@ class ServerLoop(BaseLoop):
             logger.warning(f"Unregister denied for '{user_id}': Not the active user.")
             return False
 
+    def confirm_shutdown(self, future, user_id, client):
+        """
+        Publica thermial/shutdown/confirm cuando el stop terminó bien.
+        :param future: el de actuate("stop", ...) (None si se ejecutó directamente)
+        """
+        if future is not None and (future.cancelled() or future.exception() is not None):
+            reason = "cancelled" if future.cancelled() else future.exception()
+            logger.error(f"Stop failed ({reason}), shutdown NOT confirmed to '{user_id}'")
+            return
+        client.publish("thermial/shutdown/confirm", json.dumps({"status": "confirmed", "user_id": user_id}), qos=1)
+        logger.info("✓ Shutdown confirmation sent to client")
+
     def check_user_timeout(self):
         #checks if current user is inactive for a long time and logs out -> timeout
         if self.active_user and self.last_activity:
@@ -205,7 +252,7 @@ class ServerLoop(BaseLoop):
                 elif action == "unregister":
                     ok = self.unregister_user(user_id, client)
                     if ok:
-                        logger.info("User unregistered, actuators stopped safely.")
+                        logger.info("User unregistered, stop of all actuators requested.")
                     else: 
                         logger.warning("Unregister ignored: wrong user.")
                 else:
@@ -218,13 +265,15 @@ class ServerLoop(BaseLoop):
         # *******************************************************************#
         if topic == "thermial/energysupply":
             logger.critical(f"HARDWARE SHUTDWON COMMANS SEND: {payload}")
+            # Antes de cortar la energía: actuadores a 0, antes que cualquier orden pendiente
+            self.actuate("energysupply", self.stop)
             return
         # *******************************************************************#
 
         # 2) Befehls-Topics (thermial/+/cmd)
         if "/cmd" in topic:
-            # Prüfe ob Loop Fehler hat
-            if self.errors:
+            # Prüfe ob die Anlage wegen eines Fehlers gestoppt ist (ServerCore, stop_on)
+            if self.status == "ERROR":
                 logger.warning(f"Loop error active, ignoring command {payload}")
                 return
             
@@ -275,55 +324,46 @@ class ServerLoop(BaseLoop):
             logger.warning(f"Invalid payload for module '{module}': '{payload}' (expected integer)")
             return
         
-        if self.errors:
+        if self.status == "ERROR":
             logger.error(f"System stopped due to errors: {self.errors}")
-            self.stop()
+            self.actuate("stop", self.stop)
             return
         
 
-        if module.startswith("pump"):
-            num = int(module[-1])
-            logger.debug(f"Pump command received for pump{num} with value {val}")
-            logger.info(f"Set pump {num} to {val}% via MQTT (User: {self.active_user})")
-            self.set_power_pump(num, val) 
-
-        elif module == "heater1":
-            logger.debug(f"Heater1 command: set power to {val} (User: {self.active_user})")
-            self.set_power_heater1(val)
-
-        elif module == "heater2":
-            logger.debug(f"Heater2 command: set power to {val} (User: {self.active_user})")
-            self.set_power_heater2(val)
-
-        elif module.startswith("valve"):
-            num = int(module[-1])
-            logger.debug(f"Valve command received for valve{num}, payload={val} (User: {self.active_user})")
-            if val:
-                logger.info(f"Open valve{num} via MQTT (User: {self.active_user})")
-                self.set_open_valve(num)
-            else:
-                logger.info(f"Close valve{num} via MQTT (User:{self.active_user})")
-                self.set_close_valve(num)
-
-        elif module == "radiator":
-            logger.debug(f"Radiator command: set power to {val} (User: {self.active_user})")
-            self.set_power_radiator1(val) 
-
-        elif module == "stop":
+        if module == "stop":
             logger.debug("Stop command received, shutting down the loop")
-            self.stop()
+            self.actuate("stop", self.stop)
+            return
 
-        else:
+        # thermial/<topic>/cmd -> Loop.<method>(*args, val), según los commands de devices.toml
+        command = self.registry.commands.get(module)
+        if command is None:
             logger.debug(f"No command found for module '{module}'")
             logger.warning(f"Unknown module in cmd: '{module}'")
+            return
+        args = ", ".join(str(arg) for arg in (*command.args, val))
+        logger.info(f"{module}: {command.method}({args}) via MQTT (User: {self.active_user})")
+        self.actuate(module, getattr(self, command.method), *command.args, val)
 
 # ——————————————————————————————————————————
 
-#BROKER_HOST  = "192.168.2.35"   # IP de tu Pi
+# "cloud": todo por HiveMQ Cloud (TLS) | "local": solo el broker de la LAN |
+# "bridge": control por el broker local + telemetría limitada a HiveMQ y órdenes remotas de vuelta
+MQTT_MODE = "cloud"
+BROKER_HOST_LOCAL = "localhost"   # broker (mosquitto) en la misma Pi; o su IP, p. ej. "192.168.2.35"
+BROKER_PORT_LOCAL = 1883
 BROKER_HOST_HIVEMQ = "96916c26427f41a395170e4ee96828c6.s1.eu.hivemq.cloud"
-#BROKER_PORT  = 1883
 BROKER_PORT_HIVEMQ = 8883
+CLOUD_STATUS_INTERVAL = 10   # s mínimos entre estados enviados a la nube en modo bridge
+CLOUD_METRICS_INTERVAL = 60
 STATUS_TOPIC = "thermial/status"
+STATUS_INTERVAL = 60         # s entre estados completos (keyframe) en STATUS_TOPIC
+DELTA_INTERVAL = 0.5         # s entre barridos; cambios por dispositivo en STATUS_TOPIC/<módulo> (None = desactivado)
+STATUS_ENCODING = "json"     # "binary": estado/métricas compactos (telemetry_codec; esquema en thermial/schema)
+METRICS_TOPIC = "thermial/metrics"  # latencias I2C / métodos (Loop.get_metrics)
+HISTORY_INTERVAL = 1.0       # s entre muestras del historial (thermial/history/request; None = sin historial)
+HISTORY_HOURS = 24           # horas que se guardan en memoria (~8 MB a 1 Hz)
+STOP_ON_ERROR = ("pump1", "pump2", "heater1", "heater2", "tank")  # su falla apaga la planta (caudal, temperatura y nivel de los calentadores); None = cualquiera
 CMD_TOPIC_WC = "thermial/+/cmd"  # wildcard para comandos
 REGISTER_TOPIC = "thermial/register" # topic for user ID request
 HIVEMQ_USER = "thermialServer"
@@ -338,10 +378,6 @@ logger.addHandler(handler)
 # Toggle verbosity here:
 logger.setLevel(logging.DEBUG)    # verbose: WARNING, INFO, DEBUG
 
-#crear un objeto server loop, que contiene el loop normal, que tenga el manejo de errores con metodos on_message y handle_command
-# 1) Crea UNA SOLA instancia de Loop
-loop = ServerLoop(verbose=False)
-
 # 2) Callbacks MQTT
 def on_connect(client, userdata, flags, rc, properties = None):
     if rc == 0:
@@ -353,61 +389,75 @@ def on_connect(client, userdata, flags, rc, properties = None):
         logger.error(f"Falló conexión MQTT, rc={rc}")
 
 
-# 4) Configura cliente MQTT y lo arranca
-#client = mqtt.Client(client_id="thermial_node", protocol=mqtt.MQTTv311)
-client = paho.Client(client_id="thermial_node", protocol=paho.MQTTv5)
-client.on_connect = on_connect
-# enable TLS for secure connection
-client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
-# set username and password
-client.username_pw_set(HIVEMQ_USER, HIVEMQ_PASS)
-# connect to HiveMQ Cloud on port 8883
-client.connect(BROKER_HOST_HIVEMQ, 8883)
-
-client.on_message = loop.on_message
-#client.connect(BROKER_HOST, BROKER_PORT, keepalive=60)
-
-client.loop_start()
-
-# 5) Bucle principal: publicar status cada X segundos
-try:
-    print("Running Loop. Publishing Status.")
-    loop.status = "ACTIVE"
-    error_reported = False
-
-    while True:
-        # Time Out check in the main loop
-        loop.check_user_timeout()
-
-
-        if loop.status == "ACTIVE":
-            status_ok, data = loop.update_status_dict_mqtt()
-            data["status"] = "ACTIVE"
-            data["active_user"] = loop.active_user # user info in status
-
-        if status_ok == False:
-            loop.status = "ERROR"
-            if not error_reported:
-                logger.error(f"Error detected, {loop.errors['error_type']}, stopping actuators")
-                loop.stop()
-            #MQTT continues, but without active actuators
-                payload = json.dumps({"status": "ERROR", "errors": loop.errors})
-                client.publish(STATUS_TOPIC, payload=payload, qos=1, retain=True)
-                error_reported = True
-            continue
+def cloud_client(client_id):
+    """Cliente paho para HiveMQ Cloud: TLS en 8883 con usuario y contraseña."""
+    client = paho.Client(client_id=client_id, protocol=paho.MQTTv5)
+    # enable TLS for secure connection
+    client.tls_set(tls_version=mqtt.client.ssl.PROTOCOL_TLS)
+    # set username and password
+    client.username_pw_set(HIVEMQ_USER, HIVEMQ_PASS)
+    return client
+
+
+async def serve(core, host, port, bridge=None):
+    """Corre el servidor y, en modo bridge, el puente a la nube en el mismo event loop."""
+    tasks = [core.run(host, port)]
+    if bridge is not None:
+        tasks.append(bridge.run(BROKER_HOST_HIVEMQ, BROKER_PORT_HIVEMQ))
+    await asyncio.gather(*tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Thermial MQTT server")
+    parser.add_argument("--mode", choices=["cloud", "local", "bridge"], default=MQTT_MODE,
+                        help="broker de control: HiveMQ Cloud, broker local, o local + puente a la nube")
+    parser.add_argument("--broker", default=BROKER_HOST_LOCAL, help="broker local (modos local y bridge)")
+    parser.add_argument("--port", type=int, default=BROKER_PORT_LOCAL)
+    args = parser.parse_args(argv)
+
+    #crear un objeto server loop, que contiene el loop normal, que tenga el manejo de errores con metodos on_message y handle_command
+    # 1) Crea UNA SOLA instancia de Loop
+    loop = ServerLoop(verbose=False)
+
+    # 4) Configura cliente MQTT (la conexión y el bucle de red los maneja ServerCore)
+    if args.mode == "cloud":
+        client = cloud_client("thermial_node")
+        host, port = BROKER_HOST_HIVEMQ, BROKER_PORT_HIVEMQ
+    else:
+        client = paho.Client(client_id="thermial_node", protocol=paho.MQTTv5)
+        host, port = args.broker, args.port
+    client.on_connect = on_connect
+
+    bridge = None
+    if args.mode == "bridge":
+        bridge = CloudBridge(cloud_client("thermial_bridge"), client, outbound={
+            STATUS_TOPIC: CLOUD_STATUS_INTERVAL,
+            METRICS_TOPIC: CLOUD_METRICS_INTERVAL,
+            "thermial/schema": 0,
+            "thermial/register/response": 0,
+            "thermial/shutdown/confirm": 0,
+            "thermial/history/response": 0,
+        })
+    logger.info(f"MQTT mode '{args.mode}': control via {host}:{port}"
+                + (f", telemetry bridged to {BROKER_HOST_HIVEMQ}" if bridge else ""))
+
+    # 5) Tareas asyncio: MQTT, despacho de órdenes, barrido/publicación y dueño del bus
+    publisher = DeltaPublisher(client, STATUS_TOPIC, interval=DELTA_INTERVAL) if DELTA_INTERVAL else None
+    history = History(client, mqtt_fields(loop.registry), interval=HISTORY_INTERVAL,
+                      max_samples=int(HISTORY_HOURS * 3600 / HISTORY_INTERVAL)) if HISTORY_INTERVAL else None
+    core = ServerCore(loop, client, STATUS_TOPIC, METRICS_TOPIC, status_interval=STATUS_INTERVAL,
+                      publisher=publisher, encoding=STATUS_ENCODING, bridge=bridge, history=history,
+                      stop_on=STOP_ON_ERROR)
+    try:
+        asyncio.run(serve(core, host, port, bridge))
+        
+    except KeyboardInterrupt:
+        print("Server detenido")
+        pass
+
+    finally:
+        loop.stop()  # apaga todos los actuadores de forma segura
 
-        else:
-            payload = json.dumps(data)
-            logger.debug(f"Publishing status: {payload}\n")
-            client.publish(STATUS_TOPIC, payload=payload, qos=1, retain=True)
 
-        time.sleep(60)  # publish interval
-        
-except KeyboardInterrupt:
-    print("Server detenido")
-    pass
-
-finally:
-    client.loop_stop()
-    client.disconnect()
-    loop.stop()  # apaga todos los actuadores de forma segura
\ No newline at end of file
+if __name__ == "__main__":
+    main()
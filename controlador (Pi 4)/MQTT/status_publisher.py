@@ -0,0 +1,103 @@
+"""
+Publicación del estado por dispositivo, solo cuando cambia.
+
+El estado completo (update_status_dict_mqtt) cada 60 s es muy lento para controlar en
+lazo cerrado, y publicarlo entero cada 0.5 s gasta ancho de banda en valores que no
+cambian. DeltaPublisher publica cada dispositivo en su subtopic
+
+    thermial/status/pump1   {"timestamp", "version", "duty", "flow", "quality"}
+
+solo cuando algún valor se movió más que su banda muerta respecto a lo último publicado
+(un texto, None o quality distinto siempre cuenta), y en cada keyframe publica todos los
+dispositivos para que un suscriptor nuevo o que perdió mensajes quede al día. El JSON
+completo en thermial/status lo sigue publicando ServerCore como keyframe.
+
+    publisher = DeltaPublisher(client, STATUS_TOPIC, interval=0.5)
+    core = ServerCore(loop, client, STATUS_TOPIC, publisher=publisher)
+"""
+
+import json
+import logging
+
+logger = logging.getLogger("mqtt")
+
+# Banda muerta por prefijo del campo (unidades del estado MQTT); 0 = cualquier cambio
+DEFAULT_DEADBANDS = {
+    'temp': 0.1,    # °C
+    'flow': 0.05,   # L/min
+    'level': 0.2,   # cm
+    'power': 0.5,   # W
+    'duty': 0,      # %
+}
+
+
+class DeltaPublisher:
+    """
+    Publica en <base_topic>/<dispositivo> los dispositivos cuyo estado cambió.
+    """
+    def __init__(self, client, base_topic, interval=0.5, deadbands=None, qos=0, retain=True):
+        """
+        :param client: cliente paho (solo se usa publish)
+        :param base_topic: p. ej. 'thermial/status'
+        :param interval: segundos entre barridos cuando ServerCore usa este publicador
+        :param deadbands: {prefijo de campo: banda}; se combinan con DEFAULT_DEADBANDS
+        """
+        self.client = client
+        self.base_topic = base_topic.rstrip("/")
+        self.interval = interval
+        self.deadbands = dict(DEFAULT_DEADBANDS, **(deadbands or {}))
+        self.qos = qos
+        self.retain = retain
+        self.published = {}  # {dispositivo: dict publicado la última vez}
+        self.stats = {'messages': 0, 'bytes': 0, 'suppressed': 0, 'keyframes': 0}
+
+    def deadband(self, field):
+        for prefix, band in self.deadbands.items():
+            if field.startswith(prefix):
+                return band
+        return 0
+
+    def changed(self, previous, current):
+        """True si algún campo de current difiere de previous más que su banda muerta."""
+        if previous is None or previous.keys() != current.keys():
+            return True
+        for field, value in current.items():
+            old = previous[field]
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) \
+                    and not isinstance(value, bool):
+                if abs(value - old) > self.deadband(field):
+                    return True
+            elif value != old:
+                return True
+        return False
+
+    def publish(self, data, keyframe=False, devices=None):
+        """
+        :param data: dict de update_status_dict_mqtt
+        :param keyframe: publicar todos los dispositivos aunque no hayan cambiado
+        :param devices: nombres de los dispositivos (por defecto, las claves con un dict)
+        :return: dispositivos publicados
+        """
+        sent = []
+        header = {'timestamp': data.get('timestamp'), 'version': data.get('version')}
+        if devices is None:
+            devices = [name for name, values in data.items() if isinstance(values, dict)]
+        for device in devices:
+            values = data[device]
+            if not keyframe and not self.changed(self.published.get(device), values):
+                self.stats['suppressed'] += 1
+                continue
+            payload = json.dumps(dict(header, **values))
+            self.client.publish(f"{self.base_topic}/{device}", payload=payload, qos=self.qos, retain=self.retain)
+            self.published[device] = dict(values)
+            self.stats['messages'] += 1
+            self.stats['bytes'] += len(payload)
+            sent.append(device)
+        if keyframe:
+            self.stats['keyframes'] += 1
+        if sent:
+            logger.debug(f"Delta status: {', '.join(sent)}")
+        return sent
+
+    def get_stats(self):
+        return dict(self.stats, interval_s=self.interval)
@@ -0,0 +1,211 @@
+"""
+Codificación compacta de la telemetría MQTT (opcional) y su decodificador para clientes.
+
+El estado en JSON ocupa ~670 bytes por mensaje (claves largas y anidadas, sobre TLS a
+HiveMQ Cloud). Con STATUS_ENCODING = "binary" el servidor publica thermial/status con
+un registro de largo fijo (~50 bytes, struct little-endian) y thermial/metrics como JSON
+compacto comprimido con zlib. Los dos llevan un byte de versión del esquema; el esquema
+mismo se publica retenido en SCHEMA_TOPIC para que un cliente pueda comprobarlo.
+
+Estado (SCHEMA_VERSION 1):
+
+    cabecera  '<2sBBIIH'  magic b'TS', versión del esquema, código de estado (STATUSES),
+                          versión de la foto, epoch (s), calidad por módulo (2 bits c/u,
+                          en el orden de DEVICES: 0 good, 1 stale, 2 missing)
+    campos    FIELDS en orden; entero escalado (valor * escala); el máximo del tipo
+              (0xFF, 0xFFFF) o -32768 = None
+    anexo     opcional: '<H' + JSON con active_user, errors y last_good si hay alguno
+
+Métricas: b'TM' + versión + zlib(JSON sin espacios).
+
+En un cliente (copiar este archivo junto al script):
+
+    import telemetry_codec
+    data = telemetry_codec.decode(msg.payload)   # también acepta JSON
+"""
+
+import json
+import struct
+import zlib
+from datetime import datetime
+from functools import lru_cache
+
+SCHEMA_VERSION = 1
+SCHEMA_TOPIC = "thermial/schema"
+
+STATUS_MAGIC = b"TS"
+METRICS_MAGIC = b"TM"
+HEADER = struct.Struct("<2sBBIIH")
+EXTRA = struct.Struct("<H")
+
+STATUSES = ("IDLE", "ACTIVE", "ERROR")
+QUALITIES = ("good", "stale", "missing")
+DEVICES = ("pump1", "pump2", "heater1", "heater2", "valves", "tank", "radiator1")
+
+# (módulo, campo, formato struct, escala)
+FIELDS = (
+    ("pump1", "duty", "B", 1),
+    ("pump1", "flow", "H", 100),
+    ("pump2", "duty", "B", 1),
+    ("pump2", "flow", "H", 100),
+    ("heater1", "duty", "B", 1),
+    ("heater1", "power", "H", 100),
+    ("heater1", "temp_in", "h", 100),
+    ("heater1", "temp_out", "h", 100),
+    ("heater2", "duty", "B", 1),
+    ("heater2", "power", "H", 100),
+    ("heater2", "temp_out", "h", 100),
+    ("valves", "valve1_state", "B", 1),
+    ("valves", "valve2_state", "B", 1),
+    ("valves", "flow_valve1_out", "H", 100),
+    ("valves", "flow_Valve2_out", "H", 100),
+    ("tank", "level", "H", 10),
+    ("tank", "temp_bottom", "h", 100),
+    ("tank", "temp_top", "h", 100),
+    ("radiator1", "duty", "B", 1),
+    ("radiator1", "temp_in", "h", 100),
+    ("radiator1", "temp_out", "h", 100),
+)
+BODY = struct.Struct("<" + "".join(fmt for _, _, fmt, _ in FIELDS))
+
+# Valor reservado para None y rango útil de cada formato
+_NONE = {"B": 0xFF, "H": 0xFFFF, "h": -0x8000}
+_RANGE = {"B": (0, 0xFE), "H": (0, 0xFFFE), "h": (-0x7FFF, 0x7FFF)}
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def schema():
+    """Descripción del formato (se publica retenida en SCHEMA_TOPIC)."""
+    return {
+        'version': SCHEMA_VERSION,
+        'status': {
+            'header': HEADER.format, 'body': BODY.format, 'size': HEADER.size + BODY.size,
+            'statuses': list(STATUSES), 'qualities': list(QUALITIES), 'devices': list(DEVICES),
+            'fields': [{'device': d, 'field': f, 'format': fmt, 'scale': s} for d, f, fmt, s in FIELDS],
+        },
+        'metrics': 'zlib-compressed JSON',
+    }
+
+
+# --- Estado ---
+# (módulo, campo, escala, valor None, mínimo, máximo) precalculado para encode/decode
+_PACK = tuple((device, field, scale, _NONE[fmt]) + _RANGE[fmt] for device, field, fmt, scale in FIELDS)
+_BY_DEVICE = tuple((device, tuple(p[1:] for p in _PACK if p[0] == device)) for device in DEVICES)
+
+
+@lru_cache(maxsize=8)
+def _parse_time(timestamp):
+    # strptime cuesta más que todo el resto de encode_status; la hora cambia una vez por segundo
+    return int(datetime.strptime(timestamp, TIME_FORMAT).timestamp())
+
+
+@lru_cache(maxsize=8)
+def _format_time(epoch):
+    return datetime.fromtimestamp(epoch).strftime(TIME_FORMAT)
+
+
+def _epoch(timestamp):
+    if isinstance(timestamp, str):
+        return _parse_time(timestamp)
+    return int(timestamp or 0)
+
+
+def encode_status(data):
+    """
+    :param data: dict de ServerCore (update_status_dict_mqtt + status, active_user, errors)
+    :return: bytes
+    """
+    qualities = 0
+    for i, device in enumerate(DEVICES):
+        module = data.get(device)
+        quality = module.get('quality', 'good') if isinstance(module, dict) else 'missing'
+        qualities |= QUALITIES.index(quality) << (2 * i)
+    status = data.get('status')
+    header = HEADER.pack(STATUS_MAGIC, SCHEMA_VERSION,
+                         STATUSES.index(status) if status in STATUSES else 0xFF,
+                         data.get('version') or 0, _epoch(data.get('timestamp')), qualities)
+    values = []
+    for device, fields in _BY_DEVICE:
+        module = data.get(device) or {}
+        for field, scale, none, low, high in fields:
+            value = module.get(field)
+            if value is None:
+                values.append(none)
+                continue
+            value = round(value * scale)
+            values.append(low if value < low else high if value > high else value)
+    body = BODY.pack(*values)
+
+    extra = {}
+    if data.get('active_user') is not None:
+        extra['active_user'] = data['active_user']
+    if data.get('errors'):
+        extra['errors'] = data['errors']
+    last_good = {device: data[device]['last_good'] for device in DEVICES
+                 if isinstance(data.get(device), dict) and 'last_good' in data[device]}
+    if last_good:
+        extra['last_good'] = last_good
+    if not extra:
+        return header + body
+    extra = json.dumps(extra, separators=(',', ':')).encode()
+    return header + body + EXTRA.pack(len(extra)) + extra
+
+
+def decode_status(payload):
+    """Inverso de encode_status: mismo dict que el estado JSON."""
+    magic, version, status, snapshot, epoch, qualities = HEADER.unpack_from(payload)
+    if magic != STATUS_MAGIC:
+        raise ValueError(f"Not a status record: {payload[:2]!r}")
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported status schema {version} (decoder is {SCHEMA_VERSION})")
+    values = BODY.unpack_from(payload, HEADER.size)
+    extra = {}
+    offset = HEADER.size + BODY.size
+    if len(payload) > offset:
+        (length,) = EXTRA.unpack_from(payload, offset)
+        extra = json.loads(payload[offset + EXTRA.size:offset + EXTRA.size + length])
+
+    data = {
+        'timestamp': _format_time(epoch) if epoch else None,
+        'version': snapshot,
+    }
+    for device in DEVICES:
+        data[device] = {}
+    for (device, field, scale, none, _, _), raw in zip(_PACK, values):
+        data[device][field] = None if raw == none else (raw if scale == 1 else raw / scale)
+    for i, device in enumerate(DEVICES):
+        quality = QUALITIES[(qualities >> (2 * i)) & 0b11]
+        data[device]['quality'] = quality
+        if device in extra.get('last_good', {}):
+            data[device]['last_good'] = extra['last_good'][device]
+    data['quality'] = 'good' if all(data[d]['quality'] == 'good' for d in DEVICES) else 'partial'
+    data['status'] = STATUSES[status] if status < len(STATUSES) else None
+    data['active_user'] = extra.get('active_user')
+    if 'errors' in extra:
+        data['errors'] = extra['errors']
+    return data
+
+
+# --- Métricas ---
+def encode_metrics(metrics):
+    body = json.dumps(metrics, separators=(',', ':')).encode()
+    return METRICS_MAGIC + bytes([SCHEMA_VERSION]) + zlib.compress(body)
+
+
+def decode_metrics(payload):
+    if payload[:2] != METRICS_MAGIC:
+        raise ValueError(f"Not a metrics record: {payload[:2]!r}")
+    if payload[2] != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported metrics schema {payload[2]} (decoder is {SCHEMA_VERSION})")
+    return json.loads(zlib.decompress(payload[3:]))
+
+
+def decode(payload):
+    """Decodifica cualquier mensaje de telemetría: binario (por su magic) o JSON."""
+    payload = bytes(payload)
+    if payload[:2] == STATUS_MAGIC:
+        return decode_status(payload)
+    if payload[:2] == METRICS_MAGIC:
+        return decode_metrics(payload)
+    return json.loads(payload.decode())
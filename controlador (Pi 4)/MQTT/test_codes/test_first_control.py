@@ -57,6 +57,7 @@ parser.add_argument("--valve-wait", default=20, type=int, help="Segundos a esper
 parser.add_argument("--username", default=None, help="Usuario MQTT (opcional)")
 parser.add_argument("--password", default=None, help="Password MQTT (opcional)")
 parser.add_argument("--client-id", default="thermial_simple_controller", help="Client ID MQTT")
+parser.add_argument("--delta", action="store_true", help="Suscribirse también a STATUS_TOPIC/<módulo> (cambios por módulo, sub-segundo)")
 args = parser.parse_args()
 
 BROKER_HOST = args.broker
@@ -117,6 +118,9 @@ def on_connect(client, userdata, flags, rc):
         logger.info(f"Conectado al broker MQTT {BROKER_HOST}:{BROKER_PORT} (rc={rc})")
         client.subscribe(STATUS_TOPIC, qos=1)
         logger.info(f"Suscrito a {STATUS_TOPIC}")
+        if args.delta:
+            client.subscribe(STATUS_TOPIC + "/+", qos=0)
+            logger.info(f"Suscrito a {STATUS_TOPIC}/+")
     else:
         logger.error(f"Fallo conexion MQTT, rc={rc}")
 
@@ -141,6 +145,19 @@ def on_message(client, userdata, msg):
             logger.debug(f"Status recibido a las {last_status_ts.isoformat()}")
         except Exception as e:
             logger.warning(f"No se pudo parsear JSON del status: {e}. Payload raw: {payload_bytes!r}")
+    elif args.delta and topic.startswith(STATUS_TOPIC + "/"):
+        # Cambio de un solo módulo: se mezcla en el último status completo
+        if last_status is None:
+            return
+        try:
+            module = topic[len(STATUS_TOPIC) + 1:]
+            last_status[module] = json.loads(payload)
+            last_status_ts = datetime.now()
+            prev_obs["valve1"] = read_valve_state_from_status(last_status, "valve1")
+            prev_obs["pump1"]  = read_pump1_state_from_status(last_status)
+            prev_obs["heater"] = read_heater_state_from_status(last_status)
+        except Exception as e:
+            logger.warning(f"No se pudo parsear JSON de {topic}: {e}")
     else:
         logger.debug(f"Mensaje en topic no esperado: {topic}")
 
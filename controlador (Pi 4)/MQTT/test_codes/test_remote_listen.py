@@ -13,9 +13,10 @@ Conexión: se conecta a un broker MQTT (definido en BROKER_HOST/BROKER_PORT).
 
 Suscripción: al conectarse, se suscribe al topic definido en STATUS_TOPIC.
 
-Recepción: cuando llega un mensaje en ese topic, intenta decodificar el payload
-como JSON y lo imprime formateado (indentado). Si el payload no es JSON,
-imprime el payload crudo y un aviso.
+Recepción: cuando llega un mensaje en ese topic, decodifica el payload (JSON o
+el formato binario de telemetry_codec, si el servidor usa STATUS_ENCODING = "binary")
+y lo imprime formateado (indentado). Si no se puede decodificar, imprime el payload
+crudo y un aviso.
 
 Ejecución continua: usa client.loop_forever() para mantener la conexión y
 reintentar la reconexión ante cortes.
@@ -51,8 +52,13 @@ Este script imprime con print(); para producción considera usar logging.
 """
 
 import json
+import os
+import sys
 import paho.mqtt.client as mqtt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import telemetry_codec
+
 # 1. Configura aquí la IP de tu Raspberry Pi
 BROKER_HOST = "192.168.2.35"   # Reemplaza con la IP real de tu Pi
 BROKER_PORT = 1883
@@ -69,11 +75,11 @@ def on_connect(client, userdata, flags, rc):
 
 def on_message(client, userdata, msg):
     try:
-        data = json.loads(msg.payload.decode())
-        print("Estado recibido:")
+        data = telemetry_codec.decode(msg.payload)
+        print(f"Estado recibido ({len(msg.payload)} bytes):")
         # formatea bonito el JSON
         print(json.dumps(data, indent=2, ensure_ascii=False))
-    except json.JSONDecodeError:
+    except (ValueError, UnicodeDecodeError):
         print(f"Mensaje no JSON en {msg.topic}: {msg.payload!r}")
 
 # 3. Inicializa el cliente MQTT
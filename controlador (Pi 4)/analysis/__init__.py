@@ -0,0 +1,18 @@
+"""
+Análisis de los ensayos guardados por Loop (custom code/thermial_error_handling.py).
+
+    from analysis import load_run, add_derived, plot_run
+
+    run = load_run("custom code/test_data")      # CSV o Parquet, uno o varios archivos
+    df = add_derived(run)                        # ΔT, Q = ṁ·cp·ΔT, eficiencia, energía del estanque
+    plot_run(run, "ensayo.png")
+
+Desde la línea de comandos (en controlador (Pi 4)):
+
+    $ python3 -m analysis "custom code/test_data" -o ensayo.png
+"""
+
+from .loader import RunLog, load_run
+from .derived import add_derived, thermal_power, efficiency, tank_energy
+from .plots import plot_run, PANELS
+from .downsample import downsample, downsample_indices
@@ -0,0 +1,24 @@
+import argparse
+import os
+
+from . import load_run, plot_run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m analysis", description="Gráfico de un ensayo del lazo")
+    parser.add_argument("path", nargs="+", help="archivos, carpeta o patrón de solarloop_test_*.csv/.parquet")
+    parser.add_argument("-o", "--output", help="imagen de salida (por defecto junto al primer archivo)")
+    parser.add_argument("--max-points", type=int, default=2000, help="puntos por curva (0 = todos)")
+    parser.add_argument("--method", choices=["minmax", "lttb"], default="minmax", help="reducción de puntos")
+    parser.add_argument("--show", action="store_true", help="abrir la ventana del gráfico")
+    args = parser.parse_args(argv)
+
+    run = load_run(args.path)
+    output = args.output or os.path.splitext(run.files[0])[0] + ".png"
+    plot_run(run, output, max_points=args.max_points or None, method=args.method,
+             show=args.show)
+    print(f"{len(run)} samples from {len(run.files)} file(s) -> {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Magnitudes derivadas de un ensayo, calculadas sobre columnas completas (NumPy/pandas).
+
+Lazo solar: la bomba 1 hace pasar el agua por el calentador 1 y luego por el
+calentador 2, así la entrada del calentador 2 es la salida del calentador 1. Lazo de
+proceso: la bomba 2 pasa el agua por el disipador. 1 L de agua = 1 kg.
+
+    Q = ṁ · cp · ΔT          ṁ = caudal (L/min) / 60   [kg/s]
+    η = Q / P_eléctrica       solo donde P_eléctrica >= min_power_w
+    E_estanque = V(nivel) · cp · (T_media - t_ref)
+
+Las muestras sin dato (módulo que no respondió) quedan en NaN.
+"""
+
+import numpy as np
+import pandas as pd
+
+CP = 4186.0                 # J/(kg K), agua (mismo valor que plant_sim)
+TANK_LITRES_PER_CM = 0.5    # 20 L en 40 cm de altura
+T_REF = 20.0                # °C, referencia del contenido de energía del estanque
+
+
+def _values(series):
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def mass_flow(flow_l_min):
+    """Caudal másico en kg/s."""
+    return _values(flow_l_min) / 60.0
+
+
+def thermal_power(flow_l_min, t_hot, t_cold, cp=CP):
+    """Potencia térmica ṁ·cp·(t_hot - t_cold) en W."""
+    return mass_flow(flow_l_min) * cp * (_values(t_hot) - _values(t_cold))
+
+
+def efficiency(thermal_w, electric_w, min_power_w=1.0):
+    """Q / P; NaN donde la potencia eléctrica es menor que min_power_w (calentador apagado)."""
+    thermal_w, electric_w = np.asarray(thermal_w, dtype=np.float64), _values(electric_w)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(electric_w >= min_power_w, thermal_w / electric_w, np.nan)
+
+
+def tank_energy(level_cm, t_bottom, t_top, t_ref=T_REF, litres_per_cm=TANK_LITRES_PER_CM, cp=CP):
+    """Energía del estanque sobre t_ref en Wh (temperatura media entre fondo y superficie)."""
+    mass = _values(level_cm) * litres_per_cm
+    return mass * cp * ((_values(t_bottom) + _values(t_top)) / 2 - t_ref) / 3600.0
+
+
+# {columna derivada: (columnas del log que necesita, función(df) -> array)}
+QUANTITIES = {
+    'dT_heater1_K': (
+        ('temp_heater1_out_°C', 'temp_heater1_in_°C'),
+        lambda df: _values(df['temp_heater1_out_°C']) - _values(df['temp_heater1_in_°C'])),
+    'dT_radiator1_K': (
+        ('temp_radiator1_in_°C', 'temp_radiator1_out_°C'),
+        lambda df: _values(df['temp_radiator1_in_°C']) - _values(df['temp_radiator1_out_°C'])),
+    'Q_heater1_W': (
+        ('flow_pump1_L/min', 'temp_heater1_out_°C', 'temp_heater1_in_°C'),
+        lambda df: thermal_power(df['flow_pump1_L/min'], df['temp_heater1_out_°C'], df['temp_heater1_in_°C'])),
+    'Q_heater2_W': (
+        ('flow_pump1_L/min', 'temp_heater2_out_°C', 'temp_heater1_out_°C'),
+        lambda df: thermal_power(df['flow_pump1_L/min'], df['temp_heater2_out_°C'], df['temp_heater1_out_°C'])),
+    'Q_radiator1_W': (
+        ('flow_pump2_L/min', 'temp_radiator1_in_°C', 'temp_radiator1_out_°C'),
+        lambda df: thermal_power(df['flow_pump2_L/min'], df['temp_radiator1_in_°C'], df['temp_radiator1_out_°C'])),
+    'eff_heater1': (
+        ('Q_heater1_W', 'power_heater1_W'),
+        lambda df: efficiency(df['Q_heater1_W'], df['power_heater1_W'])),
+    'eff_heater2': (
+        ('Q_heater2_W', 'power_heater2_W'),
+        lambda df: efficiency(df['Q_heater2_W'], df['power_heater2_W'])),
+    'E_tank_Wh': (
+        ('level_tank_cm', 'temp_tank_bottom_°C', 'temp_tank_top_°C'),
+        lambda df: tank_energy(df['level_tank_cm'], df['temp_tank_bottom_°C'], df['temp_tank_top_°C'])),
+}
+
+
+def _expand(names):
+    # names más las derivadas de las que dependen, en el orden de QUANTITIES
+    needed, pending = set(), list(names or QUANTITIES)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(column for column in QUANTITIES[name][0] if column in QUANTITIES)
+    return [name for name in QUANTITIES if name in needed]
+
+
+def inputs(names=None):
+    """Columnas del log que hacen falta para calcular names (por defecto todas las derivadas)."""
+    return list(dict.fromkeys(column for name in _expand(names) for column in QUANTITIES[name][0]
+                              if column not in QUANTITIES))
+
+
+def add_derived(data, names=None):
+    """
+    Agrega las columnas derivadas que se pueden calcular con las columnas disponibles.
+    :param data: RunLog (se leen solo las columnas necesarias) o DataFrame
+    :param names: columnas de QUANTITIES a calcular (por defecto todas)
+    :return: DataFrame con las columnas de entrada y las derivadas
+    """
+    df = data.load(inputs(names)) if hasattr(data, "load") else data.copy()
+    for name in _expand(names):
+        columns, func = QUANTITIES[name]
+        if all(column in df for column in columns):
+            df[name] = func(df)
+    return df
@@ -0,0 +1,111 @@
+"""
+Reducción de series largas a pocos puntos antes de dibujarlas o enviarlas (solo NumPy).
+
+Tomar una de cada n muestras pierde los transitorios (el encendido de un calentador, un
+pico de caudal) si caen entre dos muestras elegidas. Aquí se conservan:
+
+  - minmax: divide la serie en max_points/2 tramos de igual cantidad de muestras y
+    guarda el mínimo y el máximo de cada uno, en su orden. Ningún pico se pierde y con
+    ~2 puntos por píxel la curva se ve igual que con todas las muestras. Lo más rápido.
+  - lttb: Largest-Triangle-Three-Buckets (Steinarsson 2013): un punto por tramo, el que
+    forma el triángulo más grande con el punto elegido antes y el promedio del tramo
+    siguiente. Sigue mejor la forma de la curva con menos puntos.
+
+Los NaN (muestras sin dato) se conservan donde un tramo no tiene ningún valor, así la
+curva sigue mostrando el hueco.
+
+    idx = downsample_indices(t, y, 1000)         # posiciones elegidas, en orden
+    t_ds, y_ds = downsample(t, y, 1000, method="lttb")
+"""
+
+import numpy as np
+
+METHODS = ("minmax", "lttb")
+
+
+def _buckets(n, count):
+    # Bordes de count tramos de (casi) igual cantidad de muestras en [0, n)
+    return np.linspace(0, n, count + 1).astype(np.int64)
+
+
+def minmax_indices(y, max_points):
+    """Posiciones del mínimo y el máximo de cada tramo (max_points // 2 tramos)."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max(max_points, 2):  # también una serie vacía
+        return np.arange(n)
+    count = max(1, max_points // 2)
+    edges = _buckets(n, count)
+    starts = edges[:-1]
+    # Un tramo sin ningún valor queda con su primera muestra (NaN): el hueco se ve igual
+    low = np.minimum.reduceat(np.where(np.isnan(y), np.inf, y), starts)
+    high = np.maximum.reduceat(np.where(np.isnan(y), -np.inf, y), starts)
+    bucket = np.repeat(np.arange(count), np.diff(edges))
+    first_min = np.full(count, -1)
+    first_max = np.full(count, -1)
+    positions = np.arange(n)
+    # Primera posición de cada tramo donde y alcanza su mínimo / máximo (recorrido inverso: gana la primera)
+    is_min = y == low[bucket]
+    is_max = y == high[bucket]
+    first_min[bucket[is_min][::-1]] = positions[is_min][::-1]
+    first_max[bucket[is_max][::-1]] = positions[is_max][::-1]
+    empty = first_min < 0
+    first_min[empty] = starts[empty]
+    first_max[empty] = starts[empty]
+    return np.unique(np.concatenate([first_min, first_max]))
+
+
+def lttb_indices(x, y, max_points):
+    """Posiciones elegidas por Largest-Triangle-Three-Buckets (primera y última incluidas)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max(max_points, 2):  # también una serie vacía
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1])
+    edges = _buckets(n - 2, max_points - 2) + 1  # la primera y la última muestra van siempre
+    valid = ~np.isnan(y)
+    y0 = np.where(valid, y, 0.0)
+    # Suma acumulada para el promedio del tramo siguiente en O(1)
+    cx, cy, cn = (np.concatenate([[0.0], np.cumsum(v)]) for v in (np.where(valid, x, 0.0), y0, valid))
+    chosen = np.empty(max_points, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        nxt_start, nxt_stop = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        count = cn[nxt_stop] - cn[nxt_start]
+        if count:
+            avg_x = (cx[nxt_stop] - cx[nxt_start]) / count
+            avg_y = (cy[nxt_stop] - cy[nxt_start]) / count
+        else:
+            avg_x, avg_y = x[nxt_start], y0[a]
+        ax_, ay_ = x[a], y0[a]
+        area = np.abs((ax_ - avg_x) * (y[start:stop] - ay_) - (ax_ - x[start:stop]) * (avg_y - ay_))
+        area = np.where(np.isnan(area), -1.0, area)  # un tramo todo NaN elige su primera muestra
+        a = start + int(np.argmax(area))
+        chosen[i + 1] = a
+    return chosen
+
+
+def downsample_indices(x, y, max_points, method="minmax"):
+    """
+    :param x: instantes (números crecientes; epoch o posición)
+    :param y: valores (NaN = sin dato)
+    :param max_points: puntos máximos de salida (≈ ancho del gráfico en píxeles)
+    :param method: 'minmax' o 'lttb'
+    :return: posiciones elegidas, crecientes
+    """
+    if method == "minmax":
+        return minmax_indices(y, max_points)
+    if method == "lttb":
+        return lttb_indices(x, y, max_points)
+    raise ValueError(f"Unknown downsampling method '{method}' (use one of {METHODS})")
+
+
+def downsample(x, y, max_points, method="minmax"):
+    """(x, y) reducidos a como mucho max_points puntos (ver downsample_indices)."""
+    x, y = np.asarray(x), np.asarray(y)
+    idx = downsample_indices(x, y, max_points, method)
+    return x[idx], y[idx]
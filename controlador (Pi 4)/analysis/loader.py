@@ -0,0 +1,122 @@
+"""
+Carga de los ensayos guardados por Loop (export_to_csv o start_stream, CSV o Parquet).
+
+Un ensayo largo puede estar repartido en varios archivos (StreamWriter rota cada
+max_rows filas) y tener millones de filas; RunLog lee solo las columnas que se piden
+y las guarda para la próxima vez. En Parquet se lee solo esa columna del archivo; en
+CSV pandas recorre el archivo pero solo convierte las columnas pedidas.
+
+    run = load_run("test_data")                        # todos los solarloop_test_* de la carpeta
+    run = load_run("test_data/solarloop_test_20250717_*.parquet")
+    run["temp_heater1_in_°C"]                          # pd.Series con índice de tiempo
+    df = run.load(["flow_pump1_L/min", "level_tank_cm"])
+"""
+
+import glob
+import os
+
+import pandas as pd
+
+PREFIX = "solarloop_test"  # mismo prefijo que Loop.start_stream / export_to_csv
+TIME_COLUMN = "timestamp"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+CSV_OPTIONS = {'sep': ';', 'decimal': ',', 'encoding': 'utf-8-sig'}  # formato de export_to_csv
+EXTENSIONS = (".csv", ".parquet")
+
+
+def find_files(path):
+    """
+    :param path: archivo, carpeta (todos los PREFIX_*), patrón glob o lista de esos
+    :return: lista de archivos ordenada (los nombres llevan fecha y número de rotación)
+    """
+    if isinstance(path, (list, tuple)):
+        return [f for p in path for f in find_files(p)]
+    path = os.fspath(path)
+    if os.path.isdir(path):
+        files = [f for ext in EXTENSIONS for f in glob.glob(os.path.join(path, f"{PREFIX}_*{ext}"))]
+    elif glob.has_magic(path):
+        files = glob.glob(path)
+    elif os.path.exists(path):
+        files = [path]
+    else:
+        raise FileNotFoundError(path)
+    files = sorted(f for f in files if f.endswith(EXTENSIONS))
+    if not files:
+        raise FileNotFoundError(f"No {PREFIX} CSV/Parquet files in {path}")
+    return files
+
+
+class RunLog:
+    """Un ensayo (uno o varios archivos) leído por columnas a medida que se usan."""
+    def __init__(self, files):
+        """:param files: archivos del ensayo en orden, todos CSV o todos Parquet"""
+        self.files = list(files)
+        formats = {os.path.splitext(f)[1] for f in self.files}
+        if len(formats) != 1:
+            raise ValueError(f"Mixed file formats in one run: {sorted(formats)}")
+        self.fmt = formats.pop()[1:]
+        self._columns = None
+        self._cache = {}   # {columna: np.ndarray/pd.array} ya leídas
+        self._time = None  # pd.DatetimeIndex
+
+    @property
+    def columns(self):
+        """Columnas del ensayo (solo se lee la cabecera del primer archivo)."""
+        if self._columns is None:
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+
+                self._columns = tuple(pq.read_schema(self.files[0]).names)
+            else:
+                self._columns = tuple(pd.read_csv(self.files[0], nrows=0, **CSV_OPTIONS).columns)
+        return self._columns
+
+    def _read(self, columns):
+        # Lee columns de todos los archivos y las concatena
+        parts = []
+        for path in self.files:
+            if self.fmt == "parquet":
+                parts.append(pd.read_parquet(path, columns=list(columns)))
+            else:
+                parts.append(pd.read_csv(path, usecols=list(columns), **CSV_OPTIONS))
+        return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+    @property
+    def time(self):
+        """Instante de cada muestra (columna timestamp)."""
+        if self._time is None:
+            stamps = self._read([TIME_COLUMN])[TIME_COLUMN]
+            self._time = pd.DatetimeIndex(pd.to_datetime(stamps, format=TIME_FORMAT), name="time")
+        return self._time
+
+    def __len__(self):
+        return len(self.time)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def load(self, columns):
+        """
+        DataFrame con las columnas pedidas e índice de tiempo; las que no están en el
+        ensayo se ignoran (p. ej. heater2 en ensayos antiguos).
+        """
+        columns = [c for c in dict.fromkeys(columns) if c in self.columns and c != TIME_COLUMN]
+        missing = [c for c in columns if c not in self._cache]
+        if missing:
+            data = self._read(missing)
+            for name in missing:
+                self._cache[name] = data[name].to_numpy()
+        return pd.DataFrame({name: self._cache[name] for name in columns}, index=self.time)
+
+    def __getitem__(self, name):
+        if name not in self.columns:
+            raise KeyError(name)
+        return self.load([name])[name]
+
+
+def load_run(path):
+    """
+    :param path: ver find_files
+    :return: RunLog
+    """
+    return RunLog(find_files(path))
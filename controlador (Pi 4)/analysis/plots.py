@@ -0,0 +1,86 @@
+"""
+Gráficos de varios paneles de un ensayo, con el eje de tiempo compartido.
+
+Solo se leen las columnas que aparecen en PANELS (más las que necesitan las derivadas)
+y cada curva se reduce a max_points puntos antes de dibujar (downsample: mínimo y
+máximo por tramo, así el encendido de un calentador sigue viéndose): matplotlib tarda
+lo mismo con un ensayo de un millón de muestras que con uno de diez mil.
+"""
+
+import numpy as np
+
+from .derived import add_derived, QUANTITIES
+from .downsample import downsample_indices
+
+# (título, unidad, columnas); las que no están en el ensayo se omiten
+PANELS = (
+    ("Calentadores", "°C", ('temp_heater1_in_°C', 'temp_heater1_out_°C', 'temp_heater2_out_°C')),
+    ("Estanque y disipador", "°C", ('temp_tank_bottom_°C', 'temp_tank_top_°C',
+                                    'temp_radiator1_in_°C', 'temp_radiator1_out_°C')),
+    ("ΔT", "K", ('dT_heater1_K', 'dT_radiator1_K')),
+    ("Potencia", "W", ('power_heater1_W', 'power_heater2_W', 'Q_heater1_W', 'Q_heater2_W', 'Q_radiator1_W')),
+    ("Eficiencia calentadores", "-", ('eff_heater1', 'eff_heater2')),
+    ("Flujos", "L/min", ('flow_pump1_L/min', 'flow_pump2_L/min', 'flow_valve1_out_L/min', 'flow_valve2_out_L/min')),
+    ("Estanque", "Wh", ('E_tank_Wh',)),
+)
+MAX_POINTS = 2000  # puntos por curva; del orden del ancho de la figura en píxeles
+
+
+def decimate(series, max_points=MAX_POINTS, method="minmax"):
+    """
+    La serie reducida a como mucho max_points puntos, conservando picos (ver downsample).
+    :param method: 'minmax' o 'lttb'
+    """
+    if not max_points or len(series) <= max_points:
+        return series
+    x = series.index.asi8 if hasattr(series.index, "asi8") else np.arange(len(series))
+    return series.iloc[downsample_indices(x, series.to_numpy(dtype=np.float64), max_points, method)]
+
+
+def panel_data(run, panels=PANELS):
+    """DataFrame con las columnas de los paneles (leídas de run y derivadas)."""
+    wanted = [column for _, _, columns in panels for column in columns]
+    derived = [column for column in wanted if column in QUANTITIES]
+    df = add_derived(run, derived) if derived else run.load([])
+    raw = [column for column in wanted if column not in QUANTITIES and column not in df]
+    return df.join(run.load(raw)) if raw else df
+
+
+def plot_run(run, save_path=None, panels=PANELS, max_points=MAX_POINTS, method="minmax", title=None, show=False):
+    """
+    :param run: loader.RunLog (o DataFrame con índice de tiempo)
+    :param save_path: PNG/PDF de salida (None = no guardar)
+    :param max_points: puntos por curva (None = todas las muestras)
+    :param method: reducción de puntos, 'minmax' o 'lttb' (ver downsample)
+    :return: matplotlib Figure
+    """
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    df = panel_data(run, panels) if hasattr(run, "load") else run
+    panels = [(name, unit, [c for c in columns if c in df and df[c].notna().any()]) for name, unit, columns in panels]
+    panels = [panel for panel in panels if panel[2]]
+    if not panels:
+        raise ValueError("None of the plotted columns is in this run")
+
+    fig, axs = plt.subplots(len(panels), 1, figsize=(12, 2.4 * len(panels)), sharex=True, squeeze=False)
+    if title is None:
+        title = f"Ensayo {df.index[0]:%Y-%m-%d %H:%M}" if len(df) else "Ensayo"
+    fig.suptitle(title, fontsize=14)
+    for ax, (name, unit, columns) in zip(axs[:, 0], panels):
+        for column in columns:
+            series = decimate(df[column].astype("float64"), max_points, method)
+            ax.plot(series.index, series.to_numpy(), label=column, linewidth=1)
+        ax.set_title(name, fontsize=10, loc="left")
+        ax.set_ylabel(unit)
+        ax.grid(True, linestyle='--', alpha=0.6)
+        ax.legend(fontsize=8, loc="upper right")
+    axs[-1, 0].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+    plt.setp(axs[-1, 0].get_xticklabels(), rotation=30, ha='right')
+    fig.tight_layout(rect=[0, 0, 1, 0.97])
+
+    if save_path:
+        fig.savefig(save_path, dpi=150, bbox_inches='tight')
+    if show:
+        plt.show()
+    return fig
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de los caminos críticos del controlador, sobre el bus simulado (sim_bus).
+
+Mide:
+  - roundtrip: GET_ALL + lectura de un solo periférico, por dirección
+  - sweep: Loop.update_status() (barrido completo)
+  - append: Loop.append_to_data_log() y ColumnarLog.append() según el largo del log
+  - export: Loop.export_to_csv() a 10k/100k/1M muestras (tiempo, pico de memoria, tamaño)
+  - mqtt: ServerLoop.on_message() hasta que el firmware simulado tiene el nuevo valor
+    (camino síncrono, sin servidor)
+  - server_core: la orden por ServerCore (inbox, dispatch, cola del bus) con el barrido
+    periódico corriendo, hasta que el futuro de actuate() termina; más command_latency
+
+El resultado se guarda en JSON ({"meta", "metrics", "details"}). Con --baseline se compara
+cada métrica con una corrida anterior y el script termina con código 1 si alguna empeoró
+más que --tolerance, para detectar regresiones antes de instalar en el banco.
+
+    $ python3 run_benchmarks.py --quick
+    $ python3 run_benchmarks.py --baseline results/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+# ——————————————————————————————————————————
+# Ajuste de ruta para los módulos del controlador
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(parent_dir, 'custom code'))
+sys.path.append(os.path.join(parent_dir, 'MQTT'))
+
+import sim_bus
+
+SAMPLE_ROW = {
+    'power_pump1_%': 60, 'flow_pump1_L/min': 2.85,
+    'power_heater1_%': 100, 'power_heater1_W': 40.0, 'temp_heater1_in_°C': 24.31, 'temp_heater1_out_°C': 31.02,
+    'power_heater2_%': 100, 'power_heater2_W': 40.0, 'temp_heater2_out_°C': 37.4,
+    'valve1_state': 'open', 'flow_valve1_out_L/min': 2.8, 'valve2_state': 'closed', 'flow_valve2_out_L/min': 0.0,
+    'level_tank_cm': 5.1, 'temp_tank_bottom_°C': 24.3, 'temp_tank_top_°C': 29.8,
+    'power_pump2_%': 40, 'flow_pump2_L/min': 1.5,
+    'power_radiator1_%': 50, 'power_radiator1_W': 6.0, 'temp_radiator1_in_°C': 29.8, 'temp_radiator1_out_°C': 26.1,
+    'sweep_time_s': 0.004, 'tick_jitter_ms': 0.2, 'tick_overruns': 0, 'tick_skipped': 0,
+}
+
+
+def summarize(samples):
+    """Mediana, p95, media y máximo de una lista de tiempos en segundos, en ms."""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'n': len(ordered),
+        'p50_ms': round(statistics.median(ordered) * 1000, 4),
+        'p95_ms': round(p95 * 1000, 4),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 4),
+        'max_ms': round(ordered[-1] * 1000, 4),
+    }
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def fill_log(data_log, count, start=None):
+    """Llena un ColumnarLog con `count` muestras sintéticas, una por segundo."""
+    start = time.time() if start is None else start
+    for i in range(count):
+        data_log.append(SAMPLE_ROW, epoch=start + i)
+
+
+# --- Benchmarks ---
+def bench_roundtrip(loop, repeat, warmup):
+    results = {}
+    for name, device in loop.sweeper.devices.items():
+        timed(device.get_all, warmup)  # el turnaround se ajusta con las primeras lecturas
+        results[f"0x{device.address:02x}"] = dict(summarize(timed(device.get_all, repeat)), device=name)
+    return results
+
+
+def bench_sweep(loop, repeat, warmup):
+    full = lambda: loop.update_status(full=True)  # todos los módulos, sin poll_interval
+    timed(full, warmup)
+    return summarize(timed(full, repeat))
+
+
+def bench_append(loop, lengths, repeat, folder):
+    results = {}
+    for length in lengths:
+        loop.clear_data_log()
+        fill_log(loop.data_log, length)
+        loop.start_stream(folder)
+        full = timed(lambda: loop.append_to_data_log(folder), repeat)
+        store = timed(lambda: loop.data_log.append(SAMPLE_ROW), repeat)
+        results[str(length)] = {
+            'append_to_data_log': summarize(full),
+            'data_log_append': summarize(store),
+        }
+    loop.clear_data_log()
+    return results
+
+
+def bench_export(loop, sizes, folder):
+    results = {}
+    for size in sizes:
+        loop.clear_data_log()
+        fill_log(loop.data_log, size)
+        start = time.perf_counter()
+        path = loop.export_to_csv(folder)
+        elapsed = time.perf_counter() - start
+        file_size = os.path.getsize(path)
+        os.remove(path)
+
+        tracemalloc.start()
+        path = loop.export_to_csv(folder)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        os.remove(path)
+
+        results[str(size)] = {
+            'time_s': round(elapsed, 4),
+            'peak_mb': round(peak / 2**20, 2),
+            'file_mb': round(file_size / 2**20, 2),
+            'log_mb': round(loop.data_log.nbytes / 2**20, 2),
+        }
+    loop.clear_data_log()
+    return results
+
+
+class _Client:
+    """Cliente MQTT mínimo para llamar on_message sin broker: solo guarda lo publicado."""
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.published.append(topic)
+
+
+def _message(topic, payload):
+    return SimpleNamespace(topic=topic, payload=json.dumps(payload).encode())
+
+
+def _applied_checks(sim):
+    """{topic: applied(valor)}: True si el firmware simulado ya tiene el valor pedido."""
+    firmwares = sim.firmwares
+    return {
+        'pump1': lambda v: firmwares[0x10].power == v,
+        'heater1': lambda v: firmwares[0x11].power == v,
+        'radiator': lambda v: firmwares[0x15].power == v,
+        'valve1': lambda v: firmwares[0x12].relays[0] == (not v),  # abrir = relé LOW
+    }
+
+
+def _command_value(module, i):
+    return i % 2 if module.startswith("valve") else (i * 7) % 101
+
+
+def bench_mqtt(sim, repeat):
+    import server_with_user_id_cloud_hive as server
+    server.logger.setLevel(logging.WARNING)
+
+    loop = server.ServerLoop(verbose=False)
+    client = _Client()
+    loop.on_message(client, None, _message("thermial/register", {"action": "register", "user_id": "bench"}))
+
+    results = {}
+    for module, applied in _applied_checks(sim).items():
+        samples = []
+        for i in range(repeat):
+            value = _command_value(module, i)
+            msg = _message(f"thermial/{module}/cmd", {"user_id": "bench", "value": value})
+            start = time.perf_counter()
+            loop.on_message(client, None, msg)
+            elapsed = time.perf_counter() - start
+            if not applied(value):
+                raise RuntimeError(f"{module}: command {value} did not reach the actuator")
+            samples.append(elapsed)
+        results[module] = summarize(samples)
+    loop.stop()
+    return results
+
+
+def bench_server_core(sim, repeat, status_interval=0.5):
+    """
+    Orden por ServerCore como en el servidor: on_message -> dispatch -> ServerLoop ->
+    actuate() -> cola del bus, con acquire() barriendo cada status_interval. Se mide hasta
+    que el futuro de actuate() termina (orden aplicada) y se verifica en el firmware.
+    """
+    import server_with_user_id_cloud_hive as server
+    from server_core import ServerCore, logger as core_logger
+    server.logger.setLevel(logging.WARNING)
+    core_logger.setLevel(logging.WARNING)
+
+    async def run():
+        loop = server.ServerLoop(verbose=False)
+        client = _Client()
+        core = ServerCore(loop, client, "thermial/status", status_interval=status_interval)
+        tasks = core.start()
+        # Futuro de cada orden que el dispatch pasa a core.actuate (ServerLoop no lo devuelve)
+        futures = asyncio.Queue()
+
+        def actuate(key, func, *args):
+            future = core.actuate(key, func, *args)
+            futures.put_nowait(future)
+            return future
+        loop.actuate = actuate
+
+        core.on_message(client, None, _message("thermial/register", {"action": "register", "user_id": "bench"}))
+        results = {}
+        try:
+            for module, applied in _applied_checks(sim).items():
+                samples = []
+                for i in range(repeat):
+                    value = _command_value(module, i)
+                    msg = _message(f"thermial/{module}/cmd", {"user_id": "bench", "value": value})
+                    start = time.perf_counter()
+                    core.on_message(client, None, msg)
+                    await (await futures.get())
+                    elapsed = time.perf_counter() - start
+                    if not applied(value):
+                        raise RuntimeError(f"{module}: command {value} did not reach the actuator")
+                    samples.append(elapsed)
+                results[module] = summarize(samples)
+            stats = core.get_stats()
+            latency = stats['command_latency']
+            # Histograma del propio core (actuate() -> aplicada), por buckets
+            results['core'] = {
+                'commands': stats['commands'],
+                'command_latency': {key: latency[key] for key in ('count', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms')},
+            }
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            core.bus.shutdown()
+            loop.stop()
+        return results
+
+    return asyncio.run(run())
+
+
+# --- Resultados ---
+def flatten(details, prefix=""):
+    """{'sweep': {'p50_ms': 1.2}} -> {'sweep.p50_ms': 1.2}; solo las métricas comparables."""
+    metrics = {}
+    for key, value in details.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name + "."))
+        elif key in ('p50_ms', 'p95_ms', 'time_s', 'peak_mb'):
+            metrics[name] = value
+    return metrics
+
+
+def compare(metrics, baseline, tolerance, min_delta):
+    """
+    Métricas que empeoraron más que tolerance (relativo) respecto a la línea base.
+    :param min_delta: diferencia absoluta mínima (en la unidad de la métrica) para contar;
+                      evita falsas alarmas en tiempos de microsegundos
+    """
+    regressions = {}
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        if base and value > base * (1 + tolerance) and value - base > min_delta:
+            regressions[name] = {'baseline': base, 'current': value, 'ratio': round(value / base, 2)}
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Thermial controller benchmarks (simulated bus)")
+    parser.add_argument("--output", help="JSON de resultados (por defecto results/bench_<fecha>.json)")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="empeoramiento relativo permitido")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="diferencia absoluta mínima para contar como regresión (ms, s o MB)")
+    parser.add_argument("--repeat", type=int, default=200, help="repeticiones por medición")
+    parser.add_argument("--warmup", type=int, default=30, help="lecturas previas para ajustar el turnaround")
+    parser.add_argument("--latency", type=float, default=0.002, help="latencia de los firmwares simulados (s)")
+    parser.add_argument("--transfer-time", type=float, default=0.0, help="duración de cada transacción (s)")
+    parser.add_argument("--append-lengths", type=int, nargs="+", default=[0, 1000, 10000, 100000])
+    parser.add_argument("--export-sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--quick", action="store_true", help="pocas repeticiones y tamaños chicos")
+    parser.add_argument("--skip", nargs="+", default=[],
+                        choices=["roundtrip", "sweep", "append", "export", "mqtt", "server_core"])
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.repeat = min(args.repeat, 30)
+        args.append_lengths = [0, 10000]
+        args.export_sizes = [10000]
+
+    sim = sim_bus.install(latency=args.latency, transfer_time=args.transfer_time, seed=0)
+    from thermial_error_handling import Loop
+
+    details = {}
+    with tempfile.TemporaryDirectory() as folder, contextlib.redirect_stdout(io.StringIO()):
+        # Todo el log en memoria: append se mide con el largo pedido, sin la ventana móvil
+        loop = Loop(verbose=False, memory_samples=None)
+        benches = {
+            'roundtrip': lambda: bench_roundtrip(loop, args.repeat, args.warmup),
+            'sweep': lambda: bench_sweep(loop, args.repeat, args.warmup),
+            'append': lambda: bench_append(loop, args.append_lengths, args.repeat, folder),
+            'export': lambda: bench_export(loop, args.export_sizes, folder),
+            'mqtt': lambda: bench_mqtt(sim, args.repeat),
+            'server_core': lambda: bench_server_core(sim, args.repeat),
+        }
+        for name, bench in benches.items():
+            if name in args.skip:
+                continue
+            start = time.perf_counter()
+            details[name] = bench()
+            print(f"[BENCH] {name} done in {time.perf_counter() - start:.1f} s", file=sys.__stdout__)
+
+    metrics = flatten(details)
+    result = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'node': platform.node(),
+            'backend': 'sim_bus',
+            'latency_s': args.latency,
+            'transfer_time_s': args.transfer_time,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+        },
+        'metrics': metrics,
+        'details': details,
+    }
+
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(metrics, json.load(f)['metrics'], args.tolerance, args.min_delta)
+        result['meta']['baseline'] = args.baseline
+        result['regressions'] = regressions
+
+    output = args.output or os.path.join(current_dir, "results",
+                                         f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    for name, value in metrics.items():
+        print(f"{name:55s} {value}")
+    print(f"[BENCH] results saved to {output}")
+    for name, regression in regressions.items():
+        print(f"[REGRESSION] {name}: {regression['baseline']} -> {regression['current']} (x{regression['ratio']})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,12 @@
 import i2c_0x10
-import time
+from i2c_bus import get_bus
+from bulk_read import BulkRead
+from frame_codec import GET_ALL
 
 
-class Pump:
+class Pump(BulkRead):
+    fields = ("power", "flow")  # valores que entrega una lectura completa
+
     def __init__(self, address=0x10):
         self.address = address
         self.device_name = "Modulo Bomba Flujometro"
@@ -26,10 +30,23 @@ class Pump:
         Solicita y devuelve el flujo actual de la bomba.
         :return: Flujo actual de la bomba.
         """
-        i2c_0x10.send_command(self.address, 0, 0x02)
-        time.sleep(0.1)
-        self.flow = i2c_0x10.receive_response(self.address, False)
+        self.flow = get_bus().request(
+            self.address,
+            lambda: i2c_0x10.send_command(self.address, 0, 0x02),
+            lambda: i2c_0x10.receive_response(self.address, False))
         return self.flow
 
-        
+    def request_all(self):
+        """Envía GET_ALL sin esperar la respuesta (ver sweep.SweepScheduler)."""
+        i2c_0x10.send_command(self.address, 0, GET_ALL)
+
+    def read_all(self):
+        """Lee la trama ALL y actualiza los valores. Devuelve None si no es válida."""
+        response = self.bulk_response(i2c_0x10.receive_all)
+        if response is not None:
+            self.flow, self.power = response
+        return response
 
+    def read_individual(self):
+        """Lee flujo y PWM actual con las lecturas individuales (firmware sin GET_ALL)."""
+        self.get_flow()
@@ -0,0 +1,80 @@
+"""
+Detección de GET_ALL en el firmware de cada módulo, común a los drivers.
+
+Una trama truncada o con errores en un bus ruidoso no dice nada del firmware, así que
+un driver solo pasa a las lecturas individuales si:
+
+  - el módulo contesta GET_ALL con una trama válida de otro tipo (LegacyResponse, p. ej.
+    FLOW en vez de ALL): firmware antiguo, o
+  - BULK_FAILURES lecturas ALL seguidas no son válidas.
+
+Sin GET_ALL se vuelve a probar cada BULK_REPROBE_S segundos del reloj del bus (un módulo
+reflasheado, o uno que solo tuvo una mala racha), desde get_all(), que es lo que llama
+también el barrido (sweep.SweepScheduler) para los módulos sin GET_ALL.
+"""
+
+from frame_codec import LegacyResponse
+from i2c_bus import get_bus
+
+BULK_FAILURES = 20      # lecturas ALL no válidas seguidas antes de dejar GET_ALL
+BULK_REPROBE_S = 60.0   # s hasta volver a probar GET_ALL
+
+
+class BulkRead:
+    """
+    Mixin de los drivers con GET_ALL. El driver define address, request_all(),
+    read_all() (que llama a bulk_response()) y read_individual(), la lectura con los
+    GET de siempre para el firmware sin GET_ALL.
+    """
+    bulk = True              # GET_ALL disponible en el firmware
+    bulk_failures = 0        # lecturas ALL no válidas seguidas
+    _bulk_retry_at = None    # monotonic del próximo intento sin GET_ALL
+
+    def bulk_response(self, receive):
+        """
+        Lee la trama ALL con receive(address) y actualiza bulk.
+        :return: valores decodificados, o None si la trama no es válida
+        """
+        try:
+            response = receive(self.address)
+        except LegacyResponse as e:
+            print(f"0x{self.address:02x}: firmware sin GET_ALL ({e}), se usan lecturas individuales")
+            self.bulk_disable()
+            return None
+        if response is None:
+            self.bulk_failures += 1
+            if self.bulk_failures >= BULK_FAILURES:
+                print(f"0x{self.address:02x}: {self.bulk_failures} tramas ALL no válidas seguidas, "
+                      f"se usan lecturas individuales")
+                self.bulk_disable()
+        else:
+            self.bulk_failures = 0
+            self.bulk = True
+        return response
+
+    def bulk_disable(self):
+        self.bulk = False
+        self.bulk_failures = 0
+        self._bulk_retry_at = get_bus().monotonic() + BULK_REPROBE_S
+
+    def bulk_due(self):
+        """True si get_all() tiene que intentar GET_ALL (soportado, o toca volver a probar)."""
+        if not self.bulk and get_bus().monotonic() >= self._bulk_retry_at:
+            self.bulk = True
+            self.bulk_failures = BULK_FAILURES - 1  # al volver a probar basta una trama no válida
+        return self.bulk
+
+    def get_all(self):
+        """
+        Lee todos los campos del módulo en una sola transacción (GET_ALL).
+        Si el firmware no soporta GET_ALL se usa read_individual().
+        """
+        if self.bulk_due():
+            # Sin reintentos si la respuesta ya mostró que el firmware no tiene GET_ALL
+            if get_bus().request(self.address, self.request_all, self.read_all,
+                                 valid=lambda response: response is not None or not self.bulk) is not None:
+                return
+        self.read_individual()
+
+    def read_individual(self):
+        raise NotImplementedError
@@ -1,10 +1,15 @@
 import i2c_0x16  # Modul mit send_command() und receive_response()
 import time
+from i2c_bus import get_bus
+from bulk_read import BulkRead
+from frame_codec import GET_ALL
 
 
-class Heater2:
-    def __init__(self):
-        self.address = 0x16
+class Heater2(BulkRead):
+    fields = ("power", "temp_out")  # valores que entrega una lectura completa
+
+    def __init__(self, address=0x16):
+        self.address = address
         self.device_name = "Modulo Calentadordos"
         self.power = 0
         self.temp_out = 0
@@ -25,6 +30,22 @@ class Heater2:
         Requests and returns the two values from the temperature sensors.
         :return: (temp_radiator1_in, temp_radiator1_out) or nothing if there is an error
         """
-        i2c_0x16.send_command(self.address, 0, 0x02)
-        time.sleep(0.5)
-        self.temp_out = i2c_0x16.receive_response(self.address)
\ No newline at end of file
+        self.temp_out = get_bus().request(
+            self.address,
+            lambda: i2c_0x16.send_command(self.address, 0, 0x02),
+            lambda: i2c_0x16.receive_response(self.address))
+
+    def request_all(self):
+        """Envía GET_ALL sin esperar la respuesta (ver sweep.SweepScheduler)."""
+        i2c_0x16.send_command(self.address, 0, GET_ALL)
+
+    def read_all(self):
+        """Lee la trama ALL y actualiza los valores. Devuelve None si no es válida."""
+        response = self.bulk_response(i2c_0x16.receive_all)
+        if response is not None:
+            self.temp_out, self.power = response
+        return response
+
+    def read_individual(self):
+        """Lee temp_out con las lecturas individuales (firmware sin GET_ALL)."""
+        self.get_temperatures()
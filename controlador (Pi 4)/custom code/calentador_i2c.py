@@ -1,10 +1,15 @@
 import i2c_0x11  # Modul mit send_command() und receive_response()
 import time
+from i2c_bus import get_bus
+from bulk_read import BulkRead
+from frame_codec import GET_ALL
 
 
-class Heater1:
-    def __init__(self):
-        self.address = 0x11
+class Heater1(BulkRead):
+    fields = ("power", "temp_in", "temp_out")  # valores que entrega una lectura completa
+
+    def __init__(self, address=0x11):
+        self.address = address
         self.device_name = "Modulo Calentador"
         self.power = 0
         self.temp_in = 0
@@ -26,7 +31,23 @@ class Heater1:
         Requests and returns the two values from the temperature sensors.
         :return: (temp_radiator1_in, temp_radiator1_out) or nothing if there is an error
         """
-        i2c_0x11.send_command(self.address, 0, 0x02)
-        time.sleep(0.5)
-        self.temp_in, self.temp_out = i2c_0x11.receive_response(self.address)
-        #print(f"temperatures received: temp_in = {self.temp_in:.2f}°C, temp_out = {self.temp_out:.2f}°C")
\ No newline at end of file
+        self.temp_in, self.temp_out = get_bus().request(
+            self.address,
+            lambda: i2c_0x11.send_command(self.address, 0, 0x02),
+            lambda: i2c_0x11.receive_response(self.address))
+        #print(f"temperatures received: temp_in = {self.temp_in:.2f}°C, temp_out = {self.temp_out:.2f}°C")
+
+    def request_all(self):
+        """Envía GET_ALL sin esperar la respuesta (ver sweep.SweepScheduler)."""
+        i2c_0x11.send_command(self.address, 0, GET_ALL)
+
+    def read_all(self):
+        """Lee la trama ALL y actualiza los valores. Devuelve None si no es válida."""
+        response = self.bulk_response(i2c_0x11.receive_all)
+        if response is not None:
+            self.temp_in, self.temp_out, self.power = response
+        return response
+
+    def read_individual(self):
+        """Lee temp_in y temp_out con las lecturas individuales (firmware sin GET_ALL)."""
+        self.get_temperatures()
@@ -4,8 +4,10 @@ cmd_dict = {
     0x01: "SET",
     0x02: "GET", #Obtener valores sensores
     0x03: "GET_PWM",
+    0x04: "GET_ALL", #Todos los sensores + PWM en una sola trama
     0x12: "TEMPERATURE",
     0x13: "FLOW",
     0x14: "LEVEL",
-    0x15: "PWM"
+    0x15: "PWM",
+    0x16: "ALL"
 }
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""
+Registro columnar de series temporales para los experimentos largos.
+
+En vez de un dict por muestra (≈25 claves str + fecha/hora formateadas), cada campo
+es una columna float32 y el instante de la muestra un int64 (epoch en ms). La memoria
+se reserva en bloques de chunk_size muestras, así que añadir una muestra no copia nada.
+La fecha, hora y timestamp en texto se generan solo al exportar.
+"""
+
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+DERIVED = ("timestamp", "date", "time")  # se calculan a partir del epoch
+
+
+class ColumnarLog:
+    def __init__(self, fields, integer=(), labels=None, chunk_size=4096, decimals=4, recent=64):
+        """
+        :param fields: nombres de las columnas numéricas, en orden de exportación
+        :param integer: columnas que se exportan como enteros (PWM en %, etc.)
+        :param labels: {columna: (etiqueta_0, etiqueta_1, ...)} para campos de texto,
+                       p. ej. {'valve1_state': ('closed', 'open')}; se guarda el índice
+        :param chunk_size: muestras por bloque reservado
+        :param decimals: decimales al exportar (float32 guarda ~7 cifras significativas)
+        :param recent: muestras recientes indexadas por instante para find() en O(1)
+        """
+        self.fields = tuple(fields)
+        self.index = {name: i for i, name in enumerate(self.fields)}
+        self.integer = frozenset(integer)
+        self.labels = {name: tuple(values) for name, values in (labels or {}).items()}
+        self._codes = {name: {label: code for code, label in enumerate(values)}
+                       for name, values in self.labels.items()}
+        self.chunk_size = chunk_size
+        self.decimals = decimals
+        self.recent = recent
+        self.clear()
+
+    # --- Escritura ---
+    def clear(self):
+        self._epochs = []   # bloques int64 [chunk_size]
+        self._values = []   # bloques float32 [n_fields, chunk_size]
+        self._count = 0
+        self._ticks = {}        # epoch (ms) -> posición, solo las `recent` últimas muestras
+        self._tick_order = deque()
+
+    def _encode(self, name, value):
+        if value is None:
+            return np.nan
+        codes = self._codes.get(name)
+        if codes is not None and not isinstance(value, (int, float)):
+            return codes[value]
+        return value
+
+    def append(self, values, epoch=None):
+        """
+        Añade una muestra.
+        :param values: dict {campo: valor}; los campos que faltan quedan en NaN
+        :param epoch: instante de la muestra en segundos (time.time()); por defecto, ahora
+        """
+        slot = self._count % self.chunk_size
+        if slot == 0:
+            self._epochs.append(np.zeros(self.chunk_size, dtype=np.int64))
+            self._values.append(np.full((len(self.fields), self.chunk_size), np.nan, dtype=np.float32))
+        tick = round((time.time() if epoch is None else epoch) * 1000)
+        self._epochs[-1][slot] = tick
+        self._write(self._values[-1], slot, values)
+        self._index(tick, self._count)
+        self._count += 1
+
+    def trim(self, max_samples):
+        """
+        Descarta los bloques más antiguos mientras queden más de max_samples muestras
+        (ventana móvil, p. ej. el historial del servidor). Las posiciones se corren.
+        """
+        dropped = 0
+        while len(self._epochs) > 1 and self._count - self.chunk_size >= max_samples:
+            del self._epochs[0], self._values[0]
+            self._count -= self.chunk_size
+            dropped += self.chunk_size
+        if dropped:
+            self._ticks = {tick: position - dropped for tick, position in self._ticks.items() if position >= dropped}
+            self._tick_order = deque(tick for tick in self._tick_order if tick in self._ticks)
+        return dropped
+
+    def _index(self, tick, position):
+        if tick not in self._ticks:
+            self._tick_order.append(tick)
+            if len(self._tick_order) > self.recent:
+                del self._ticks[self._tick_order.popleft()]
+        self._ticks[tick] = position
+
+    def update(self, position, values):
+        """Sobrescribe campos de una muestra ya registrada (p. ej. al fusionar dos lazos)."""
+        chunk, slot = divmod(self._position(position), self.chunk_size)
+        self._write(self._values[chunk], slot, values)
+
+    def _write(self, block, slot, values):
+        for name, value in values.items():
+            if name in DERIVED:
+                continue
+            block[self.index[name], slot] = self._encode(name, value)
+
+    def find(self, epoch):
+        """
+        Posición de la muestra con ese instante (s), o None.
+        Las muestras recientes se encuentran en O(1); las antiguas, recorriendo los bloques.
+        """
+        tick = round(epoch * 1000)
+        position = self._ticks.get(tick)
+        if position is not None:
+            return position
+        if not self._tick_order or tick >= self._tick_order[0]:
+            return None  # instante nuevo o dentro de la ventana indexada
+        for chunk, block in enumerate(self._epochs):
+            matches = np.flatnonzero(block[:self._count - chunk * self.chunk_size] == tick)
+            if len(matches):
+                return chunk * self.chunk_size + int(matches[0])
+        return None
+
+    # --- Lectura ---
+    def __len__(self):
+        return self._count
+
+    def snapshot(self):
+        """
+        Vista de solo lectura de las muestras actuales que comparte los bloques (no copia
+        datos): se puede leer desde otro hilo mientras este log sigue creciendo o se recorta.
+        """
+        view = ColumnarLog(self.fields, self.integer, self.labels, self.chunk_size, self.decimals, recent=0)
+        view._epochs, view._values, view._count = list(self._epochs), list(self._values), self._count
+        return view
+
+    def _position(self, position):
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError("ColumnarLog index out of range")
+        return position
+
+    def epochs(self):
+        """Instantes de todas las muestras (int64, ms desde epoch)."""
+        if not self._epochs:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(self._epochs)[:self._count]
+
+    def column(self, name):
+        """Columna completa como array float32 (NaN donde no hubo dato)."""
+        row = self.index[name]
+        if not self._values:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([block[row] for block in self._values])[:self._count]
+
+    def _decode(self, name, value):
+        if np.isnan(value):
+            return None
+        if name in self.labels:
+            return self.labels[name][int(value)]
+        if name in self.integer:
+            return int(value)
+        return round(float(value), self.decimals)
+
+    def row(self, position):
+        """Muestra como dict, con el mismo formato que el antiguo data_log."""
+        chunk, slot = divmod(self._position(position), self.chunk_size)
+        now = datetime.fromtimestamp(self._epochs[chunk][slot] / 1000)
+        row = {
+            'timestamp': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'date': now.strftime('%Y-%m-%d'),
+            'time': now.strftime('%H:%M:%S'),
+        }
+        block = self._values[chunk]
+        for name, i in self.index.items():
+            row[name] = self._decode(name, block[i, slot])
+        return row
+
+    def __getitem__(self, position):
+        return self.row(position)
+
+    def __iter__(self):
+        for position in range(self._count):
+            yield self.row(position)
+
+    def to_dataframe(self):
+        """DataFrame con timestamp/date/time y una columna por campo."""
+        import pandas as pd
+        from dateutil.tz import tzlocal  # dependencia de pandas
+
+        # Hora local con las reglas de la zona (cambio de horario incluido), igual que row()
+        stamps = pd.to_datetime(self.epochs(), unit="ms", utc=True).tz_convert(tzlocal()).tz_localize(None)
+        data = {
+            'timestamp': stamps.strftime('%Y-%m-%d %H:%M:%S'),
+            'date': stamps.strftime('%Y-%m-%d'),
+            'time': stamps.strftime('%H:%M:%S'),
+        }
+        for name in self.fields:
+            values = self.column(name).astype(np.float64)
+            if name in self.labels:
+                codes = pd.Series(values)
+                data[name] = codes.map(dict(enumerate(self.labels[name])))
+            elif name in self.integer:
+                data[name] = pd.Series(values).round().astype("Int64")
+            else:
+                data[name] = values.round(self.decimals)
+        return pd.DataFrame(data)
+
+    # --- Memoria ---
+    @property
+    def nbytes(self):
+        """Bytes reservados por los bloques de datos."""
+        return sum(block.nbytes for block in self._epochs) + sum(block.nbytes for block in self._values)
+
+    @property
+    def bytes_per_sample(self):
+        """Bytes por muestra: 8 del epoch + 4 por columna."""
+        return 8 + 4 * len(self.fields)
+
+    def memory_summary(self):
+        return (f"{self._count} samples x {self.bytes_per_sample} B/sample, "
+                f"{self.nbytes / 1024:.1f} kB allocated")
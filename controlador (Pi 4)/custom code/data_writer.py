@@ -0,0 +1,173 @@
+"""
+Escritura incremental de los datos de un experimento.
+
+Las muestras se acumulan en un lote pequeño y se añaden al archivo cada batch_size
+muestras o cada flush_interval segundos, así un corte de luz pierde como mucho un lote
+y la memoria usada no crece con la duración del ensayo. El archivo se rota al llegar
+a max_rows filas. Formato CSV igual al de export_to_csv (sep ';', decimal ',',
+utf-8-sig) o Parquet (requiere pyarrow; un Parquet solo es legible una vez cerrado,
+por eso conviene un max_rows menor para acotar lo que se pierde).
+"""
+
+import csv
+import os
+import time
+from datetime import datetime
+
+FSYNC_POLICIES = ("batch", "close", "never")
+
+
+class StreamWriter:
+    def __init__(self, folder_path, prefix, columns, fmt="csv", batch_size=10, flush_interval=30.0,
+                 max_rows=86400, fsync="batch", text_columns=()):
+        """
+        :param folder_path: carpeta de salida (se crea si no existe)
+        :param prefix: inicio del nombre de archivo, p. ej. 'solarloop_test'
+        :param columns: columnas en orden; las filas son dicts con esas claves
+        :param fmt: 'csv' o 'parquet'
+        :param batch_size: muestras por escritura
+        :param flush_interval: segundos máximos que una muestra espera en memoria
+        :param max_rows: filas por archivo antes de rotar (None = sin rotación)
+        :param fsync: 'batch' (tras cada lote), 'close' (al cerrar cada archivo) o 'never'
+        :param text_columns: columnas de texto (solo Parquet; el resto se guarda como float64)
+        """
+        if fmt not in ("csv", "parquet"):
+            raise ValueError("fmt has to be 'csv' or 'parquet'")
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync has to be one of {FSYNC_POLICIES}")
+        self.folder_path = folder_path
+        self.prefix = prefix
+        self.columns = tuple(columns)
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.fsync = fsync
+        self.text_columns = frozenset(text_columns)
+        self.files = []        # rutas escritas, en orden
+        self.rows_written = 0  # total de filas en disco
+        self._batch = []
+        self._file = None      # archivo CSV abierto
+        self._parquet = None   # pyarrow.parquet.ParquetWriter abierto
+        self._schema = None
+        self._file_rows = 0
+        self._last_flush = time.monotonic()
+        self.closed = False
+        os.makedirs(folder_path, exist_ok=True)
+
+    @property
+    def path(self):
+        """Archivo actual (o el último escrito)."""
+        return self.files[-1] if self.files else None
+
+    # --- API ---
+    def write(self, row):
+        """Añade una fila (dict); se escribe a disco cuando se completa el lote."""
+        if self.closed:
+            raise ValueError("StreamWriter is closed")
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Escribe el lote pendiente, rotando el archivo si hace falta."""
+        batch, self._batch = self._batch, []
+        self._last_flush = time.monotonic()
+        while batch:
+            if self._current() is None or (self.max_rows and self._file_rows >= self.max_rows):
+                self._rotate()
+            room = len(batch) if not self.max_rows else self.max_rows - self._file_rows
+            chunk, batch = batch[:room], batch[room:]
+            if self.fmt == "csv":
+                self._write_csv(chunk)
+            else:
+                self._write_parquet(chunk)
+            self._file_rows += len(chunk)
+            self.rows_written += len(chunk)
+            if self.fsync == "batch":
+                self._sync()
+
+    def close(self):
+        """Escribe lo pendiente y cierra el archivo. Devuelve la ruta del último archivo."""
+        if not self.closed:
+            self.flush()
+            self._close_file()
+            self.closed = True
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- Archivos ---
+    def _current(self):
+        return self._file if self.fmt == "csv" else self._parquet
+
+    def _rotate(self):
+        self._close_file()
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{self.prefix}_{stamp}_{len(self.files) + 1:03d}.{self.fmt}"
+        path = os.path.join(self.folder_path, filename)
+        self.files.append(path)
+        self._file_rows = 0
+        if self.fmt == "csv":
+            self._file = open(path, "w", newline="", encoding="utf-8-sig")
+            self._csv = csv.writer(self._file, delimiter=";")
+            self._csv.writerow(self.columns)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._schema is None:
+                self._schema = pa.schema([(name, pa.string() if name in self.text_columns else pa.float64())
+                                          for name in self.columns])
+            self._parquet = pq.ParquetWriter(path, self._schema)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.flush()
+            if self.fsync != "never":
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        if self._parquet is not None:
+            self._parquet.close()  # pyarrow no expone el descriptor; el cierre escribe el footer
+            if self.fsync != "never":
+                self._sync_path(self.path)
+            self._parquet = None
+
+    def _sync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    @staticmethod
+    def _sync_path(path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # --- Formatos ---
+    @staticmethod
+    def _csv_value(value):
+        if value is None or value != value:  # None o NaN -> celda vacía, como pandas
+            return ""
+        if isinstance(value, float):
+            return repr(value).replace(".", ",")
+        return value
+
+    def _write_csv(self, rows):
+        self._csv.writerows([self._csv_value(row.get(name)) for name in self.columns] for row in rows)
+
+    def _write_parquet(self, rows):
+        import pyarrow as pa
+
+        table = pa.Table.from_pylist(
+            [{name: (row.get(name) if name in self.text_columns or row.get(name) is None else float(row[name]))
+              for name in self.columns} for row in rows],
+            schema=self._schema)
+        self._parquet.write_table(table)
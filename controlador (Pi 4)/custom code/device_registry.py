@@ -0,0 +1,153 @@
+"""
+Registro declarativo de los periféricos (devices.toml).
+
+A partir del registro se generan los objetos de los módulos y el barrido (Loop), las
+columnas del data_log, el estado por módulo para MQTT y la tabla de órdenes
+thermial/<topic>/cmd del servidor, en vez de tenerlos escritos a mano en cada archivo.
+
+    registry = load_registry()            # devices.toml junto a este archivo
+    devices = registry.build()            # {'pump1': Pump(0x10), ...}
+    registry.commands['valve2']           # Command(topic='valve2', method='set_valve', args=(2,), safe=0, stop_order=2)
+    registry.poll_intervals               # {'tank': {'level': 20.0, ...}, ...} para sweep.SweepScheduler
+"""
+
+import os
+from collections import namedtuple
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib
+
+from bomba_i2c import Pump
+from calentador_i2c import Heater1
+from calentador_dos_i2c import Heater2
+from valvulas_i2c import Valves
+from estanque_i2c import Tank
+from disipador_i2c import Radiator1
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.toml")
+
+# type del registro -> clase del driver (todas aceptan address=)
+DEVICE_TYPES = {
+    "pump": Pump,
+    "heater1": Heater1,
+    "heater2": Heater2,
+    "valves": Valves,
+    "tank": Tank,
+    "radiator": Radiator1,
+}
+
+Command = namedtuple("Command", ["topic", "method", "args", "safe", "stop_order"])
+
+
+class Channel:
+    """Un campo del driver tal como se guarda en el data_log y se publica por MQTT."""
+    def __init__(self, field, log=None, mqtt=None, scale=1.0, digits=None, integer=False,
+                 kind="value", labels=None, poll_interval=None):
+        if kind not in ("value", "state"):
+            raise ValueError(f"Unknown channel kind '{kind}' for field '{field}'")
+        self.field = field
+        self.log = log
+        self.mqtt = mqtt
+        self.scale = scale
+        self.digits = digits
+        self.integer = integer
+        self.kind = kind
+        self.labels = tuple(labels) if labels else ("0", "1")
+        self.poll_interval = poll_interval  # s entre lecturas; None = en cada barrido
+
+    def _scaled(self, raw):
+        if raw is None:
+            return None
+        value = raw * self.scale if self.scale != 1 else raw
+        return round(value, self.digits) if self.digits is not None else value
+
+    def log_value(self, raw):
+        if self.kind == "state":
+            return None if raw is None else self.labels[int(bool(raw))]
+        return self._scaled(raw)
+
+    def mqtt_value(self, raw):
+        if self.kind == "state":
+            return None if raw is None else int(bool(raw))
+        return self._scaled(raw)
+
+
+class DeviceSpec:
+    """Un [[device]] del registro."""
+    def __init__(self, name, type, address, channels=(), commands=()):
+        if type not in DEVICE_TYPES:
+            raise ValueError(f"Unknown device type '{type}' for '{name}' (known: {', '.join(DEVICE_TYPES)})")
+        self.name = name
+        self.type = type
+        self.address = address
+        self.channels = tuple(Channel(**channel) for channel in channels)
+        self.commands = tuple(Command(c["topic"], c["method"], tuple(c.get("args", ())), c.get("safe"),
+                                      c.get("stop_order"))
+                              for c in commands)
+        for command in self.commands:
+            if command.safe is not None and command.stop_order is None:
+                raise ValueError(f"{name}: command '{command.topic}' has safe but no stop_order")
+
+        fields = DEVICE_TYPES[type].fields
+        for channel in self.channels:
+            if channel.field not in fields:
+                raise ValueError(f"{name}: '{channel.field}' is not a field of {type} ({', '.join(fields)})")
+
+    def build(self):
+        return DEVICE_TYPES[self.type](address=self.address)
+
+
+class Registry:
+    """Todos los periféricos, en el orden del archivo."""
+    def __init__(self, devices, path=None):
+        self.path = path
+        self.devices = tuple(devices)
+        self.by_name = {spec.name: spec for spec in self.devices}
+        if len(self.by_name) != len(self.devices):
+            raise ValueError("Duplicate device name in registry")
+        addresses = [spec.address for spec in self.devices]
+        if len(set(addresses)) != len(addresses):
+            raise ValueError("Duplicate I2C address in registry")
+
+        self.commands = {}  # {topic: Command}; el despacho del servidor es una búsqueda en este dict
+        for spec in self.devices:
+            for command in spec.commands:
+                if command.topic in self.commands:
+                    raise ValueError(f"Duplicate command topic '{command.topic}'")
+                self.commands[command.topic] = command
+        # Apagado de emergencia: stop_order creciente (bombas antes que válvulas); empate = orden del archivo
+        self.stop_commands = tuple(sorted((command for command in self.commands.values() if command.safe is not None),
+                                          key=lambda command: command.stop_order))
+
+        channels = [channel for spec in self.devices for channel in spec.channels if channel.log]
+        self.log_fields = tuple(channel.log for channel in channels)
+        self.log_integer = tuple(channel.log for channel in channels if channel.integer)
+        self.log_labels = {channel.log: channel.labels for channel in channels if channel.kind == "state"}
+
+        # {name: {field: s}} (0 = en cada barrido); si dos canales leen el mismo campo manda el más corto
+        self.poll_intervals = {}
+        for spec in self.devices:
+            fields = self.poll_intervals.setdefault(spec.name, {})
+            for channel in spec.channels:
+                interval = channel.poll_interval or 0
+                fields[channel.field] = min(fields.get(channel.field, interval), interval)
+
+    def build(self):
+        """Crea un objeto driver por periférico: {name: device}."""
+        return {spec.name: spec.build() for spec in self.devices}
+
+    def __iter__(self):
+        return iter(self.devices)
+
+
+def load_registry(path=None):
+    """
+    Lee el registro de un archivo TOML.
+    :param path: por defecto devices.toml en la carpeta de este módulo
+    """
+    path = path or DEFAULT_PATH
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    return Registry([DeviceSpec(**device) for device in data.get("device", [])], path=path)
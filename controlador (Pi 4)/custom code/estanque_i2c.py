@@ -1,9 +1,13 @@
 import i2c_0x13
-import time
+from bulk_read import BulkRead
+from frame_codec import TEMPERATURE, LEVEL, GET_ALL
+from i2c_bus import get_bus
 
-class Tank:
-    def __init__(self):
-        self.address = 0x13
+class Tank(BulkRead):
+    fields = ("level", "temp_bottom", "temp_top")  # valores que entrega una lectura completa
+
+    def __init__(self, address=0x13):
+        self.address = address
         self.device_name = "Modulo Estanque"
         self.level = None
         self.temp_bottom = 0
@@ -15,9 +19,10 @@ class Tank:
         Requests and returns the two values from the temperature sensors.
         :return: (temp_radiator1_in, temp_radiator1_out) or nothing if there is an error
         """
-        i2c_0x13.send_command(self.address, 0, 0x02)
-        time.sleep(0.5)
-        self.temp_bottom, self.temp_top = i2c_0x13.receive_response(self.address)
+        self.temp_bottom, self.temp_top = get_bus().request(
+            self.address,
+            lambda: i2c_0x13.send_command(self.address, 0, 0x02),
+            lambda: i2c_0x13.receive_response(self.address, expected_cmd=TEMPERATURE))
         #print(f"temperatures received: temp_in = {self.temp_in:.2f}°C, temp_out = {self.temp_out:.2f}°C")
 
     def get_level(self):
@@ -25,9 +30,10 @@ class Tank:
         Solicita y devuelve el nivel actual del estanque.
         :return: Nivel actual del estanque.
         """
-        i2c_0x13.send_command(self.address, 0, 0x03)
-        time.sleep(0.5)
-        response = i2c_0x13.receive_response(self.address)
+        response = get_bus().request(
+            self.address,
+            lambda: i2c_0x13.send_command(self.address, 0, 0x03),
+            lambda: i2c_0x13.receive_response(self.address, expected_cmd=LEVEL))
         if response is None:
             return None
         response_data = response
@@ -46,3 +52,19 @@ class Tank:
 
         else:
             self.level = -1
+
+    def request_all(self):
+        """Envía GET_ALL sin esperar la respuesta (ver sweep.SweepScheduler)."""
+        i2c_0x13.send_command(self.address, 0, GET_ALL)
+
+    def read_all(self):
+        """Lee la trama ALL y actualiza los valores. Devuelve None si no es válida."""
+        response = self.bulk_response(i2c_0x13.receive_all)
+        if response is not None:
+            self.temp_bottom, self.temp_top, self.level = response
+        return response
+
+    def read_individual(self):
+        """Lee temperaturas y distancia del sensor de nivel con las lecturas individuales (firmware sin GET_ALL)."""
+        self.get_temperatures()
+        self.get_level()
@@ -0,0 +1,153 @@
+"""
+Codec de tramas del protocolo de periféricos [id, cmd, len, payload].
+
+Todos los módulos Pico responden con la misma cabecera de 3 bytes, salvo el módulo
+de válvulas (0x12), que omite el id y envía [cmd, len, payload]. Los valores
+de 16 bits van en little-endian y escalados (temperatura y flujo x100, distancia x10).
+"""
+
+import struct
+from collections import namedtuple
+from cmd_dictionary import cmd_dict
+
+# Códigos de respuesta por nombre, a partir de cmd_dictionary.cmd_dict
+CODES = {name: code for code, name in cmd_dict.items()}
+TEMPERATURE = CODES["TEMPERATURE"]
+FLOW = CODES["FLOW"]
+LEVEL = CODES["LEVEL"]
+PWM = CODES["PWM"]
+ALL = CODES["ALL"]
+GET_ALL = CODES["GET_ALL"]
+
+HEADER = struct.Struct("<BBB")        # id, cmd, len
+SHORT_HEADER = struct.Struct("<BB")   # cmd, len (módulo válvulas 0x12)
+
+Frame = namedtuple("Frame", ["id", "cmd", "payload"])
+
+TemperatureReading = namedtuple("TemperatureReading", ["values"])   # °C
+FlowReading = namedtuple("FlowReading", ["values", "status"])       # L/min, bits de estado (o None)
+LevelReading = namedtuple("LevelReading", ["distance"])             # cm
+PwmReading = namedtuple("PwmReading", ["duty"])                     # %
+
+
+# Trama GET_ALL: formato struct del payload y factor de escala de cada campo
+Layout = namedtuple("Layout", ["struct", "scales"])
+
+
+def layout(fmt, scales):
+    return Layout(struct.Struct(fmt), tuple(scales))
+
+
+class FrameError(ValueError):
+    """Trama corta, con longitud inconsistente o con un código no esperado."""
+
+
+class LegacyResponse(FrameError):
+    """
+    Trama completa y válida, pero de otro tipo que el pedido (p. ej. FLOW en vez de ALL):
+    el firmware no conoce el comando y contestó con su trama de siempre.
+    """
+
+
+def frame_length(payload_len, header=HEADER):
+    """Número exacto de bytes a leer para una respuesta con payload_len bytes de datos."""
+    return header.size + payload_len
+
+
+def decode_frame(raw, expected_cmd=None, expected_len=None, header=HEADER):
+    """
+    Separa cabecera y payload de una respuesta cruda.
+    :param raw: bytes/lista recibidos del bus
+    :param expected_cmd: código de respuesta esperado (opcional)
+    :param expected_len: longitud de payload esperada (opcional)
+    :param header: HEADER (3 bytes) o SHORT_HEADER (2 bytes, módulo 0x12)
+    :return: Frame(id, cmd, payload) con payload como memoryview
+    """
+    view = memoryview(raw if isinstance(raw, (bytes, bytearray)) else bytes(raw))
+    if len(view) < header.size:
+        raise FrameError(f"Frame too short: {len(view)} bytes")
+
+    if header is SHORT_HEADER:
+        response_id = None
+        response_cmd, response_len = header.unpack_from(view)
+    else:
+        response_id, response_cmd, response_len = header.unpack_from(view)
+
+    if expected_cmd is not None and response_cmd != expected_cmd:
+        if response_cmd in DECODERS and len(view) >= header.size + response_len:
+            raise LegacyResponse(f"Response code 0x{response_cmd:02x} ({cmd_name(response_cmd)}), "
+                                 f"expected 0x{expected_cmd:02x}")
+        raise FrameError(f"Unexpected response code 0x{response_cmd:02x}, expected 0x{expected_cmd:02x}")
+    if expected_len is not None and response_len != expected_len:
+        raise FrameError(f"Unexpected payload length {response_len}, expected {expected_len}")
+    if len(view) < header.size + response_len:
+        raise FrameError(f"Incomplete frame: LEN={response_len} but only {len(view) - header.size} data bytes")
+
+    return Frame(response_id, response_cmd, view[header.size:header.size + response_len])
+
+
+_u16_structs = {}
+
+
+def unpack_u16(payload, count, offset=0):
+    """Lee count enteros u16 little-endian desde offset."""
+    fmt = _u16_structs.get(count)
+    if fmt is None:
+        fmt = _u16_structs[count] = struct.Struct(f"<{count}H")
+    return fmt.unpack_from(payload, offset)
+
+
+def decode_temperature(payload):
+    return TemperatureReading(tuple(v / 100.0 for v in unpack_u16(payload, len(payload) // 2)))
+
+
+def decode_flow(payload):
+    # Bombas: 1 x u16. Válvulas: 2 x u16 + 1 byte de estado (bit0 = válvula 1, bit1 = válvula 2)
+    count = len(payload) // 2
+    values = tuple(v / 100.0 for v in unpack_u16(payload, count))
+    status = payload[2 * count] if len(payload) % 2 else None
+    return FlowReading(values, status)
+
+
+def decode_level(payload):
+    return LevelReading(unpack_u16(payload, 1)[0] / 10.0)
+
+
+def decode_pwm(payload):
+    if len(payload) < 1:
+        raise FrameError("Empty PWM payload")
+    return PwmReading(payload[0])
+
+
+DECODERS = {
+    TEMPERATURE: decode_temperature,
+    FLOW: decode_flow,
+    LEVEL: decode_level,
+    PWM: decode_pwm,
+}
+
+
+def decode_reading(frame):
+    """Convierte una Frame en la lectura tipada correspondiente a su código de respuesta."""
+    decoder = DECODERS.get(frame.cmd)
+    if decoder is None:
+        raise FrameError(f"Unknown response code 0x{frame.cmd:02x}")
+    try:
+        return decoder(frame.payload)
+    except struct.error as e:
+        raise FrameError(f"{cmd_dict.get(frame.cmd, 'UNKNOWN')} payload of {len(frame.payload)} bytes: {e}") from e
+
+
+def decode_all(frame, layout):
+    """
+    Decodifica una respuesta GET_ALL según el layout del módulo.
+    :return: tupla con los valores ya escalados, en el orden del layout
+    """
+    if len(frame.payload) != layout.struct.size:
+        raise FrameError(f"ALL payload of {len(frame.payload)} bytes, expected {layout.struct.size}")
+    raw = layout.struct.unpack_from(frame.payload)
+    return tuple(value / scale if scale != 1 else value for value, scale in zip(raw, layout.scales))
+
+
+def cmd_name(code):
+    return cmd_dict.get(code, "UNKNOWN")
@@ -1,63 +1,76 @@
-import smbus2
 import time
 from cmd_dictionary import cmd_dict
+from i2c_bus import get_bus
+from frame_codec import TEMPERATURE, PWM, ALL, FrameError, LegacyResponse, decode_frame, decode_reading, decode_all, frame_length, layout
+
+FRAME_LENGTHS = {
+    TEMPERATURE: frame_length(4),  # [id, TEMPERATURE, 4, t_in lo, t_in hi, t_out lo, t_out hi]
+    PWM: frame_length(1),          # [id, PWM, 1, duty]
+}
+
+ALL_LAYOUT = layout("<HHB", (100.0, 100.0, 1))  # temperaturas x100, PWM %
+FRAME_LENGTHS[ALL] = frame_length(ALL_LAYOUT.struct.size)
 
 
 def send_command(PICO_ADDRESS, id, cmd, data=[], verbose = False):
-    bus = smbus2.SMBus(1)  # I2C Bus der Raspberry Pi 4
-    bus.timeout = 1.0
     packet = [id, cmd, len(data)] + data
-    bus.write_i2c_block_data(PICO_ADDRESS, 0x00, packet)
+    get_bus().write_block(PICO_ADDRESS, 0x00, packet)
     cmd_str = "SET" if cmd == 0x01 else "GET"
     if verbose:
         print(f"Enviado: ADD={PICO_ADDRESS:02x}, CMD={cmd_str}, LEN={len(data)}, DATA={data}")
 
-def receive_response(PICO_ADDRESS, verbose = False):
+def receive_response(PICO_ADDRESS, verbose = False, expected_cmd=TEMPERATURE):
     try:
-        bus = smbus2.SMBus(1)  # Canal I2C en la Raspberry Pi 4 para comunicarse con la Rasp. Pi Pico
-        bus.timeout = 1.0
-        data = bus.read_i2c_block_data(PICO_ADDRESS, 0x00, 8) #expectando 8 bytes
+        data = get_bus().read_block(PICO_ADDRESS, 0x00, FRAME_LENGTHS[expected_cmd])
         #print(f"Datos recibidos (sin procesar): {data}")
-        response_id = data[0]
-        response_cmd = data[1]
-        response_len = data[2]
-        response_data = data[3:3+response_len]
+        frame = decode_frame(data, expected_cmd=expected_cmd)
 
-        if response_cmd in cmd_dict:
-            response_cmd_str = cmd_dict[response_cmd]
-        else:
-            response_cmd_str = "UNKNOWN"
-
-        if response_cmd == 0x12:  # Temperatur-Wert
-            if len(response_data) == 4: #asegurarnos que recibimos 4 bytes
-                temp_heater1_in_value = response_data[0] + (response_data[1] << 8)
-                temp_heater1_out_value = response_data[2] + (response_data[3] << 8)
-                temp_heater1_in_value /= 100.0
-                temp_heater1_out_value /= 100.0
-                #print("bytes recibidos:", response_data)
+        if frame.cmd == TEMPERATURE:  # Temperatur-Wert
+            if len(frame.payload) == 4: #asegurarnos que recibimos 4 bytes
+                temp_heater1_in_value, temp_heater1_out_value = decode_reading(frame).values
                 if verbose:
                     print(f"temperatura recibida: temp_heater1_in = {temp_heater1_in_value:.2f}°C, temp_heater1_out = {temp_heater1_out_value:.2f}°C")
                 return temp_heater1_in_value, temp_heater1_out_value
-            
+
             else:
-                print(f"Error: datos incompletos, esperando 4 bytes pero recibo: {response_len}: {response_data}")
+                print(f"Error: datos incompletos, esperando 4 bytes pero recibo: {len(frame.payload)}: {list(frame.payload)}")
                 return None
-                      
-        if response_cmd == 0x15: # PWM-Wert
-            pwm_value = response_data[0]
+
+        if frame.cmd == PWM: # PWM-Wert
+            pwm_value = decode_reading(frame).duty
             if verbose:
                 print(f"PWM recibido: {pwm_value}%")
-                print(f"Recibido: ADD={PICO_ADDRESS:02x}, CMD={response_cmd_str}, LEN={response_len}, DATA={response_data}")
-        return response_id, response_cmd, response_data
-        
+                print(f"Recibido: ADD={PICO_ADDRESS:02x}, CMD={cmd_dict[frame.cmd]}, LEN={len(frame.payload)}, DATA={list(frame.payload)}")
+        return frame.id, frame.cmd, list(frame.payload)
+
     except Exception as e:
         if verbose:
             print(f"Error al leer la respuesta: {e}")
         return None
 
+def receive_all(PICO_ADDRESS, verbose=False):
+    """
+    Lee la respuesta a GET_ALL (0x04): (temp_in °C, temp_out °C, PWM %).
+    Devuelve None si la trama no es válida. Si el firmware contesta con otra trama válida
+    (no soporta GET_ALL) se propaga LegacyResponse, igual que los errores del bus.
+    """
+    try:
+        data = get_bus().read_block(PICO_ADDRESS, 0x00, FRAME_LENGTHS[ALL])
+        frame = decode_frame(data, expected_cmd=ALL)
+        values = decode_all(frame, ALL_LAYOUT)
+        if verbose:
+            print(f"Recibido: ADD={PICO_ADDRESS:02x}, CMD={cmd_dict[frame.cmd]}, LEN={len(frame.payload)}, DATA={values}")
+        return values
+    except LegacyResponse:
+        raise
+    except FrameError as e:
+        if verbose:
+            print(f"Error al leer la respuesta: {e}")
+        return None
+
+
 if __name__ == "__main__":
     PICO_ADDRESSES = [0x11]
-    bus = smbus2.SMBus(1)
 
     value = 0      # PWM para calentador (0-100%)
     increment = 10 # Pasos für PWM
@@ -1,6 +1,14 @@
-import smbus2
 import time
 from cmd_dictionary import cmd_dict
+from i2c_bus import get_bus
+from frame_codec import FLOW, ALL, FrameError, LegacyResponse, SHORT_HEADER, decode_frame, decode_flow, decode_all, frame_length, layout
+
+# El módulo de válvulas responde sin id: [FLOW, 5, f1 lo, f1 hi, f2 lo, f2 hi, estado]
+FLOW_FRAME_LEN = frame_length(5, header=SHORT_HEADER)
+
+# GET_ALL sí usa la cabecera estándar [id, ALL, 5, ...]: flujos x100 y byte de estado de los relés
+ALL_LAYOUT = layout("<HHB", (100.0, 100.0, 1))
+ALL_FRAME_LEN = frame_length(ALL_LAYOUT.struct.size)
 
 
 
@@ -12,9 +20,8 @@ def send_command(id, cmd, data=[], verbose = False):
     :param data: Zusätzliche Daten (Liste von Bytes)
     """
     PICO_ADDRESS = 0x12
-    bus = smbus2.SMBus(1)  # I2C-Kanal des Raspberry Pi 4
     packet = [id, cmd, len(data)] + data
-    bus.write_i2c_block_data(PICO_ADDRESS, 0x00, packet)
+    get_bus().write_block(PICO_ADDRESS, 0x00, packet)
     cmd_str = "SET" if cmd == 0x01 else "GET"
     cmd_str = cmd_dict.get(cmd, "UNKNOWN")
     if verbose:
@@ -26,35 +33,23 @@ def receive_response(address, verbose=False):
     """
     PICO_ADDRESS = 0x12
     try:
-        bus = smbus2.SMBus(1)
-        data = bus.read_i2c_block_data(PICO_ADDRESS, 0x00, 7)  # 6 Bytes erwartet
+        data = get_bus().read_block(PICO_ADDRESS, 0x00, FLOW_FRAME_LEN)
         #print(f"Datos recibidos (sin procesar): {data}")  # Debugging
 
-        response_cmd = data[0]
-        response_len = data[1]
-        response_data = data[2:2+response_len]
+        # data del flujo y información estatus válvulas (abierta/cerrada)
+        frame = decode_frame(data, expected_cmd=FLOW, expected_len=5, header=SHORT_HEADER)
+        if verbose:
+            print("Raw bytes:", list(frame.payload))
+
+        (flow_valve1_out, flow_valve2_out), valve_status = decode_flow(frame.payload)
         if verbose:
-            print("Raw bytes:", response_data)
-
-        cmd_str = cmd_dict.get(response_cmd, "UNKNOWN")
-
-        if response_cmd == 0x13 and len(response_data) >= 5:  # data del flujo y información estatus válvulas (abierta/cerrada)
-            flow_valve1_out = response_data[0] + (response_data[1] << 8)
-            flow_valve2_out = response_data[2] + (response_data[3] << 8)
-            valve_status = response_data[4]
-            
-            flow_valve1_out /= 100.0
-            flow_valve2_out /= 100.0
-            if verbose:
-                print(f"Flow valve1: {flow_valve1_out:.2f} L/min, Flow 2: {flow_valve2_out:.2f} L/min")
-            
-            valve1 = "abierta" if valve_status & 0x01 else "cerrada"
-            valve2 = "abierta" if valve_status & 0x02 else "cerrada"
-            if verbose:
-                print(f"Valve 1 es {valve1}, Valve 2 es {valve2}")
+            print(f"Flow valve1: {flow_valve1_out:.2f} L/min, Flow 2: {flow_valve2_out:.2f} L/min")
 
+        valve1 = "abierta" if valve_status & 0x01 else "cerrada"
+        valve2 = "abierta" if valve_status & 0x02 else "cerrada"
         if verbose:
-            print(f"Respuesta: ADD={PICO_ADDRESS:02x}, CMD={cmd_str}, LEN={response_len}, DATA={response_data}")
+            print(f"Valve 1 es {valve1}, Valve 2 es {valve2}")
+            print(f"Respuesta: ADD={PICO_ADDRESS:02x}, CMD={cmd_dict[frame.cmd]}, LEN={len(frame.payload)}, DATA={list(frame.payload)}")
         
         return flow_valve1_out, flow_valve2_out, valve1, valve2
 
@@ -85,10 +80,30 @@ def cerrar_valve2():
     receive_response(0)
 """
     
+
+def receive_all(PICO_ADDRESS, verbose=False):
+    """
+    Lee la respuesta a GET_ALL (0x04): (flow_valve1_out L/min, flow_valve2_out L/min, estado relés).
+    Devuelve None si la trama no es válida. Si el firmware contesta con otra trama válida
+    (no soporta GET_ALL) se propaga LegacyResponse, igual que los errores del bus.
+    """
+    try:
+        data = get_bus().read_block(PICO_ADDRESS, 0x00, ALL_FRAME_LEN)
+        frame = decode_frame(data, expected_cmd=ALL)
+        values = decode_all(frame, ALL_LAYOUT)
+        if verbose:
+            print(f"Recibido: ADD={PICO_ADDRESS:02x}, CMD={cmd_dict[frame.cmd]}, LEN={len(frame.payload)}, DATA={values}")
+        return values
+    except LegacyResponse:
+        raise
+    except FrameError as e:
+        print(f"Error al leer la respuesta: {e}")
+        return None
+
+
 if __name__ == "__main__":
     # I2C-Adresse des Pico
     PICO_ADDRESS = 0x12  
-    bus = smbus2.SMBus(1)  # I2C-Kanal des Raspberry Pi 4
     
     time.sleep(2)
     #abrir_valvula2()
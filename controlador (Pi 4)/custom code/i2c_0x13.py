@@ -1,67 +1,89 @@
-import smbus2
 import time
 from cmd_dictionary import cmd_dict
+from i2c_bus import get_bus
+from frame_codec import TEMPERATURE, LEVEL, ALL, FrameError, LegacyResponse, decode_frame, decode_reading, decode_all, frame_length, layout
+
+FRAME_LENGTHS = {
+    TEMPERATURE: frame_length(4),  # [id, TEMPERATURE, 4, t3 lo, t3 hi, t4 lo, t4 hi]
+    LEVEL: frame_length(2),        # [id, LEVEL, 2, dist lo, dist hi] (distancia x10)
+}
+
+ALL_LAYOUT = layout("<HHH", (100.0, 100.0, 10.0))  # temp_bottom x100, temp_top x100, distancia x10
+FRAME_LENGTHS[ALL] = frame_length(ALL_LAYOUT.struct.size)
  
 def send_command(addr, id_byte, cmd, verbose=False):
-    bus = smbus2.SMBus(1)
     packet = bytes([id_byte, cmd, 0])
-    write = smbus2.i2c_msg.write(addr, packet)
-    bus.i2c_rdwr(write)
-    bus.close()
+    get_bus().write_raw(addr, packet)
     if verbose:
         print(f"Enviado: ADD={addr:02x}, CMD={cmd_dict.get(cmd,cmd)}, LEN=0, DATA=[]")
  
-def receive_response(addr, verbose=False):
-    # Leemos primero cabecera de 3 bytes
-    bus=smbus2.SMBus(1)
-    raw = smbus2.i2c_msg.read(addr, 8)
-    bus.i2c_rdwr(raw)
-    data = list(raw)
-    bus.close()
-    
-    if len(data) < 3:
-        print("Respuesta demasiado corta", data)
-        return
-
-    response_id = data[0]
-    response_cmd = data[1]
-    response_len = data[2]
+def receive_response(addr, verbose=False, expected_cmd=None):
+    # Leemos exactamente la trama esperada (o la más larga si no se indica)
+    length = FRAME_LENGTHS.get(expected_cmd, max(FRAME_LENGTHS.values()))
+    data = get_bus().read_raw(addr, length)
 
-    if len(data) < 3 + response_len:
-        print("No hay suficientes datos recibidos:", data)
+    try:
+        frame = decode_frame(data, expected_cmd=expected_cmd)
+        reading = decode_reading(frame)
+    except FrameError as e:
+        print("Respuesta inválida:", e, data)
         return
 
-    payload = data[3:3 + response_len]
+    payload = list(frame.payload)
+    response_id = frame.id
+    response_cmd = frame.cmd
+    response_len = len(payload)
 
     if verbose:
         print(f"[DEBUG] payload = {payload} (hex: {[hex(b) for b in payload]})")
 
-    if response_cmd == 0x12 and response_len == 4:
-        t3 = (payload[0] | (payload[1] << 8)) / 100.0
-        t4 = (payload[2] | (payload[3] << 8)) / 100.0
+    if response_cmd == TEMPERATURE and response_len == 4:
+        t3, t4 = reading.values
         if verbose:
             print(f"Temperatures received: temp_tank_bottom={t3:.2f}°C, temp_tank_top={t4:.2f}°C")
         
         message = [t3, t4]
     
-    elif response_cmd == 0x14 and response_len == 2:
-        #print(f"[DEBUG] raw data level: payload = {payload}, hex = {[hex(b) for b in payload]}")
-        lvl_raw = (payload[0] | (payload[1] << 8))
-        measured_distance = lvl_raw / 10.0
+    elif response_cmd == LEVEL and response_len == 2:
+        measured_distance = reading.distance
         #print(f"[DEBUG] distancia medida: {measured_distance:.2f} cm → nivel calculado: {lvl:.2f} cm")
         if verbose:
-            print(f"Level received: level_tank={lvl_raw:.2f} cm")
+            print(f"Level received: level_tank={measured_distance:.2f} cm")
         
         message = [measured_distance]
+
+    else:
+        print("Respuesta inesperada:", data)
+        return
     
     if verbose:
         print(f"Recibido: ID={response_id:02x}, ADD={addr:02x}, CMD={cmd_dict.get(response_cmd,response_cmd)}, LEN={response_len}, DATA={payload}")
     
     return message
  
+
+def receive_all(addr, verbose=False):
+    """
+    Lee la respuesta a GET_ALL (0x04): (temp_bottom °C, temp_top °C, distancia cm).
+    Devuelve None si la trama no es válida. Si el firmware contesta con otra trama válida
+    (no soporta GET_ALL) se propaga LegacyResponse, igual que los errores del bus.
+    """
+    try:
+        data = get_bus().read_raw(addr, FRAME_LENGTHS[ALL])
+        frame = decode_frame(data, expected_cmd=ALL)
+        values = decode_all(frame, ALL_LAYOUT)
+        if verbose:
+            print(f"Recibido: ADD={addr:02x}, CMD={cmd_dict[frame.cmd]}, LEN={len(frame.payload)}, DATA={values}")
+        return values
+    except LegacyResponse:
+        raise
+    except FrameError as e:
+        print("Respuesta inválida:", e)
+        return None
+
+
 if __name__ == "__main__":
     PICO_ADDR = 0x13
-    bus = smbus2.SMBus(1)
  
     while True:
         try:
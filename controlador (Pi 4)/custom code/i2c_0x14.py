@@ -1,6 +1,11 @@
-import smbus2
 import time
 from cmd_dictionary import cmd_dict
+from i2c_bus import get_bus
+from frame_codec import FLOW, ALL, FrameError, LegacyResponse, decode_frame, decode_flow, decode_all, frame_length, layout
+
+FLOW_FRAME_LEN = frame_length(2)  # [id, FLOW, 2, lo, hi]
+ALL_LAYOUT = layout("<HB", (100.0, 1))  # flujo x100, PWM %
+ALL_FRAME_LEN = frame_length(ALL_LAYOUT.struct.size)
 
 
 def send_command(PICO_ADDRESS, id, cmd, data=[], verbose = False):
@@ -10,9 +15,8 @@ def send_command(PICO_ADDRESS, id, cmd, data=[], verbose = False):
     :param cmd: Código del comando (1 byte)
     :param data: Datos adicionales (lista de bytes)
     """
-    bus = smbus2.SMBus(1)  # Canal I2C en la Raspberry Pi 4
     packet = [id, cmd, len(data)] + data
-    bus.write_i2c_block_data(PICO_ADDRESS, 0x00, packet)
+    get_bus().write_block(PICO_ADDRESS, 0x00, packet)
     #print(f"Paquete enviado: {packet}")
     cmd_str = "SET" if cmd == 0x01 else "GET" #0x02 GET
     if verbose:
@@ -24,40 +28,42 @@ def receive_response(PICO_ADDRESS, verbose=True)-> float:
     """
 
     try:
-        bus = smbus2.SMBus(1)  # Canal I2C en la Raspberry Pi 4 para comunicarse con la Rasp. Pi Pico
-        data = bus.read_i2c_block_data(PICO_ADDRESS, 0x00, 5) ## <<< Aqui puede estar el error
+        data = get_bus().read_block(PICO_ADDRESS, 0x00, FLOW_FRAME_LEN)
         if verbose:
             print(f"Datos recibidos sin procesar: {data}") #Debugging
-        response_id = data[0]
-        response_cmd = data[1]
-        response_len = data[2]
-        response_data = data[3:3+response_len] #<< Revisar
-        
-        if response_cmd in cmd_dict:
-            response_cmd_str = cmd_dict[response_cmd]
-        else:
-            response_cmd_str = "UNKNOWN"
-        #response_cmd_str = cmd_dict[response_cmd]
-    # aquí el valor de flujo se extrae de los datos recibidos
-        if response_cmd == 0x13: # cmd para flow, Wenn es sich um die "FLOW"-Antwort handelt
-            flow_value = response_data[0] + (response_data[1] << 8) #combina los dos Bytes
-            flow_value /= 100.0 #wenn der Wert skaliert wurde, teile durch 100
-            if verbose:
-                print(f"Flujo recibido: {flow_value:.2f}")#Fliesskommazahl ausgeben
-        
-        #Ausgabe der gesamt empfangenen Antwort
+        frame = decode_frame(data, expected_cmd=FLOW, expected_len=2)
+        flow_value = decode_flow(frame.payload).values[0]
         if verbose:
-            print(f"Recibido: ADD={PICO_ADDRESS:02x}, CMD={response_cmd_str}, LEN={response_len}, DATA={response_data}")
+            print(f"Flujo recibido: {flow_value:.2f}")#Fliesskommazahl ausgeben
+            print(f"Recibido: ADD={PICO_ADDRESS:02x}, CMD={cmd_dict[frame.cmd]}, LEN={len(frame.payload)}, DATA={list(frame.payload)}")
         return flow_value
     except Exception as e:
         print(f"Error al leer la respuesta: {e}")
         return None
 
+def receive_all(PICO_ADDRESS, verbose=False):
+    """
+    Lee la respuesta a GET_ALL (0x04): (flujo L/min, PWM %).
+    Devuelve None si la trama no es válida. Si el firmware contesta con otra trama válida
+    (no soporta GET_ALL) se propaga LegacyResponse, igual que los errores del bus.
+    """
+    try:
+        data = get_bus().read_block(PICO_ADDRESS, 0x00, ALL_FRAME_LEN)
+        frame = decode_frame(data, expected_cmd=ALL)
+        values = decode_all(frame, ALL_LAYOUT)
+        if verbose:
+            print(f"Recibido: ADD={PICO_ADDRESS:02x}, CMD={cmd_dict[frame.cmd]}, LEN={len(frame.payload)}, DATA={values}")
+        return values
+    except LegacyResponse:
+        raise
+    except FrameError as e:
+        print(f"Error al leer la respuesta: {e}")
+        return None
+
 
 if __name__ == "__main__":
     # uC = microcontrolador
     PICO_ADDRESSES = 0x14 #, 0x11, 0x12, 0x13]  # Direcciones I2C de los uC
-    bus = smbus2.SMBus(1)  # Canal I2C en la Raspberry Pi 4
 
     value = 90
     increment = 5
@@ -0,0 +1,442 @@
+import errno
+import os
+import random
+import threading
+import time
+
+from metrics import Histogram, error_key
+
+try:
+    import smbus2
+except ImportError:  # fuera de la Raspberry Pi solo está disponible el bus simulado (sim_bus)
+    smbus2 = None
+
+
+class TransactionStats:
+    """
+    Contadores de tiempo por dirección I2C (una entrada por periférico),
+    con un histograma de latencia por operación y comando (p. ej. 'read 0x04').
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+        self.max_time = 0.0
+        self.errors = 0
+        self.errnos = {}         # {'errno 5': n, 'errno 110': n, ...}
+        self.retries = 0         # lecturas repetidas por respuestas no válidas
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.commands = {}       # {'write 0x04': Histogram, 'read 0x04': Histogram, ...}
+
+    def record(self, elapsed, ok=True, command=None, error=None):
+        self.count += 1
+        self.total_time += elapsed
+        self.last_time = elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if not ok:
+            self.errors += 1
+            if error is not None:
+                key = error_key(error)
+                self.errnos[key] = self.errnos.get(key, 0) + 1
+        if command is not None:
+            histogram = self.commands.get(command)
+            if histogram is None:
+                histogram = self.commands[command] = Histogram()
+            histogram.record(elapsed)
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': round(self.mean_time * 1000, 3),
+            'last_ms': round(self.last_time * 1000, 3),
+            'max_ms': round(self.max_time * 1000, 3),
+            'errnos': dict(self.errnos),
+            'retries': self.retries,
+            'bytes_written': self.bytes_written,
+            'bytes_read': self.bytes_read,
+        }
+
+
+class Turnaround:
+    """
+    Tiempo de espera adaptativo entre un GET y la lectura de la respuesta, por dirección.
+    Cada periférico parte de `initial`; si responde a tiempo se prueba con algo menos,
+    si no, se usa lo que realmente hubo que esperar. La espera aplicada lleva un margen
+    de seguridad y nunca supera `maximum` (el antiguo time.sleep fijo).
+    """
+    def __init__(self, initial=0.05, minimum=0.001, maximum=0.5, margin=0.25, alpha=0.2, probe=0.5):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.margin = margin
+        self.alpha = alpha
+        self.probe = probe
+        self.estimates = {}
+
+    def delay(self, address):
+        estimate = self.estimates.get(address, self.initial)
+        return min(self.maximum, max(self.minimum, estimate * (1 + self.margin)))
+
+    def record(self, address, waited, retries):
+        """
+        :param waited: tiempo total esperado hasta obtener una respuesta válida
+        :param retries: lecturas extra que hicieron falta (0 = respondió a la primera)
+        """
+        estimate = self.estimates.get(address, self.initial)
+        sample = waited if retries else waited * self.probe
+        estimate = (1 - self.alpha) * estimate + self.alpha * sample
+        self.estimates[address] = min(self.maximum, max(self.minimum, estimate))
+
+    def as_dict(self):
+        return {f"0x{address:02x}": round(self.delay(address) * 1000, 3)
+                for address in sorted(self.estimates)}
+
+
+class RetryPolicy:
+    """
+    Reintentos de una transacción que falla con un error transitorio del bus.
+    La espera antes del intento n es aleatoria entre 0 y min(maximum, base * 2**n)
+    ("full jitter"), así dos módulos que fallan juntos no reintentan sincronizados.
+    """
+    def __init__(self, attempts=2, base=0.002, maximum=0.05,
+                 errnos=(errno.EIO, errno.ETIMEDOUT, errno.EREMOTEIO, errno.EAGAIN)):
+        """
+        :param attempts: reintentos después del primer intento (0 = sin reintentos)
+        :param errnos: errores que se consideran transitorios
+        """
+        self.attempts = attempts
+        self.base = base
+        self.maximum = maximum
+        self.errnos = frozenset(errnos)
+
+    def retryable(self, error):
+        return isinstance(error, OSError) and error.errno in self.errnos
+
+    def delay(self, attempt, rng=random):
+        return rng.uniform(0, min(self.maximum, self.base * 2 ** attempt))
+
+
+class DeviceUnavailable(OSError):
+    """El circuit breaker de la dirección está abierto: no se intenta la transacción."""
+    def __init__(self, address):
+        super().__init__(errno.EIO, f"Device 0x{address:02x} unavailable (circuit open)")
+        self.address = address
+
+
+class CircuitBreaker:
+    """
+    Aísla un periférico que falla seguido. Tras `threshold` transacciones fallidas
+    consecutivas (ya con reintentos) el circuito se abre y las transacciones a esa
+    dirección fallan al instante con DeviceUnavailable, sin ocupar el bus.
+    Pasados `reset_timeout` segundos se deja pasar la siguiente (half-open):
+    si funciona el circuito se cierra, si falla se vuelve a abrir.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold=3, reset_timeout=5.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0        # fallos consecutivos
+        self.opened_at = None
+        self.trips = 0           # veces que se abrió
+        self.rejected = 0        # transacciones rechazadas con el circuito abierto
+
+    def allow(self, now):
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = now
+
+    def as_dict(self):
+        return {'state': self.state, 'failures': self.failures,
+                'trips': self.trips, 'rejected': self.rejected}
+
+
+class SMBusBackend:
+    """
+    Backend real: /dev/i2c-<channel> a través de smbus2.
+    Un backend expone write_block, read_block, write_raw, read_raw y close
+    (ver también sim_bus.SimBus).
+    """
+    def __init__(self, channel):
+        if smbus2 is None:
+            raise ImportError("smbus2 is required for the hardware I2C bus (pip install smbus2)")
+        self._bus = smbus2.SMBus(channel)
+
+    def write_block(self, address, register, data):
+        self._bus.write_i2c_block_data(address, register, list(data))
+
+    def read_block(self, address, register, length):
+        return self._bus.read_i2c_block_data(address, register, length)
+
+    def write_raw(self, address, data):
+        self._bus.i2c_rdwr(smbus2.i2c_msg.write(address, bytes(data)))
+
+    def read_raw(self, address, length):
+        msg = smbus2.i2c_msg.read(address, length)
+        self._bus.i2c_rdwr(msg)
+        return list(msg)
+
+    def close(self):
+        self._bus.close()
+
+
+class I2CBus:
+    """
+    Bus I2C compartido por todos los módulos (Pump, Heater1, Heater2, Valves, Tank, Radiator1).
+    Abre el backend una sola vez, serializa el acceso con un lock y
+    mide el tiempo de cada transacción por dirección.
+    """
+    def __init__(self, channel=1, backend=None, retry=None, breaker_threshold=3, breaker_timeout=5.0):
+        """
+        :param backend: función backend(channel) que abre el bus; por defecto SMBusBackend
+        :param retry: RetryPolicy de las transacciones (por defecto 2 reintentos)
+        :param breaker_threshold: fallos consecutivos que abren el circuito de una dirección
+        :param breaker_timeout: segundos con el circuito abierto antes de volver a probar
+        """
+        self.channel = channel
+        self.backend = backend or SMBusBackend
+        self.lock = threading.RLock()
+        self.stats = {}
+        self.turnaround = Turnaround()
+        self.retry = retry or RetryPolicy()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+        self.breakers = {}
+        self.random = random.Random()
+        # Reloj del bus; plant_sim los reemplaza por un reloj simulado
+        self.sleep = time.sleep
+        self.time = time.time
+        self.monotonic = time.monotonic
+        self._bus = None
+        self._last_cmd = {}  # último comando escrito por dirección, para etiquetar las lecturas
+
+    # --- Ciclo de vida ---
+    def open(self):
+        with self.lock:
+            if self._bus is None:
+                self._bus = self.backend(self.channel)
+        return self
+
+    def close(self):
+        with self.lock:
+            if self._bus is not None:
+                self._bus.close()
+                self._bus = None
+
+    @property
+    def is_open(self):
+        return self._bus is not None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- Transacciones ---
+    def _transaction(self, address, func, op, nbytes):
+        """
+        Ejecuta una transacción con reintentos (self.retry) y el circuit breaker de la dirección.
+        :param op: 'write' o 'read'; junto con el comando forma la clave del histograma
+        :param nbytes: bytes transferidos si la transacción termina bien
+        """
+        with self.lock:
+            if self._bus is None:
+                self.open()
+            breaker = self.breaker(address)
+            if not breaker.allow(self.monotonic()):
+                raise DeviceUnavailable(address)
+            cmd = self._last_cmd.get(address)
+            command = op if cmd is None else f"{op} 0x{cmd:02x}"
+            stats = self._stats_for(address)
+            attempt = 0
+            while True:
+                start = time.perf_counter()
+                try:
+                    result = func(self._bus)
+                except Exception as e:
+                    stats.record(time.perf_counter() - start, ok=False, command=command, error=e)
+                    if attempt < self.retry.attempts and self.retry.retryable(e):
+                        stats.retries += 1
+                        self.sleep(self.retry.delay(attempt, self.random))
+                        attempt += 1
+                        continue
+                    breaker.record_failure(self.monotonic())
+                    raise
+                stats.record(time.perf_counter() - start, command=command)
+                breaker.record_success()
+                if op == 'write':
+                    stats.bytes_written += nbytes
+                else:
+                    stats.bytes_read += nbytes
+                return result
+
+    def breaker(self, address):
+        """CircuitBreaker de una dirección (se crea al primer uso)."""
+        breaker = self.breakers.get(address)
+        if breaker is None:
+            breaker = self.breakers[address] = CircuitBreaker(self.breaker_threshold, self.breaker_timeout)
+        return breaker
+
+    def available(self, address):
+        """False mientras el circuito de la dirección está abierto."""
+        breaker = self.breakers.get(address)
+        return breaker is None or breaker.state != CircuitBreaker.OPEN
+
+    def _note_command(self, address, data):
+        # Paquete [id, cmd, len, data...]: el comando es el segundo byte
+        self._last_cmd[address] = data[1] if len(data) > 1 else None
+
+    def _stats_for(self, address):
+        stats = self.stats.get(address)
+        if stats is None:
+            stats = self.stats[address] = TransactionStats()
+        return stats
+
+    def write_block(self, address, register, data):
+        """Escribe un bloque [register, data...] (equivale a write_i2c_block_data)."""
+        with self.lock:
+            self._note_command(address, data)
+            return self._transaction(address, lambda bus: bus.write_block(address, register, data),
+                                     'write', len(data) + 1)
+
+    def read_block(self, address, register, length):
+        """Lee length bytes tras escribir el registro (equivale a read_i2c_block_data)."""
+        return self._transaction(address, lambda bus: bus.read_block(address, register, length),
+                                 'read', length)
+
+    def write_raw(self, address, data):
+        """Escritura I2C sin byte de registro (i2c_rdwr)."""
+        with self.lock:
+            self._note_command(address, data)
+            return self._transaction(address, lambda bus: bus.write_raw(address, data), 'write', len(data))
+
+    def read_raw(self, address, length):
+        """Lectura I2C sin byte de registro (i2c_rdwr)."""
+        return self._transaction(address, lambda bus: bus.read_raw(address, length), 'read', length)
+
+    def record_retry(self, address, count=1):
+        """Cuenta lecturas repetidas de una dirección (request() y el barrido las registran)."""
+        with self.lock:
+            self._stats_for(address).retries += count
+
+    def request(self, address, send, receive, valid=None, retries=2):
+        """
+        Envía un GET y lee la respuesta tras el turnaround aprendido para esa dirección.
+        Si la respuesta no es válida se vuelve a leer con el doble de espera.
+        :param send: función que envía el comando
+        :param receive: función que lee y decodifica la respuesta
+        :param valid: criterio de respuesta válida (por defecto, distinta de None)
+        :return: la última respuesta leída
+        """
+        if valid is None:
+            valid = lambda response: response is not None
+        with self.lock:
+            send()
+            delay = self.turnaround.delay(address)
+            waited = 0.0
+            for attempt in range(retries + 1):
+                self.sleep(delay)
+                waited += delay
+                if attempt:
+                    self.record_retry(address)
+                response = receive()
+                if valid(response):
+                    self.turnaround.record(address, waited, attempt)
+                    return response
+                delay = min(self.turnaround.maximum, delay * 2)
+            return response
+
+    def get_stats(self):
+        """Devuelve los contadores de tiempo por dirección, p. ej. {'0x10': {...}}."""
+        with self.lock:
+            result = {}
+            for address, stats in sorted(self.stats.items()):
+                result[f"0x{address:02x}"] = dict(stats.as_dict(), turnaround_ms=round(self.turnaround.delay(address) * 1000, 3),
+                                                  circuit=self.breaker(address).as_dict())
+            return result
+
+    def get_metrics(self):
+        """
+        get_stats() más los histogramas de latencia por comando, p. ej.
+        {'0x11': {..., 'commands': {'write 0x04': {...}, 'read 0x04': {...}}}}.
+        """
+        with self.lock:
+            result = self.get_stats()
+            for address, stats in self.stats.items():
+                result[f"0x{address:02x}"]['commands'] = {
+                    command: histogram.as_dict() for command, histogram in sorted(stats.commands.items())}
+            return result
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+
+
+# Una sola instancia por proceso
+_shared_bus = None
+_shared_lock = threading.Lock()
+
+
+def get_bus(channel=1):
+    """
+    Devuelve el bus compartido del proceso, abriéndolo la primera vez.
+    Con la variable de entorno THERMIAL_BUS=sim se usa el bus simulado (sim_bus).
+    """
+    global _shared_bus
+    with _shared_lock:
+        if _shared_bus is None:
+            backend = None
+            if os.environ.get("THERMIAL_BUS") == "sim":
+                import sim_bus
+                backend = sim_bus.SimBus().backend
+            _shared_bus = I2CBus(channel, backend)
+        return _shared_bus.open()
+
+
+def set_backend(backend):
+    """
+    Cambia el backend del bus compartido, p. ej. set_backend(sim_bus.SimBus().backend).
+    Los contadores se conservan; el nuevo backend se abre en la siguiente transacción.
+    """
+    global _shared_bus
+    with _shared_lock:
+        if _shared_bus is None:
+            _shared_bus = I2CBus(backend=backend)
+        else:
+            _shared_bus.close()
+            _shared_bus.backend = backend
+        return _shared_bus
+
+
+def close_bus():
+    """
+    Cierra el descriptor del bus compartido (p. ej. al terminar un experimento).
+    La instancia se conserva, con sus contadores, y se reabre en la siguiente transacción.
+    """
+    with _shared_lock:
+        if _shared_bus is not None:
+            _shared_bus.close()
@@ -0,0 +1,104 @@
+"""
+Instrumentación de los caminos críticos: histogramas de latencia con buckets fijos
+(registrar una muestra es O(log buckets) y no guarda las muestras) y contadores de
+llamadas/errores por método. Los usan i2c_bus (por dirección y comando) y
+thermial_error_handling.safe_call (por método de Loop).
+"""
+
+import threading
+from bisect import bisect_left
+
+# Límites superiores de los buckets en segundos (100 µs … 2.5 s); el último bucket es +inf
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def error_key(error):
+    """
+    'errno 5', 'errno 110', ... para los OSError del sistema; si no, el nombre de la
+    excepción (p. ej. 'DeviceUnavailable' del circuit breaker).
+    """
+    if isinstance(error, OSError) and error.errno is not None and type(error).__module__ == "builtins":
+        return f"errno {error.errno}"
+    return type(error).__name__
+
+
+class Histogram:
+    """
+    Histograma de latencias con buckets fijos.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed):
+        self.counts[bisect_left(self.buckets, elapsed)] += 1
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def percentile(self, q):
+        """
+        Percentil aproximado: límite superior del bucket que lo contiene (s).
+        :param q: entre 0 y 1, p. ej. 0.95
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.mean * 1000, 3),
+            'p50_ms': round(self.percentile(0.5) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'le_ms': [round(bound * 1000, 3) for bound in self.buckets] + ['inf'],
+            'counts': list(self.counts),
+        }
+
+
+class CallStats:
+    """
+    Duración y errores de cada método instrumentado (ver safe_call).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.errors = {}  # {método: {'errno 5': n, 'TypeError': n, ...}}
+
+    def record(self, name, elapsed, error=None):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(elapsed)
+            if error is not None:
+                errors = self.errors.setdefault(name, {})
+                key = error_key(error)
+                errors[key] = errors.get(key, 0) + 1
+
+    def as_dict(self):
+        with self.lock:
+            return {name: dict(histogram.as_dict(), errors=dict(self.errors.get(name, {})))
+                    for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.errors.clear()
@@ -0,0 +1,221 @@
+"""
+Modelo térmico-hidráulico concentrado del doble lazo, acoplado al bus simulado.
+
+Lazo solar: la bomba 1 saca agua del fondo del estanque, pasa por el calentador 1
+y el calentador 2 y vuelve por la válvula 1 a la capa superior del estanque
+(por la válvula 2 vuelve directamente al fondo). Lazo de proceso: la bomba 2 saca
+agua de la capa superior, la enfría en el disipador (ventilador = PWM) y la devuelve
+al fondo. El estanque se modela con N capas para representar la estratificación.
+
+Las temperaturas de todos los nodos se integran juntas como un vector NumPy. El tiempo
+lo lleva un SimClock: cada sleep() del bus avanza el modelo, así que un ensayo de un día
+se reproduce en segundos (speed=None) o a una velocidad fija (p. ej. speed=1000).
+
+    import plant_sim
+    plant = plant_sim.install(speed=None, seed=1)
+    solar, process = SolarLoop(), ProcessLoop()
+    solar.run_synchronized_test(process, duration_minutes=24 * 60, interval_seconds=1)
+"""
+
+import time
+
+import numpy as np
+
+import i2c_bus
+import sim_bus
+
+CP = 4186.0  # J/(kg K), agua (1 L = 1 kg)
+
+# Índices del vector de temperaturas
+HEATER1, HEATER2, RADIATOR = 0, 1, 2
+TANK = 3  # capas del estanque desde aquí, de abajo hacia arriba
+
+
+class SimClock:
+    """
+    Reloj simulado: monotonic() empieza en 0 y solo avanza con sleep().
+    :param start: epoch del instante 0 (por defecto, ahora)
+    :param speed: factor sobre el tiempo real (1000 = mil veces más rápido; None = sin esperar)
+    """
+    def __init__(self, start=None, speed=None):
+        self.start = time.time() if start is None else start
+        self.speed = speed
+        self.now = 0.0
+        self.listeners = []  # funciones f(now) llamadas cada vez que avanza el reloj
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.start + self.now
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        self.now += seconds
+        for listener in self.listeners:
+            listener(self.now)
+
+
+class PlantParams:
+    """Parámetros físicos del banco de ensayo (valores típicos, ajustables)."""
+    def __init__(self):
+        self.ambient = 20.0              # °C
+        self.heater_power_w = 40.0       # W al 100 % (mismo factor que power_heaterX_W)
+        self.heater_mass = 0.3           # kg de agua en cada calentador
+        self.radiator_mass = 0.3
+        self.tank_volume = 20.0          # L
+        self.tank_layers = 4
+        self.tank_height = 40.0          # cm; el sensor mide la distancia hasta la superficie
+        self.sensor_height = 45.0        # cm desde el fondo hasta el sensor de nivel
+        self.max_flow = 5.0              # L/min de cada bomba al 100 %
+        self.pump_deadband = 15          # % de PWM por debajo del cual la bomba no mueve agua
+        self.ua_heater = 0.5             # W/K pérdidas al ambiente
+        self.ua_tank = 1.0               # W/K por capa
+        self.ua_radiator_min = 2.0       # W/K con el ventilador parado
+        self.ua_radiator_max = 25.0      # W/K con el ventilador al 100 %
+        self.layer_mixing = 0.5          # W/K conducción/mezcla entre capas
+        self.noise_temp = 0.03           # °C, desviación de los sensores
+        self.noise_flow = 0.02           # L/min
+        self.noise_distance = 0.1        # cm
+
+
+class Plant:
+    """
+    Planta simulada. Lee los actuadores de los firmwares (PWM, relés) y escribe en ellos
+    las temperaturas, flujos y distancia calculados.
+    """
+    def __init__(self, sim, clock, params=None, seed=None, max_step=0.5):
+        self.sim = sim
+        self.clock = clock
+        self.params = params or PlantParams()
+        self.random = np.random.default_rng(seed)
+        self.max_step = max_step
+        p = self.params
+        self.temps = np.full(TANK + p.tank_layers, p.ambient, dtype=np.float64)
+        layer_mass = p.tank_volume / p.tank_layers
+        self.mass = np.array([p.heater_mass, p.heater_mass, p.radiator_mass] + [layer_mass] * p.tank_layers)
+        self.flows = (0.0, 0.0, 0.0, 0.0)  # bomba 1, bomba 2, válvula 1, válvula 2 (L/min)
+        self.time = clock.monotonic()
+        self.steps = 0
+        clock.listeners.append(self.advance)
+        self.publish()
+
+    # --- Actuadores ---
+    def pump_flow(self, power):
+        p = self.params
+        if power <= p.pump_deadband:
+            return 0.0
+        return p.max_flow * (power - p.pump_deadband) / (100 - p.pump_deadband)
+
+    def actuators(self):
+        fw = self.sim.firmwares
+        valves = fw[0x12]
+        # El relé activo corta el paso (open_valve() envía 3/4 = relé LOW)
+        open1, open2 = not valves.relays[0], not valves.relays[1]
+        q1 = self.pump_flow(fw[0x10].power) if (open1 or open2) else 0.0
+        share1 = 1.0 if open1 and not open2 else 0.5 if open1 else 0.0
+        return {
+            'q1': q1,
+            'q2': self.pump_flow(fw[0x14].power),
+            'qv1': q1 * share1,
+            'qv2': q1 * (1.0 - share1),
+            'heater1': fw[0x11].power / 100.0 * self.params.heater_power_w,
+            'heater2': fw[0x16].power / 100.0 * self.params.heater_power_w,
+            'fan': fw[0x15].power / 100.0,
+        }
+
+    # --- Dinámica ---
+    def derivatives(self, T, a):
+        """dT/dt de todos los nodos (K/s)."""
+        p = self.params
+        m1, m2 = a['q1'] / 60.0, a['q2'] / 60.0          # kg/s
+        mv1, mv2 = a['qv1'] / 60.0, a['qv2'] / 60.0
+        tank = T[TANK:]
+        bottom, top = tank[0], tank[-1]
+
+        heat = np.zeros_like(T)  # W por nodo
+        heat[HEATER1] = a['heater1'] + m1 * CP * (bottom - T[HEATER1])
+        heat[HEATER2] = a['heater2'] + m1 * CP * (T[HEATER1] - T[HEATER2])
+        ua_fan = p.ua_radiator_min + a['fan'] * (p.ua_radiator_max - p.ua_radiator_min)
+        heat[RADIATOR] = m2 * CP * (top - T[RADIATOR]) - ua_fan * (T[RADIATOR] - p.ambient)
+
+        # Estanque: entradas y salidas en las capas extremas
+        tank_heat = heat[TANK:]
+        tank_heat[-1] += mv1 * CP * (T[HEATER2] - top)        # retorno solar por válvula 1 arriba
+        tank_heat[0] += mv2 * CP * (T[HEATER2] - bottom)       # retorno solar por válvula 2 abajo
+        tank_heat[0] += m2 * CP * (T[RADIATOR] - bottom)       # retorno del disipador abajo
+        # Advección entre capas: caudal neto hacia abajo (positivo) o hacia arriba
+        down = mv1 - m2
+        if down > 0:
+            tank_heat[:-1] += down * CP * (tank[1:] - tank[:-1])
+        elif down < 0:
+            tank_heat[1:] += -down * CP * (tank[:-1] - tank[1:])
+        # Mezcla/conducción entre capas
+        gradient = p.layer_mixing * np.diff(tank)
+        tank_heat[:-1] += gradient
+        tank_heat[1:] -= gradient
+
+        # Pérdidas al ambiente
+        heat[[HEATER1, HEATER2]] -= p.ua_heater * (T[[HEATER1, HEATER2]] - p.ambient)
+        tank_heat -= p.ua_tank * (tank - p.ambient)
+
+        return heat / (self.mass * CP)
+
+    def step(self, dt):
+        a = self.actuators()
+        n = max(1, int(np.ceil(dt / self.max_step)))
+        h = dt / n
+        for _ in range(n):
+            self.temps += h * self.derivatives(self.temps, a)
+        self.flows = (a['q1'], a['q2'], a['qv1'], a['qv2'])
+        self.steps += n
+
+    def advance(self, now):
+        """Integra hasta now y actualiza los sensores (listener del SimClock)."""
+        dt = now - self.time
+        if dt <= 0:
+            return
+        self.step(dt)
+        self.time = now
+        self.publish()
+
+    # --- Sensores ---
+    def _noisy(self, values, sigma):
+        values = np.asarray(values, dtype=np.float64)
+        if sigma:
+            values = values + self.random.normal(0.0, sigma, values.shape)
+        return np.clip(values, 0.0, None)
+
+    def publish(self):
+        """Escribe los valores medidos en los firmwares simulados."""
+        p, fw, T = self.params, self.sim.firmwares, self.temps
+        q1, q2, qv1, qv2 = self._noisy(self.flows, p.noise_flow) * (np.array(self.flows) > 0)
+        t_in1, t_out1, t_out2, t_rad_in, t_rad_out, t_bottom, t_top = self._noisy(
+            [T[TANK], T[HEATER1], T[HEATER2], T[-1], T[RADIATOR], T[TANK], T[-1]], p.noise_temp)
+        fw[0x10].flow, fw[0x14].flow = q1, q2
+        fw[0x12].flows = [qv1, qv2]
+        fw[0x11].temps = [t_in1, t_out1]
+        fw[0x16].temps = [t_out2]
+        fw[0x15].temps = [t_rad_in, t_rad_out]
+        tank = fw[0x13]
+        tank.temp_bottom, tank.temp_top = t_bottom, t_top
+        water_level = p.tank_height  # lazo cerrado: el nivel no cambia
+        tank.distance = float(self._noisy([p.sensor_height - water_level], p.noise_distance)[0])
+
+
+def install(speed=None, seed=None, latency=0.002, params=None, start=None):
+    """
+    Crea reloj, bus simulado y planta, y los conecta al bus compartido (i2c_bus.get_bus()).
+    :return: Plant (plant.clock, plant.sim)
+    """
+    clock = SimClock(start=start, speed=speed)
+    sim = sim_bus.install(latency=latency, seed=seed, clock=clock.monotonic, sleep=clock.sleep)
+    # Los firmwares de bomba ya no fijan el flujo: lo calcula la planta
+    for address in (0x10, 0x14):
+        sim.firmwares[address].flow_per_percent = None
+    bus = i2c_bus.get_bus()
+    bus.sleep, bus.time, bus.monotonic = clock.sleep, clock.time, clock.monotonic
+    return Plant(sim, clock, params=params, seed=seed)
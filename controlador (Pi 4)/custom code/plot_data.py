@@ -1,112 +1,47 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+"""
+Gráfico rápido de un ensayo exportado por Loop (export_to_csv / start_stream).
 
-def plot_solar_loop_data(csv_filepath):
-    """
-    Loads, processes, and plots experimental data from a semicolon-separated CSV file.
-
-    Args:
-        csv_filepath (str): The full path to the CSV file.
-    """
-    try:
-        # --- 1. Load Data ---
-        # Read the CSV file, specifying the semicolon separator and comma decimal point.
-        df = pd.read_csv(
-            csv_filepath,
-            sep=';',
-            decimal=','
-        )
-
-        # --- 2. Data Cleaning and Preparation ---
-
-        # Extract experiment date from the 'Fecha' column for a more robust title.
-        try:
-            # Get the date from the first row, assuming it's constant for the experiment.
-            # The dayfirst=True argument correctly interprets DD/MM/YYYY format.
-            date_str = df['Fecha'].iloc[0]
-            experiment_date = pd.to_datetime(date_str, dayfirst=True).strftime('%Y-%m-%d')
-        except (IndexError, KeyError, ValueError):
-            # Fallback if 'Fecha' column is missing, empty, or has an unexpected format.
-            experiment_date = "Fecha Desconocida"
-
-        # Combine 'Fecha' and 'Hora' into a single datetime column.
-        df['Timestamp'] = pd.to_datetime(df['Fecha'] + ' ' + df['Hora'], dayfirst=True)
-
-        # Set the new 'Timestamp' column as the index for easier time-series plotting.
-        df.set_index('Timestamp', inplace=True)
-
-        # Clean up column names for easier access (remove special characters and spaces).
-        # This is a good practice for writing clean code.
-        df.columns = [
-            'Fecha', 'Hora', 'Bomba_Potencia_pct', 'Bomba_Flujo_L_min',
-            'Calentador_Potencia_pct', 'Calentador_Potencia_W', 'Temp_Entrada_C',
-            'Temp_Salida_C', 'Valvula1_Estado', 'Valvula2_Estado',
-            'Valvula1_Flujo_L_min', 'Valvula2_Flujo_L_min', 'Nivel_Estanque_cm',
-            'Estanque_Temp3_C', 'Estanque_Temp4_C', 'Dissipador_Potencia_pct', 'Dissipador_Temp5_C', 'Dissipador_Temp6_C'
-        ]
+Antes renombraba las columnas por posición a un esquema antiguo (Fecha, Hora, ...) que
+ya no coincide con lo que escribe export_to_csv, y guardaba en una ruta fija de Windows.
+Ahora es un atajo al paquete analysis (controlador (Pi 4)/analysis): lee las columnas
+por nombre, calcula ΔT, potencia térmica, eficiencia y energía del estanque, y guarda
+el gráfico junto al archivo de datos.
 
-        print("Data loaded and prepared successfully. Columns available:")
-        print(df.columns)
+    $ python3 plot_data.py test_data/solarloop_test_20250717_134515_001.csv
+"""
 
-        # --- 3. Plotting ---
+import os
+import sys
 
-        # Create a figure with 2x2 subplots for a comprehensive overview.
-        fig, axs = plt.subplots(2, 2, figsize=(12, 7), sharex=True)
-        fig.suptitle(f'Análisis de Datos del Experimento - {experiment_date}', fontsize=16)
+# ——————————————————————————————————————————
+# Ajuste de ruta para el paquete analysis
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
 
-        # Plot 1: Inlet and Outlet Temperatures
-        axs[0, 0].plot(df.index, df['Temp_Entrada_C'], label='Temp. Entrada (°C)', color='red')
-        axs[0, 0].plot(df.index, df['Temp_Salida_C'], label='Temp. Salida (°C)', color='blue')
-        axs[0, 0].set_ylabel('Temperatura (°C)')
-        axs[0, 0].set_title('Temperaturas del Calentador')
-        axs[0, 0].legend()
-        axs[0, 0].grid(True, linestyle='--', alpha=0.6)
+from analysis import load_run, plot_run
 
-        # Plot 2: Tank Temperatures
-        axs[0, 1].plot(df.index, df['Estanque_Temp3_C'], label='Temp. Estanque 3 (°C)', color='purple')
-        axs[0, 1].plot(df.index, df['Estanque_Temp4_C'], label='Temp. Estanque 4 (°C)', color='orange')
-        axs[0, 1].set_ylabel('Temperatura (°C)')
-        axs[0, 1].set_title('Temperaturas del Estanque')
-        axs[0, 1].legend()
-        axs[0, 1].grid(True, linestyle='--', alpha=0.6)
 
-        # Plot 3: Power Percentages
-        axs[1, 0].plot(df.index, df['Bomba_Potencia_pct'], label='Potencia Bomba (%)', linestyle='--')
-        axs[1, 0].plot(df.index, df['Calentador_Potencia_pct'], label='Potencia Calentador (%)', linestyle=':')
-        axs[1, 0].set_ylabel('Potencia (%)')
-        axs[1, 0].set_title('Potencia de Componentes')
-        axs[1, 0].legend()
-        axs[1, 0].grid(True, linestyle='--', alpha=0.6)
-        axs[1, 0].set_ylim(0, 100)
-
-        # Plot 4: Flow Rates
-        axs[1, 1].plot(df.index, df['Bomba_Flujo_L_min'], label='Flujo Bomba (L/min)')
-        axs[1, 1].plot(df.index, df['Valvula1_Flujo_L_min'], label='Flujo Válvula 1 (L/min)', linestyle='--')
-        axs[1, 1].set_ylabel('Flujo (L/min)')
-        axs[1, 1].set_title('Flujos del Sistema')
-        axs[1, 1].legend()
-        axs[1, 1].grid(True, linestyle='--', alpha=0.6)
-
-        # Improve formatting for all subplots
-        for ax in axs.flat:
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-            plt.setp(ax.get_xticklabels(), rotation=30, ha='right')
-
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95]) # Adjust layout to make room for suptitle
-        save_path = r"C:\Users\Ricarda-Laura Sack\Desktop\Proyecto Ricarda\Experimentos\Calentador y sensores de temperatura\Plots\plot_experiment.png"
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        plt.show()
+def plot_solar_loop_data(csv_filepath, save_path=None, show=True):
+    """
+    Loads and plots the data of one experiment.
 
+    Args:
+        csv_filepath (str): CSV/Parquet file, folder or glob pattern of the experiment.
+        save_path (str): output image; by default next to the data file (.png).
+    """
+    try:
+        run = load_run(csv_filepath)
+        save_path = save_path or os.path.splitext(run.files[0])[0] + ".png"
+        plot_run(run, save_path, show=show)
+        print(f"Plot saved to {save_path} ({len(run)} points)")
+        return save_path
     except FileNotFoundError:
         print(f"Error: The file was not found at {csv_filepath}")
-    except Exception as e:
+    except (KeyError, ValueError) as e:
         print(f"An error occurred: {e}")
 
+
 if __name__ == '__main__':
-    # --- IMPORTANT ---
-    # Replace this with the actual path to your CSV file.
-   # file_path = r'c:\Users\Pablo Castillo\OneDrive - fraunhofer.cl\Documentos\01. RESEARCH\01. THERMIAL\06. Resultados\solarloop_test_20250625.csv'
-    file_path = "/home/thermial/Desktop/Thermial/controlador (Pi 4)/custom code/test_data/experimento_una_hora2025-07-17_13-45-15.csv"
+    file_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(current_dir, "test_data")
     plot_solar_loop_data(file_path)
-
@@ -0,0 +1,132 @@
+import time
+from collections import namedtuple
+
+# Un tick del scheduler: número de deadline, deadline relativo al inicio (s), retraso
+# con el que empezó (s) y los contadores acumulados de overruns y deadlines saltados
+Tick = namedtuple("Tick", ["index", "deadline", "jitter", "overruns", "skipped"])
+
+POLICIES = ("skip", "catch_up")
+
+
+class TickStats:
+    """
+    Estadísticas de temporización de un PeriodicScheduler.
+    """
+    def __init__(self):
+        self.ticks = 0
+        self.overruns = 0       # ticks que terminaron después del siguiente deadline
+        self.skipped = 0        # deadlines saltados (política 'skip')
+        self.last_jitter = 0.0
+        self.max_jitter = 0.0
+        self.total_jitter = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def record_start(self, jitter):
+        self.ticks += 1
+        self.last_jitter = jitter
+        self.total_jitter += jitter
+        if jitter > self.max_jitter:
+            self.max_jitter = jitter
+
+    def record_duration(self, duration):
+        self.last_duration = duration
+        if duration > self.max_duration:
+            self.max_duration = duration
+
+    @property
+    def mean_jitter(self):
+        return self.total_jitter / self.ticks if self.ticks else 0.0
+
+    def as_dict(self):
+        return {
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'skipped': self.skipped,
+            'mean_jitter_ms': round(self.mean_jitter * 1000, 3),
+            'last_jitter_ms': round(self.last_jitter * 1000, 3),
+            'max_jitter_ms': round(self.max_jitter * 1000, 3),
+            'last_duration_ms': round(self.last_duration * 1000, 3),
+            'max_duration_ms': round(self.max_duration * 1000, 3),
+        }
+
+
+class PeriodicScheduler:
+    """
+    Ejecuta una tarea cada `interval` segundos con deadlines fijos sobre un reloj monotónico,
+    así el periodo no deriva aunque cada muestra tarde distinto.
+    Si una muestra termina después del siguiente deadline se cuenta un overrun y:
+      - 'skip': se saltan los deadlines perdidos y se sigue en el próximo futuro
+      - 'catch_up': se ejecutan los deadlines perdidos seguidos hasta recuperar el ritmo
+
+        scheduler = PeriodicScheduler(20)
+        for tick in scheduler.ticks(duration=600):
+            loop.append_to_data_log(tick=tick)
+    """
+    def __init__(self, interval, policy="skip", clock=time.monotonic, sleep=time.sleep):
+        """
+        :param interval: periodo en segundos
+        :param policy: 'skip' o 'catch_up'
+        :param clock: reloj monotónico (inyectable para simulación)
+        :param sleep: función de espera (inyectable para simulación)
+        """
+        if interval <= 0:
+            raise ValueError("interval has to be > 0")
+        if policy not in POLICIES:
+            raise ValueError(f"policy has to be one of {POLICIES}")
+        self.interval = interval
+        self.policy = policy
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = TickStats()
+        self.running = False
+
+    def stop(self):
+        """Termina ticks() después del tick en curso."""
+        self.running = False
+
+    def ticks(self, duration=None, count=None):
+        """
+        Generador de ticks; el cuerpo del for es la tarea y su duración se mide entre yields.
+        :param duration: segundos desde el primer tick (None = sin límite)
+        :param count: número máximo de ticks (None = sin límite)
+        """
+        start = self.clock()
+        index = 0
+        deadline = start
+        emitted = 0
+        self.running = True
+        while self.running:
+            if count is not None and emitted >= count:
+                break
+            if duration is not None and deadline - start >= duration:
+                break
+
+            now = self.clock()
+            if deadline > now:
+                self.sleep(deadline - now)
+                now = self.clock()
+            jitter = now - deadline
+            self.stats.record_start(jitter)
+
+            yield Tick(index, deadline - start, jitter, self.stats.overruns, self.stats.skipped)
+
+            finished = self.clock()
+            self.stats.record_duration(finished - now)
+            emitted += 1
+            index += 1
+            deadline += self.interval
+            if finished > deadline:
+                self.stats.overruns += 1
+                if self.policy == "skip":
+                    missed = int((finished - deadline) // self.interval) + 1
+                    deadline += missed * self.interval
+                    index += missed
+                    self.stats.skipped += missed
+        self.running = False
+
+    def run(self, task, duration=None, count=None):
+        """Llama task(tick) en cada tick. Devuelve las estadísticas."""
+        for tick in self.ticks(duration=duration, count=count):
+            task(tick)
+        return self.stats
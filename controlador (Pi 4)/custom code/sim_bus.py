@@ -0,0 +1,267 @@
+"""
+Bus I2C simulado con los firmwares de los módulos Pico, para probar y medir el
+controlador sin la Raspberry Pi.
+
+Cada firmware responde con las mismas tramas que su .ino en modulos (Pi Zero):
+bombas/flujómetros 0x10/0x14, calentadores 0x11/0x16, válvulas 0x12, estanque 0x13
+y disipador 0x15. Se puede configurar el tiempo que tarda cada módulo en tener lista
+la respuesta y se pueden inyectar errores (errno 5/110 y tramas cortas).
+
+    import sim_bus
+    sim = sim_bus.install()          # el bus compartido pasa a ser el simulador
+    sim.set_faults(0x11, io_error=0.05)
+    loop = Loop()
+"""
+
+import errno
+import random
+import struct
+import time
+
+import i2c_bus
+
+CMD_SET = 0x01
+CMD_GET = 0x02
+CMD_GET_PWM = 0x03
+CMD_GET_ALL = 0x04
+RESP_TEMP = 0x12
+RESP_FLOW = 0x13
+RESP_LEVEL = 0x14
+RESP_PWM = 0x15
+RESP_ALL = 0x16
+
+
+def _u16(value, scale):
+    return list(struct.pack("<H", max(0, min(0xFFFF, int(value * scale)))))
+
+
+class Firmware:
+    """
+    Modelo de un módulo Pico: guarda la última orden recibida (receiveEvent) y
+    arma la trama correspondiente cuando el master lee (requestEvent).
+    """
+    def __init__(self, address, latency=0.0):
+        """
+        :param latency: segundos desde la orden hasta que la nueva respuesta está lista;
+                        antes de eso el módulo sigue entregando la trama anterior
+        """
+        self.address = address
+        self.latency = latency
+        self.last_cmd = 0
+        self._pending = None  # (cmd, instante en que queda lista)
+
+    def receive(self, packet, now):
+        """Paquete [id, cmd, len, data...] escrito por el master."""
+        if len(packet) < 3:
+            return
+        cmd, length = packet[1], packet[2]
+        data = list(packet[3:3 + length])
+        if cmd == CMD_SET:
+            self.set(data)
+        self._pending = (cmd, now + self.latency)
+
+    def request(self, now):
+        """Trama que el módulo devuelve en requestEvent()."""
+        if self._pending is not None and now >= self._pending[1]:
+            self.last_cmd = self._pending[0]
+            self._pending = None
+        return self.response(self.last_cmd)
+
+    def set(self, data):
+        pass
+
+    def response(self, cmd):
+        raise NotImplementedError
+
+
+class PumpFirmware(Firmware):
+    """Bomba + flujómetro (0x10, 0x14): SET = PWM %, GET = flujo, GET_ALL = flujo + PWM."""
+    def __init__(self, address, latency=0.0, flow_per_percent=0.05):
+        """:param flow_per_percent: flujo (L/min) por % de PWM; None = lo fija otro (plant_sim)"""
+        super().__init__(address, latency)
+        self.power = 0
+        self.flow = 0.0  # L/min
+        self.flow_per_percent = flow_per_percent
+
+    def set(self, data):
+        if len(data) == 1:
+            self.power = max(0, min(100, data[0]))
+            if self.flow_per_percent is not None:
+                self.flow = self.power * self.flow_per_percent
+
+    def response(self, cmd):
+        if cmd == CMD_GET_ALL:
+            return [1, RESP_ALL, 3] + _u16(self.flow, 100) + [self.power]
+        return [1, RESP_FLOW, 2] + _u16(self.flow, 100)
+
+
+class HeaterFirmware(Firmware):
+    """
+    Calentador 1 (0x11, temp_in y temp_out), calentador 2 (0x16, solo temp_out)
+    y disipador (0x15, mismo formato que 0x11): SET = PWM %, GET = temperaturas,
+    GET_PWM = PWM, GET_ALL = temperaturas + PWM.
+    """
+    def __init__(self, address, sensors=2, latency=0.0):
+        super().__init__(address, latency)
+        self.power = 0
+        self.temps = [20.0] * sensors  # °C
+
+    def set(self, data):
+        if len(data) == 1:
+            self.power = max(0, min(100, data[0]))
+
+    def response(self, cmd):
+        temps = [byte for value in self.temps for byte in _u16(value, 100)]
+        if cmd == CMD_GET_PWM:
+            return [1, RESP_PWM, 1, self.power]
+        if cmd == CMD_GET_ALL:
+            return [1, RESP_ALL, len(temps) + 1] + temps + [self.power]
+        return [1, RESP_TEMP, len(temps)] + temps
+
+
+class ValveFirmware(Firmware):
+    """
+    Válvulas + flujómetros (0x12). SET 1/2 activa el relé 1/2, 3/4 lo desactiva.
+    La respuesta de flujo no lleva byte de id: [FLOW, 5, f1, f2, estado relés].
+    """
+    def __init__(self, address=0x12, latency=0.0):
+        super().__init__(address, latency)
+        self.relays = [False, False]
+        self.flows = [0.0, 0.0]  # L/min
+
+    def set(self, data):
+        if data and 1 <= data[0] <= 4:
+            self.relays[(data[0] - 1) % 2] = data[0] <= 2
+
+    @property
+    def status(self):
+        return int(self.relays[0]) | int(self.relays[1]) << 1
+
+    def response(self, cmd):
+        flows = _u16(self.flows[0], 100) + _u16(self.flows[1], 100)
+        if cmd == CMD_GET_ALL:
+            return [0, RESP_ALL, 5] + flows + [self.status]
+        return [RESP_FLOW, 5] + flows + [self.status]
+
+
+class TankFirmware(Firmware):
+    """Estanque (0x13, sin byte de registro): GET = temperaturas, 0x03 = distancia, GET_ALL = todo."""
+    def __init__(self, address=0x13, latency=0.0):
+        super().__init__(address, latency)
+        self.temp_bottom = 20.0  # °C
+        self.temp_top = 20.0
+        self.distance = 10.0     # cm, medida del sensor ultrasónico
+
+    def response(self, cmd):
+        temps = _u16(self.temp_bottom, 100) + _u16(self.temp_top, 100)
+        if cmd == CMD_GET_ALL:
+            return [0, RESP_ALL, 6] + temps + _u16(self.distance, 10)
+        if cmd == CMD_GET_PWM:  # 0x03 = nivel en este módulo
+            return [0, RESP_LEVEL, 2] + _u16(self.distance, 10)
+        if cmd == CMD_GET:
+            return [0, RESP_TEMP, 4] + temps + [0]
+        return [0] * 8
+
+
+def default_firmwares(latency=0.0):
+    """Los siete módulos del sistema, con la misma latencia."""
+    return {
+        0x10: PumpFirmware(0x10, latency),
+        0x14: PumpFirmware(0x14, latency),
+        0x11: HeaterFirmware(0x11, sensors=2, latency=latency),
+        0x16: HeaterFirmware(0x16, sensors=1, latency=latency),
+        0x15: HeaterFirmware(0x15, sensors=2, latency=latency),
+        0x12: ValveFirmware(0x12, latency),
+        0x13: TankFirmware(0x13, latency),
+    }
+
+
+class Faults:
+    """Probabilidades de error por transacción de un módulo."""
+    def __init__(self, io_error=0.0, timeout=0.0, short_frame=0.0):
+        self.io_error = io_error        # OSError errno 5 (EIO)
+        self.timeout = timeout          # OSError errno 110 (ETIMEDOUT)
+        self.short_frame = short_frame  # lectura truncada
+
+
+class SimBus:
+    """
+    Backend simulado para i2c_bus.I2CBus (mismas operaciones que SMBusBackend).
+    """
+    def __init__(self, firmwares=None, latency=0.0, transfer_time=0.0, seed=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        :param firmwares: {address: Firmware}; por defecto default_firmwares(latency)
+        :param latency: latencia de respuesta de los firmwares por defecto (s)
+        :param transfer_time: duración de cada transacción (s), p. ej. 0.0005 a 100 kHz
+        :param seed: semilla para la inyección de errores
+        :param clock: reloj de la simulación (ver plant_sim)
+        :param sleep: espera usada para transfer_time
+        """
+        self.firmwares = firmwares if firmwares is not None else default_firmwares(latency)
+        self.transfer_time = transfer_time
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.sleep = sleep
+        self.faults = {}
+        self.transactions = 0
+
+    def backend(self, channel=1):
+        """Función de apertura para I2CBus(backend=...); siempre devuelve este simulador."""
+        return self
+
+    def set_faults(self, address, io_error=0.0, timeout=0.0, short_frame=0.0):
+        self.faults[address] = Faults(io_error, timeout, short_frame)
+
+    def clear_faults(self):
+        self.faults.clear()
+
+    # --- Operaciones del backend ---
+    def _firmware(self, address):
+        self.transactions += 1
+        if self.transfer_time:
+            self.sleep(self.transfer_time)
+        firmware = self.firmwares.get(address)
+        if firmware is None:
+            raise OSError(errno.EREMOTEIO, "Remote I/O error")
+        faults = self.faults.get(address)
+        if faults is not None:
+            if self.random.random() < faults.io_error:
+                raise OSError(errno.EIO, "Input/output error")
+            if self.random.random() < faults.timeout:
+                raise OSError(errno.ETIMEDOUT, "Connection timed out")
+        return firmware
+
+    def _read(self, address, length):
+        firmware = self._firmware(address)
+        frame = firmware.request(self.clock())
+        frame = (frame + [0] * length)[:length]
+        faults = self.faults.get(address)
+        if faults is not None and self.random.random() < faults.short_frame:
+            cut = self.random.randrange(length)
+            frame = frame[:cut] + [0xFF] * (length - cut)  # el master lee 0xFF tras un corte
+        return frame
+
+    def write_block(self, address, register, data):
+        # El firmware lee reg, id, cmd, len, data...
+        self._firmware(address).receive(list(data), self.clock())
+
+    def read_block(self, address, register, length):
+        return self._read(address, length)
+
+    def write_raw(self, address, data):
+        self._firmware(address).receive(list(data), self.clock())
+
+    def read_raw(self, address, length):
+        return self._read(address, length)
+
+    def close(self):
+        pass
+
+
+def install(sim=None, **kwargs):
+    """Usa un SimBus (nuevo si no se pasa) como backend del bus compartido y lo devuelve."""
+    if sim is None:
+        sim = SimBus(**kwargs)
+    i2c_bus.set_backend(sim.backend)
+    return sim
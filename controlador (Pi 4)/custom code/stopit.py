@@ -5,6 +5,7 @@ from valvulas_i2c import Valves
 from calentador_i2c import Heater1
 from calentador_dos_i2c import Heater2
 from disipador_i2c import Radiator1
+from i2c_bus import close_bus
 
 pump1 = Pump(address=0x10)
 pump2 = Pump(address=0x14)
@@ -23,4 +24,4 @@ valves.close_valve(2)
 heater1.set_pwm_heater1(0)
 heater2.set_pwm_heater2(0)
 radiator1.set_pwm_fan(0)
-
+close_bus()
@@ -0,0 +1,206 @@
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from i2c_bus import get_bus
+
+
+# Calidad de cada valor de una foto
+GOOD = "good"        # última lectura buena, dentro de su periodo de muestreo (ver sample_age)
+STALE = "stale"      # el módulo falló: último valor bueno (ver last_good)
+MISSING = "missing"  # el módulo nunca respondió: el valor es None
+
+
+def rounded(value, digits):
+    """round() que deja pasar None (valores que faltan en una foto parcial)."""
+    return None if value is None else round(value, digits)
+
+
+class Snapshot(namedtuple("Snapshot", ["version", "timestamp", "monotonic", "duration", "values", "errors",
+                                       "quality", "last_good", "polled"],
+                                defaults=(frozenset(),))):
+    """
+    Foto inmutable de la planta producida por un barrido.
+    version: contador creciente del SweepScheduler; timestamp: epoch del barrido;
+    monotonic: time.monotonic() del barrido; duration: s; values: {name: {field: value}}
+    de solo lectura; errors: {name: excepción}; quality: {name: {field: GOOD/STALE/MISSING}};
+    last_good: {name: {field: epoch de la última lectura buena o None}}; polled: módulos
+    leídos en este barrido (con periodos de muestreo, los demás conservan su última lectura).
+    Si un módulo falla, la foto es parcial: sus valores son los últimos buenos y el resto
+    de los módulos sigue siendo válido.
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        """True si todos los módulos respondieron en este barrido."""
+        return not self.errors
+
+    def device_quality(self, name):
+        """Peor calidad entre los campos de un módulo."""
+        flags = set(self.quality[name].values())
+        for flag in (MISSING, STALE):
+            if flag in flags:
+                return flag
+        return GOOD
+
+    def device_last_good(self, name):
+        """Epoch de la lectura buena más antigua entre los campos de un módulo, o None."""
+        return min((t for t in self.last_good[name].values() if t is not None), default=None)
+
+    def sample_age(self, name, field=None):
+        """
+        Segundos entre la última lectura buena de un campo y este barrido (0 si se leyó en él),
+        o None si nunca se leyó. Sin field: el campo más viejo del módulo.
+        """
+        if field is None:
+            since = self.device_last_good(name)
+        else:
+            since = self.last_good[name][field]
+        return None if since is None else self.timestamp - since
+
+    def fresh(self, name):
+        """Valores de un módulo solo si son buenos (GOOD); si no, None en cada campo."""
+        quality = self.quality[name]
+        return {field: value if quality[field] == GOOD else None
+                for field, value in self.values[name].items()}
+
+    @property
+    def age(self):
+        """Segundos desde el barrido (reloj real; con un reloj simulado usar age_at)."""
+        return time.monotonic() - self.monotonic
+
+    def age_at(self, now):
+        """:param now: lectura actual del mismo reloj monotónico que tomó la foto (I2CBus.monotonic)"""
+        return now - self.monotonic
+
+    def get(self, name, field):
+        return self.values[name][field]
+
+
+class SweepScheduler:
+    """
+    Barrido concurrente de todos los periféricos.
+    Primero se envía GET_ALL a cada módulo y después se recogen todas las respuestas,
+    esperando una sola vez el turnaround más largo en vez de uno por módulo.
+    El bus queda bloqueado durante todo el barrido, así ningún SET se intercala
+    y los valores forman una única foto del sistema.
+
+    Con intervals cada campo tiene su periodo de muestreo (p. ej. caudal 1 s, nivel 20 s)
+    y un barrido solo lee los módulos con algún campo vencido; los demás conservan su
+    última lectura (GOOD, con su edad en Snapshot.sample_age). GET_ALL trae todos los
+    campos de un módulo en una sola transacción, así que un módulo se lee al periodo de
+    su campo más rápido y todos sus campos quedan actualizados.
+    """
+    def __init__(self, devices, bus=None, intervals=None):
+        """
+        :param devices: dict {name: device}; cada device expone address, bulk, fields,
+                        request_all(), read_all() y get_all()
+        :param bus: I2CBus a usar (por defecto el bus compartido)
+        :param intervals: {name: {field: s}} periodos de muestreo; un campo sin periodo
+                          (o un módulo sin entrada) se lee en cada barrido
+        """
+        self.devices = dict(devices)
+        self.bus = bus
+        self.version = 0  # número de barridos completados
+        self._good = {}   # {name: (valores, epoch)} de la última lectura buena de cada módulo
+        intervals = intervals or {}
+        # Periodo de cada módulo = el de su campo más rápido
+        self.periods = {name: min((intervals.get(name, {}).get(field, 0) for field in device.fields), default=0)
+                        for name, device in self.devices.items()}
+        self._polled_at = {}  # {name: monotonic de la última lectura buena}
+        self.polls = dict.fromkeys(self.devices, 0)  # lecturas por módulo (ver get_stats)
+
+    def due(self, now, full=False):
+        """Módulos a leer en un barrido en el instante now (monotonic del bus)."""
+        if full:
+            return list(self.devices)
+        return [name for name in self.devices
+                if name not in self._polled_at or now - self._polled_at[name] >= self.periods[name]]
+
+    def invalidate(self, name):
+        """Fuerza la lectura de un módulo en el próximo barrido (p. ej. después de un SET)."""
+        self._polled_at.pop(name, None)
+
+    def get_stats(self):
+        return {'periods_s': dict(self.periods), 'polls': dict(self.polls), 'sweeps': self.version}
+
+    def run(self, full=False):
+        """
+        Ejecuta un barrido de los módulos vencidos.
+        :param full: leer todos los módulos aunque su periodo no haya vencido
+        :return: Snapshot; los módulos que fallan quedan en errors y no interrumpen el resto
+        """
+        bus = self.bus or get_bus()
+        errors = {}
+        with bus.lock:
+            timestamp = bus.time()
+            monotonic = start = bus.monotonic()
+            polled = self.due(monotonic, full)
+
+            # 1) GET_ALL a todos los módulos vencidos con firmware compatible
+            sent = {}
+            for name in polled:
+                device = self.devices[name]
+                if not device.bulk:
+                    continue
+                try:
+                    device.request_all()
+                except Exception as e:
+                    errors[name] = e
+                    continue
+                sent[name] = bus.monotonic()
+
+            # 2) Una sola espera: hasta que venza el turnaround del módulo más lento
+            if sent:
+                deadline = max(sent_at + bus.turnaround.delay(self.devices[name].address)
+                               for name, sent_at in sent.items())
+                remaining = deadline - bus.monotonic()
+                if remaining > 0:
+                    bus.sleep(remaining)
+
+            # 3) Recoger las respuestas; si una no es válida, ese módulo se repite solo
+            for name in polled:
+                device = self.devices[name]
+                if name in errors:
+                    continue
+                try:
+                    if name in sent:
+                        waited = bus.monotonic() - sent[name]
+                        if device.read_all() is not None:
+                            bus.turnaround.record(device.address, waited, 0)
+                            continue
+                        bus.record_retry(device.address)
+                    device.get_all()
+                except Exception as e:
+                    errors[name] = e
+
+            duration = bus.monotonic() - start
+            values, quality, last_good = {}, {}, {}
+            for name, device in self.devices.items():
+                if name in polled and name not in errors:
+                    good = MappingProxyType({field: getattr(device, field) for field in device.fields})
+                    self._good[name] = (good, timestamp)
+                    self._polled_at[name] = monotonic
+                    self.polls[name] += 1
+                    flag, since = GOOD, timestamp
+                elif name not in errors:
+                    # No vencido: la última lectura sigue dentro de su periodo
+                    good, since = self._good[name]
+                    flag = GOOD
+                elif name in self._good:
+                    # Los atributos del módulo pueden haber quedado a medias: usar la última foto buena
+                    self._polled_at.pop(name, None)  # se reintenta en el próximo barrido
+                    good, since = self._good[name]
+                    flag = STALE
+                else:
+                    good = MappingProxyType({field: None for field in device.fields})
+                    flag, since = MISSING, None
+                values[name] = good
+                quality[name] = MappingProxyType(dict.fromkeys(device.fields, flag))
+                last_good[name] = MappingProxyType(dict.fromkeys(device.fields, since))
+            self.version += 1
+
+        return Snapshot(self.version, timestamp, monotonic, duration, MappingProxyType(values),
+                        MappingProxyType(errors), MappingProxyType(quality), MappingProxyType(last_good),
+                        frozenset(polled))
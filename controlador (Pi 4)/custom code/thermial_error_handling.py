@@ -1,11 +1,14 @@
 # --- Imports der Module ---
 import logging
-from bomba_i2c import Pump
-from calentador_i2c import Heater1
-from calentador_dos_i2c import Heater2    
-from valvulas_i2c import Valves    
-from estanque_i2c import Tank
-from disipador_i2c import Radiator1
+from device_registry import load_registry
+from i2c_bus import get_bus, close_bus, DeviceUnavailable
+from frame_codec import FrameError
+from sweep import SweepScheduler, GOOD
+from data_store import ColumnarLog, DERIVED
+from data_writer import StreamWriter
+from scheduler import PeriodicScheduler
+from metrics import CallStats
+import sys
 import time
 import pandas as pd
 from datetime import datetime
@@ -26,73 +29,102 @@ logger.setLevel(logging.INFO)    # verbose: INFO, DEBUG
 # logger.setLevel(logging.WARNING)  # quiet: WARNING, ERROR, CRITICAL
 #Comentario de prueba
 
+# Columnas del data_log que no vienen de un módulo; las de los módulos salen de devices.toml
+# (Loop.data_log_fields = columnas del registro + LOOP_LOG_FIELDS)
+LOOP_LOG_FIELDS = (
+    'sweep_time_s', 'failed_devices',
+    'tick_jitter_ms', 'tick_overruns', 'tick_skipped',  # temporización (scheduler.PeriodicScheduler)
+)
+LOOP_LOG_INTEGER = ('failed_devices', 'tick_overruns', 'tick_skipped')
+
+
+def error_info(error, function):
+    """
+    Entrada de Loop.errors para una excepción de un módulo (tipo, recomendación, función).
+    Cualquier error queda registrado; los conocidos traen una recomendación específica.
+    """
+    info = {
+        "error_type": type(error).__name__,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "function": function,
+        "message": str(error),
+        "recommendation": "check the module and its I2C connection",
+    }
+    if isinstance(error, DeviceUnavailable):
+        info.update(error_type="Device unavailable", address=f"0x{error.address:02x}",
+                    recommendation="module failed repeatedly and is isolated; it is probed again automatically")
+    elif isinstance(error, OSError) and error.errno == 5:
+        info.update(error_type="Input/output error", recommendation="check connection between Pi4 and Pi Picos")
+    elif isinstance(error, OSError) and error.errno == 110:
+        info.update(error_type="Connection timed out", recommendation="check I2C devices with sudo i2cdetect -y 1")
+    elif isinstance(error, OSError) and error.errno in (11, 121):
+        info.update(error_type="Remote I/O error" if error.errno == 121 else "Resource temporarily unavailable",
+                    recommendation="module did not acknowledge; check its address and power")
+    elif isinstance(error, FrameError):
+        info.update(error_type="Invalid I2C frame", recommendation="check firmware version and bus noise")
+    elif isinstance(error, TypeError) and "NoneType" in str(error):
+        info.update(error_type="NoneType response: unsupported format string passed to NoneType.__format__",
+                    recommendation="I2C device returned no data, check sensors")
+    elif isinstance(error, ValueError) and "too many values to unpack" in str(error):
+        info.update(error_type="Invalid I2C response length",
+                    recommendation="I2C device returned more than 2 values. Inspect raw data from receive_response().")
+    return info
+
+
 def safe_call(func):
     def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        error = None
         try:
             return func(self, *args, **kwargs)
-        except OSError as e:
-            if e.errno == 5:
-                self.errors = {
-                "error_type": "Input/output error",
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "function": func.__name__,
-                "recommendation": "check connection between Pi4 and Pi Picos"
-                }
-                self.log.error(f"OSError in {func.__name__}: Input/output error")
-
-            elif e.errno == 110:
-                self.errors = {
-                    "error_type": "Connection timed out",
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "function": func.__name__,
-                    "recommendation": "check I2C devices with sudo i2cdetect -y 1"
-                }
-                self.log.error(f"OSError in {func.__name__}: Connection timed out")
-
-        except TypeError as e:
-            if "NoneType" in str(e):
-                self.errors = {
-                    "error_type": "NoneType response: unsupported format string passed to NoneType.__format__",
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "function": func.__name__,
-                    "recommendation": "I2C device returned no data, check sensors"
-                }
-                self.log.error(f"TypeError in {func.__name__}: {e}")
-        except ValueError as e:
-            if "too many values to unpack" in str(e):
-                self.errors = {
-                    "error_type": "Invalid I2C response length",
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "function": func.__name__,
-                    "recommendation": "I2C device returned more than 2 values. Inspect raw data from receive_response()."
-                }
-                self.log.error(f"ValueError in {func.__name__}: {e}")
+        except (OSError, TypeError, ValueError) as e:
+            error = e
+            self.errors = error_info(e, func.__name__)
+            self.log.error(f"{type(e).__name__} in {func.__name__}: {self.errors['error_type']} ({e})")
+        finally:
+            # Duración y error de cada llamada (ver get_metrics); también los que no se capturan
+            self.call_stats.record(func.__name__, time.perf_counter() - start, error or sys.exc_info()[1])
    
     return wrapper
 
 class Loop:
     """
     Controlador de lazo solar with pump1, heater1, heater2, valves, tank
+    Los módulos, las columnas del data_log y el estado MQTT salen del registro (devices.toml):
+    cada dispositivo queda como atributo (self.pump1, self.tank, ...).
     Todos los mensajes van al logger 'solarloop'. Verbose = nivel INFO.
     """
     def __init__(self, 
-                 pump = Pump,  
-                 heater1 = Heater1,
-                 heater2 = Heater2,
-                 valves = Valves,
-                 tank = Tank, 
-                 radiator1 = Radiator1, 
-                 verbose = False):
-        
-        self.pump1 = Pump(address=0x10)
-        self.pump2 = Pump(address=0x14)
-        self.heater1 = Heater1()
-        self.heater2 = Heater2()
-        self.valves = Valves()
-        self.tank = Tank()
-        self.radiator1 = Radiator1()
-        self.data_log = []  # Nueva lista para almacenar datos
+                 verbose = False,
+                 max_age = 1.0,
+                 registry = None,
+                 memory_samples = 3600):
+        """
+        :param max_age: s; una foto más reciente se reutiliza en vez de barrer otra vez
+        :param registry: device_registry.Registry (por defecto devices.toml); los drivers
+                         se crean a partir de él (un módulo distinto = otra entrada en el registro)
+        :param memory_samples: muestras del data_log que quedan en memoria mientras se
+                               escribe a disco (start_stream); None = todo el ensayo
+        """
+
+        self.registry = registry or load_registry()  # device_registry.Registry
+        self.devices = self.registry.build()  # {name: driver}, en el orden del registro
+        for name, device in self.devices.items():
+            setattr(self, name, device)
+        self.bus = get_bus()  # bus I2C compartido por todos los módulos
+        self.data_log_fields = self.registry.log_fields + LOOP_LOG_FIELDS
+        self.data_log = ColumnarLog(self.data_log_fields, integer=self.registry.log_integer + LOOP_LOG_INTEGER,
+                                    labels=self.registry.log_labels)
+        self.stream = None  # StreamWriter abierto por start_stream() / append_to_data_log()
+        self.memory_samples = memory_samples
+        self.samples_logged = 0  # muestras del ensayo, también las que ya no están en memoria
         self.errors = {}
+        self.call_stats = CallStats()  # duración y errores por método (safe_call)
+        self.last_sweep_time = None  # duración (s) del último update_status()
+        # Cada módulo se lee al periodo de su canal más rápido (poll_interval en devices.toml)
+        self.sweeper = SweepScheduler(self.devices, intervals=self.registry.poll_intervals)
+        self.last_snapshot = None  # último sweep.Snapshot (valores + timestamp del barrido)
+        self.max_age = max_age  # s; una foto más reciente se reutiliza en vez de barrer otra vez
 
         # Si el usuario quiere verbosidad, baja el umbral del logger
         if verbose:
@@ -117,33 +149,25 @@ class Loop:
         elif power < 0:
             power = 0
 
-        if number == 1:
-            self.pump1.set_power(power)
-            time.sleep(0.2)
-            self.log.info(f"Power Pump 1 at {power}%")
-            self.pump1.get_flow()
-            self.log.info(f"Flow Pump 1: {self.pump1.flow:.2f} L/min")
-        elif number == 2:
-            self.pump2.set_power(power)
-            time.sleep(0.2)
-            self.log.info(f"Power Pump 2 at {power}%")
-            self.pump2.get_flow()
-            self.log.info(f"Flow Pump 2: {self.pump2.flow:.2f} L/min")
+        pump = getattr(self, f"pump{number}")  # pump1, pump2, ... según devices.toml
+        pump.set_power(power)
+        self.sweeper.invalidate(f"pump{number}")
+        self.log.info(f"Power Pump {number} at {power}%")
+        pump.get_flow()
+        self.log.info(f"Flow Pump {number}: {pump.flow:.2f} L/min")
 
     @safe_call    
     def get_flow_pump(self, number):
-        if number == 1:
-            self.pump1.get_flow()
-            self.log.info(f"Flow Pump 1: {self.pump1.flow:.2f} L/min", )
-        elif number == 2:
-            self.pump2.get_flow()
-            self.log.info(f"Flow Pump 2: {self.pump2.flow:.2f} L/min")
+        pump = getattr(self, f"pump{number}")
+        pump.get_flow()
+        self.log.info(f"Flow Pump {number}: {pump.flow:.2f} L/min")
 
             
     #Heater#
     @safe_call
     def set_power_heater1(self, pwm):
         self.heater1.set_pwm_heater1(pwm)
+        self.sweeper.invalidate("heater1")
         self.log.info("Heater 1 set to %.0f W", (pwm * 40) / 100)
     
     @safe_call
@@ -156,6 +180,7 @@ class Loop:
     @safe_call
     def set_power_heater2(self, pwm):
         self.heater2.set_pwm_heater2(pwm)
+        self.sweeper.invalidate("heater2")
         self.log.info("Heater 2 set to %.0f W", (pwm * 40) / 100)
 
     @safe_call
@@ -168,13 +193,22 @@ class Loop:
     @safe_call
     def set_open_valve(self, number):
         self.valves.open_valve(number)
+        self.sweeper.invalidate("valves")
         self.log.info("Valve %d opened", number)
 
     @safe_call
     def set_close_valve(self, number):
         self.valves.close_valve(number)
+        self.sweeper.invalidate("valves")
         self.log.info("Valve %d closed", number)
 
+    def set_valve(self, number, value):
+        """Orden MQTT de una válvula: value 1 abre, 0 cierra."""
+        if value:
+            self.set_open_valve(number)
+        else:
+            self.set_close_valve(number)
+
     @safe_call
     def get_flows_valves(self):
         self.valves.get_flows()
@@ -201,6 +235,7 @@ class Loop:
     @safe_call
     def set_power_radiator1(self, power):
         self.radiator1.set_pwm_fan(power)
+        self.sweeper.invalidate("radiator1")
         self.log.info(f"PWM fan of radiator set to {self.radiator1.power}%")
 
     @safe_call
@@ -211,36 +246,94 @@ class Loop:
         self.log.info(f"Temperatures Radiator 1: Inlet R1={temp_radiator1_in:.2f} °C, Outlet R1={temp_radiator1_out:.2f} °C")
 
 
+    #Todos los sensores#
+    @safe_call
+    def get_all_values(self, name):
+        """
+        Lee todos los sensores y el PWM de un módulo en una sola transacción (GET_ALL).
+        name: 'pump1', 'pump2', 'valves', 'heater1', 'heater2', 'tank' o 'radiator1'.
+        """
+        device = getattr(self, name)
+        device.get_all()
+        self.log.info("%s: %s", name, "GET_ALL" if device.bulk else "individual GETs")
+
+    @safe_call
+    def sweep(self, full=False):
+        """
+        Barrido concurrente: GET_ALL a los módulos vencidos y una sola espera (ver sweep.SweepScheduler).
+        Los módulos que fallan no interrumpen el barrido; self.errors sale de snapshot.errors:
+        el primer error arriba (error_type, ...) y todos en 'modules' ({name: error_info}).
+        :param full: leer todos los módulos aunque su poll_interval no haya vencido
+        """
+        self.last_snapshot = self.sweeper.run(full)
+        self.last_sweep_time = self.last_snapshot.duration
+        for name, error in self.last_snapshot.errors.items():
+            self.log.error("Sweep %s: %s", name, error)
+        if self.last_snapshot.errors:
+            modules = {name: error_info(error, "sweep") for name, error in self.last_snapshot.errors.items()}
+            self.errors = dict(next(iter(modules.values())), modules=modules)
+        elif self.errors:
+            # Todos los módulos respondieron: el error anterior ya no aplica
+            self.log.warning("All modules responding again, clearing error: %s", self.errors.get("error_type"))
+            self.errors = {}
+
     #Utilidades#
     def stop(self):
         print("Stop the Loop")
         print("Apagado de emergencia")
-        self.set_power_pump(1, 0)
-        self.set_power_pump(2, 0)
-        #self.pump2.set_power(0)
-        self.set_power_heater1(0)
-        self.set_power_heater2(0)
-        self.set_close_valve(1)
-        self.set_close_valve(2)
-        self.set_power_radiator1(0)
-        #self.set.radiator1.set_pwm_fan(0)
-        #self.valves.close_valve(1)
-        #self.valves.close_valve(2)
+        # Valor seguro de cada orden por stop_order: bombas a 0, luego calentadores y disipador, al final las válvulas
+        for command in self.registry.stop_commands:
+            getattr(self, command.method)(*command.args, command.safe)
+
+    def close(self):
+        """Libera el bus I2C compartido. Llamar después de stop() al terminar."""
+        close_bus()
+
+    def get_bus_stats(self):
+        """Tiempos por transacción I2C y turnaround aprendido de cada periférico (ms)."""
+        return self.bus.get_stats()
+
+    def get_metrics(self):
+        """
+        Instrumentación completa: histogramas por dirección y comando I2C (errores por errno,
+        reintentos, bytes) y por método de Loop, más el último barrido. Es lo que se publica
+        en thermial/metrics.
+        """
+        snapshot = self.last_snapshot
+        return {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'bus': self.bus.get_metrics(),
+            'calls': self.call_stats.as_dict(),
+            'sweep': None if snapshot is None else {
+                'version': snapshot.version,
+                'duration_ms': round(snapshot.duration * 1000, 3),
+                'errors': {name: str(error) for name, error in snapshot.errors.items()},
+                'polled': sorted(snapshot.polled),
+                'polls': self.sweeper.get_stats()['polls'],
+            },
+        }
     
-    def update_status(self):
-        self.get_flow_pump(1)
-        self.get_flow_pump(2)
-        self.get_flows_valves()
-        self.get_temperatures_heater1()
-        self.get_temperatures_heater2()
-        self.get_temperatures_tank()
-        self.get_temperatures_radiator1()
-        self.get_level_tank()
+    def update_status(self, full=False):
+        self.sweep(full)
+        if self.last_sweep_time is not None:
+            self.log.info("Sweep time: %.3f s", self.last_sweep_time)
 
         if self.errors:
             return False #if there is an error in dict
         return True
 
+    def get_snapshot(self, max_age=None):
+        """
+        Devuelve la última foto de la planta; solo barre el bus si es más vieja que max_age.
+        :param max_age: segundos (por defecto self.max_age; 0 = barrido nuevo siempre, que lee
+                        solo los módulos con poll_interval vencido)
+        """
+        if max_age is None:
+            max_age = self.max_age
+        if self.last_snapshot is None or self.last_snapshot.age_at(self.bus.monotonic()) > max_age:
+            self.update_status()
+        return self.last_snapshot
+
 
     # --- Debug-Funktion für Rohdaten der Pumpen/Valves ---
     def debug_flows(self):
@@ -276,124 +369,137 @@ class Loop:
             print(f"[DEBUG] Valve 2 error reading raw bytes: {e}")
 
 
-    def update_status_dict(self):
-        status_ok = self.update_status()
-        if not status_ok:
+    def update_status_dict(self, max_age=None):
+        """
+        Estado plano para el data_log. Si algún módulo falla la foto es parcial: sus campos
+        quedan en None y el resto se entrega igual (failed_devices cuenta los módulos que fallaron).
+        :return: (ok, status_dict); ok es False si hay errores activos; (False, self.errors) sin foto
+        """
+        snapshot = self.get_snapshot(max_age)
+        if snapshot is None:
             return False, self.errors
-        now = datetime.now()
+        now = datetime.fromtimestamp(snapshot.timestamp)  # instante del barrido
         self.status_dict = {
             'timestamp': now.strftime('%Y-%m-%d %H:%M:%S'),
             'date': now.strftime('%Y-%m-%d'),
             'time': now.strftime('%H:%M:%S'),
-            'power_pump1_%': self.pump1.power,
-            'flow_pump1_L/min': round(self.pump1.flow, 2),
-            'power_heater1_%': self.heater1.power,
-            'power_heater1_W': round((self.heater1.power * 40) / 100, 2),
-            'temp_heater1_in_°C': round(self.heater1.temp_in, 2),
-            'temp_heater1_out_°C': round(self.heater1.temp_out, 2),
-            'power_heater2_%': self.heater2.power,
-            'power_heater2_W': round((self.heater2.power * 40) / 100, 2),
-            'temp_heater2_out_°C': round(self.heater2.temp_out, 2),            
-            'valve1_state': 'open' if self.valves.state_valve1 else 'closed',
-            'flow_valve1_out_L/min': round(self.valves.flow_valve1_out, 2),
-            'valve2_state': 'open' if self.valves.state_valve2 else 'closed',
-            'flow_valve2_out_L/min': round(self.valves.flow_valve2_out, 2),
-            'level_tank_cm': round(self.tank.level, 1),
-            'temp_tank_bottom_°C': round(self.tank.temp_bottom, 2),
-            'temp_tank_top_°C': round(self.tank.temp_top, 2),
-            'power_pump2_%': self.pump2.power,
-            'flow_pump2_L/min': round(self.pump2.flow, 2),
-            'power_radiator1_%': self.radiator1.power,
-            'power_radiator1_W': round((self.radiator1.power * 40) / 100, 2),
-            'temp_radiator1_in_°C': round(self.radiator1.temp_in, 2),
-            'temp_radiator1_out_°C': round(self.radiator1.temp_out, 2)
         }
-        return True, self.status_dict
+        for spec in self.registry:
+            values = snapshot.fresh(spec.name)
+            for channel in spec.channels:
+                if channel.log:
+                    self.status_dict[channel.log] = channel.log_value(values[channel.field])
+        self.status_dict['sweep_time_s'] = round(snapshot.duration, 3)
+        self.status_dict['failed_devices'] = len(snapshot.errors)
+        return not self.errors, self.status_dict
     
-    def update_status_dict_mqtt(self):
-        status_ok = self.update_status()
-        if not status_ok:
+    def update_status_dict_mqtt(self, max_age=None):
+        """
+        Estado por módulo para MQTT. Un módulo que falló entrega sus últimos valores buenos con
+        quality 'stale' y last_good (instante de esa lectura), o None con quality 'missing'.
+        :return: (ok, mqtt_dict); (False, self.errors) si todavía no hay ninguna foto
+        """
+        snapshot = self.get_snapshot(max_age)
+        if snapshot is None:
             return False, self.errors
-        
         self.mqtt_dict = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'pump1': {
-                'duty': self.pump1.power,
-                'flow': round(self.pump1.flow, 2),
-            },
-            'pump2':{
-                'duty': self.pump2.power,
-                'flow': round(self.pump2.flow, 2),
-            },
-            'heater1':{
-                'duty':  self.heater1.power,
-                'power': round((self.heater1.power * 40) / 100, 2),
-                'temp_in': round(self.heater1.temp_in, 2),
-                'temp_out': round(self.heater1.temp_out, 2),
-            },
-            'heater2':{
-                'duty': self.heater2.power,
-                'power': round((self.heater2.power * 40) / 100, 2),
-                'temp_out': round(self.heater2.temp_out, 2),
-            },
-            'valves':{
-                'valve1_state': 1 if self.valves.state_valve1 else 0,
-                'valve2_state': 1 if self.valves.state_valve2 else 0,
-                'flow_valve1_out': round(self.valves.flow_valve1_out, 2),
-                'flow_Valve2_out': round(self.valves.flow_valve2_out, 2),
-            },
-            'tank':{
-                'level':round(self.tank.level, 1),
-                'temp_bottom': round(self.tank.temp_bottom, 2),
-                'temp_top': round(self.tank.temp_top, 2),
-            },
-            'radiator1':{
-                'duty': self.radiator1.power,
-                'temp_in': round(self.radiator1.temp_in, 2),
-                'temp_out': round(self.radiator1.temp_out, 2)
-            }
+            'timestamp': datetime.fromtimestamp(snapshot.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+            'version': snapshot.version,
+            'quality': 'good' if snapshot.ok else 'partial',
         }
+        for spec in self.registry:
+            values = snapshot.values[spec.name]
+            self.mqtt_dict[spec.name] = {channel.mqtt: channel.mqtt_value(values[channel.field])
+                                         for channel in spec.channels if channel.mqtt}
+        for name in snapshot.values:
+            quality = snapshot.device_quality(name)
+            self.mqtt_dict[name]['quality'] = quality
+            if quality != GOOD:
+                since = snapshot.device_last_good(name)
+                self.mqtt_dict[name]['last_good'] = (
+                    None if since is None else datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M:%S'))
         
-        return True, self.mqtt_dict
-
-
-    def print_status(self):
-        self.update_status()
-        print(f"Power pump1: {self.pump1.power}%")
-        print(f"Flow pump1: {self.pump1.flow} L/min")
-        print(f"Power pump2: {self.pump2.power}%")
-        print(f"Flow pump2: {self.pump2.flow} L/min")
-        print(f"Power heater1: {self.heater1.power}%")
-        print(f"Power heater2: {self.heater2.power}%")
-        print(f"Temp heater1 in: {self.heater1.temp_in:.2f}°C")
-        print(f"Temp heater1 out: {self.heater1.temp_out:.2f}°C")
-        print(f"Temp heater2 out: {self.heater2.temp_out:.2f}°C")
-        print(f"State valve 1: {'open' if self.valves.state_valve1 else 'closed'}")
-        print(f"State valve 2: {'open' if self.valves.state_valve2 else 'closed'}")
-        print(f"Flow valve 1: {self.valves.flow_valve1_out} L/min")
-        print(f"Flow valve 2: {self.valves.flow_valve2_out} L/min")
-        print(f"Level Tank: {self.tank.level} cm")
-        print(f"Temp tank bottom #3: {self.tank.temp_bottom:.2f}°C")
-        print(f"Temp tank top #4: {self.tank.temp_top:.2f}°C")
-        print(f"Status: {'NOT OK' if self.errors else 'OK'}")
-    
+        return not self.errors, self.mqtt_dict
 
-    def append_to_data_log(self, folder_path="./test_data"):
-        """Colecta los datos actuales y los guarda para Excel"""
-        self.update_status()
 
-        # Colectar datos reales de los sensores
-        _, data_point = self.update_status_dict()
+    def print_status(self, max_age=None):
+        snapshot = self.get_snapshot(max_age)
+        if snapshot is None:
+            print("Status: NOT OK (no data)")
+            return
+        print(f"Snapshot #{snapshot.version} ({snapshot.age_at(self.bus.monotonic()):.1f} s old)")
+        for spec in self.registry:
+            values = snapshot.values[spec.name]
+            age = snapshot.sample_age(spec.name)
+            print(f"{spec.name} (sample age: {'never read' if age is None else f'{age:.1f} s'})")
+            for channel in spec.channels:
+                if channel.log:
+                    print(f"{channel.log}: {channel.log_value(values[channel.field])}")
+        for name in snapshot.values:
+            quality = snapshot.device_quality(name)
+            if quality != GOOD:
+                since = snapshot.device_last_good(name)
+                last = "never" if since is None else datetime.fromtimestamp(since).strftime('%H:%M:%S')
+                print(f"{name}: {quality} (last good: {last})")
+        print(f"Status: {'NOT OK' if self.errors else 'OK'}")
     
-        self.data_log.append(data_point)
-        self.log.info(f"Colected data: {data_point['timestamp']} - Total: {len(self.data_log)} points")
+
+    def start_stream(self, folder_path="./test_data", fmt="csv", **options):
+        """
+        Empieza a escribir el data_log a disco mientras dura el ensayo (ver data_writer.StreamWriter).
+        :param fmt: 'csv' o 'parquet'
+        :param options: batch_size, flush_interval, max_rows, fsync
+        """
+        if self.stream is not None:
+            self.stream.close()
+        self.stream = StreamWriter(folder_path, "solarloop_test", DERIVED + self.data_log_fields, fmt=fmt,
+                                   text_columns=DERIVED + tuple(self.registry.log_labels), **options)
+        self.log.info(f"Streaming data to {folder_path} ({fmt})")
+        return self.stream
+
+    def append_to_data_log(self, folder_path="./test_data", tick=None):
+        """
+        Colecta los datos actuales, los guarda en memoria y los añade al archivo del ensayo
+        :param tick: scheduler.Tick de la muestra; su jitter y overruns se guardan con los datos
+        """
+        # Colectar datos reales de los sensores (un barrido nuevo por muestra)
+        ok, data_point = self.update_status_dict(max_age=0)
+        if self.last_snapshot is None:
+            self.log.warning("No data point logged: %s", data_point)
+            return
+        if not self.last_snapshot.ok:
+            # Muestra parcial: los campos de los módulos que fallaron quedan vacíos
+            self.log.warning("Partial data point, missing: %s", ", ".join(self.last_snapshot.errors))
+
+        if tick is not None:
+            data_point = dict(data_point,
+                              tick_jitter_ms=round(tick.jitter * 1000, 3),
+                              tick_overruns=tick.overruns,
+                              tick_skipped=tick.skipped)
+        self.data_log.append(data_point, epoch=self.last_snapshot.timestamp)  # mismo barrido que data_point
+        if self.stream is None:
+            self.start_stream(folder_path)
+        self.stream.write(self.data_log[-1])
+        self.samples_logged += 1
+        if self.memory_samples is not None:
+            # Lo que ya está en el archivo no hace falta en memoria: ventana móvil
+            self.data_log.trim(self.memory_samples)
+        self.log.info(f"Colected data: {data_point['timestamp']} - Total: {self.samples_logged} points")
 
     def export_to_csv(self, folder_path="./test_data"):
-        """Exports data as an Excel file"""
+        """Exports data as an Excel file. If the data was streamed, only the pending rows are written."""
         import os
         import pandas as pd
         from datetime import datetime
 
+        if self.stream is not None:
+            filepath = self.stream.close()
+            files, fmt = self.stream.files, self.stream.fmt.upper()
+            self.stream = None
+            self.log.info(f"All data exported: {files}")
+            print(f"[{fmt}] data successfully saved to {', '.join(files)} ({self.samples_logged} points)")
+            return filepath
+
         if not self.data_log:
             print("There is no data to export!")
             return
@@ -403,7 +509,7 @@ class Loop:
         filename = f"solarloop_test_{timestamp}.csv"
         filepath = os.path.join(folder_path, filename)
 
-        df = pd.DataFrame(self.data_log)
+        df = self.data_log.to_dataframe()
         df.to_csv(filepath, index=False, sep=';', decimal=',', encoding='utf-8-sig')
 
         self.log.info(f"All data exported: {filepath}")
@@ -413,7 +519,11 @@ class Loop:
     def clear_data_log(self):
         """Limpia el log de datos actual"""
         count = len(self.data_log)
+        if self.stream is not None:
+            self.stream.close()  # el archivo del ensayo anterior queda cerrado
+            self.stream = None
         self.data_log.clear()
+        self.samples_logged = 0
         self.log.info(f"Data log cleared. {count} points removed")
         print(f"Data log cleared: {count} points removed")
 
@@ -424,27 +534,21 @@ class Loop:
         
         first_time = self.data_log[0]['timestamp']
         last_time = self.data_log[-1]['timestamp']
-        count = len(self.data_log)
+        count = max(self.samples_logged, len(self.data_log))
+        memory = self.data_log.memory_summary()
 
         summary = f"""
         === Data Summary ===
         Total points: {count}
-        First registration: {first_time}
+        First registration (in memory): {first_time}
         Last registration: {last_time}
+        Memory: {memory}
         ========================
                 """
         return summary
 
 if __name__ == "__main__":
-    loop = Loop(
-        pump = Pump(),
-        valves = Valves(),
-        heater1 = Heater1(),
-        heater2 = Heater2(),
-        tank = Tank(),
-        radiator1 = Radiator1(),
-        verbose= True
-    )
+    loop = Loop(verbose=True)  # módulos y direcciones según devices.toml
 
     # Limpiar cualquier log anterior de datos
     loop.clear_data_log()
@@ -461,23 +565,17 @@ if __name__ == "__main__":
     loop.print_status()
     print("System activated.")
 
-    # Guardar el tiempo de inicio
-    start_time = time.monotonic()
     total_duration = 10 * 60 # hours * min * seconds 
-    next_sample = start_time
+    sample_interval = 20  # seconds; check loop.last_sweep_time before going down to 1 s
+    total_samples = int(total_duration // sample_interval)
+    scheduler = PeriodicScheduler(sample_interval, policy="skip",  # deadlines fijos; si una muestra se atrasa, se salta
+                                  clock=loop.bus.monotonic, sleep=loop.bus.sleep)
 
     try:
-        while time.monotonic() - start_time < total_duration:
-            now = time.monotonic()
-
-            # If one minute has passed since the last sample
-            if now >= next_sample:
-                loop.append_to_data_log()  # save current data
-                minutos_transcurridos = int((now - start_time) // 60)
-                print(f"Sample {minutos_transcurridos + 1}/30 registrated.")
-                next_sample += 20  # Next sample every 20 seconds
-
-            time.sleep(1)  # Sleep for 1 second to avoid overloading the processor
+        for tick in scheduler.ticks(duration=total_duration):
+            loop.append_to_data_log(tick=tick)  # save current data
+            print(f"Sample {tick.index + 1}/{total_samples} registrated.")
+            print(f"Sweep time: {loop.last_sweep_time:.3f} s, jitter: {tick.jitter * 1000:.1f} ms")
 
     except KeyboardInterrupt:
         print("Measurement interrupted manually by the user.")
@@ -489,6 +587,9 @@ if __name__ == "__main__":
 
     # Show summary and export to Excel
     print(loop.get_data_summary())
+    print(f"I2C stats: {loop.get_bus_stats()}")
+    print(f"Timing: {scheduler.stats.as_dict()}")
     loop.export_to_csv()
+    loop.close()
 
 
@@ -1,14 +1,20 @@
 import i2c_0x12  
-import time
+from i2c_bus import get_bus
+from bulk_read import BulkRead
+from frame_codec import GET_ALL
 
-class Valves:
-    def __init__(self):
-        self.address = 0x12
+class Valves(BulkRead):
+    fields = ("state_valve1", "state_valve2", "flow_valve1_out", "flow_valve2_out")  # valores que entrega una lectura completa
+
+    def __init__(self, address=0x12):
+        self.address = address
         self.device_name = "Modulo Valvulas"
         self.flow_valve1_out = 0
         self.flow_valve2_out = 0
-        self.state_valve1 = None
-        self.state_valve2 = None
+        # Sin orden ni lectura de los relés (firmware sin GET_ALL) se asume cerrada
+        self.state_valve1 = False
+        self.state_valve2 = False
+        self.relay_status = None  # bits de los relés reportados por el firmware (GET_ALL)
 
 
     def open_valve(self, numero):
@@ -43,7 +49,27 @@ class Valves:
         """
         Solicita y devuelve los valores de los dos flujómetros.
         """
-        i2c_0x12.send_command(self.address, 0x02, [])
-        time.sleep(0.5)
-        self.flow_valve1_out, self.flow_valve2_out, _, _ = i2c_0x12.receive_response(self.address)
-        
+        self.flow_valve1_out, self.flow_valve2_out, _, _ = get_bus().request(
+            self.address,
+            lambda: i2c_0x12.send_command(self.address, 0x02, []),
+            lambda: i2c_0x12.receive_response(self.address),
+            valid=lambda response: response[0] is not None)
+
+    def request_all(self):
+        """Envía GET_ALL sin esperar la respuesta (ver sweep.SweepScheduler)."""
+        i2c_0x12.send_command(self.address, GET_ALL, [])
+
+    def read_all(self):
+        """Lee la trama ALL y actualiza los valores. Devuelve None si no es válida."""
+        response = self.bulk_response(i2c_0x12.receive_all)
+        if response is not None:
+            self.flow_valve1_out, self.flow_valve2_out, self.relay_status = response
+            # open_valve manda 3/4 (relé en LOW) y close_valve 1/2 (relé en HIGH):
+            # la válvula está abierta cuando el bit de su relé está en 0
+            self.state_valve1 = not self.relay_status & 0x01
+            self.state_valve2 = not self.relay_status & 0x02
+        return response
+
+    def read_individual(self):
+        """Lee ambos flujómetros con las lecturas individuales (firmware sin GET_ALL)."""
+        self.get_flows()
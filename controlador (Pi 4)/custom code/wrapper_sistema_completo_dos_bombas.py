@@ -1,23 +1,81 @@
 import time
 from datetime import datetime
-import pandas as pd
 from bomba_i2c import Pump    
 from valvulas_i2c import Valves    
 from calentador_i2c import Heater1
 from estanque_i2c import Tank
 from disipador_i2c import Radiator1
 from calentador_dos_i2c import Heater2
-
-shared_data_log = []
+from sweep import SweepScheduler, rounded
+from data_store import ColumnarLog, DERIVED
+from data_writer import StreamWriter
+from scheduler import PeriodicScheduler
+from i2c_bus import get_bus
+
+# Una fila por timestamp con los datos de ambos lazos
+SHARED_LOG_FIELDS = (
+    'power_pump1_%', 'flow_pump1_L/min',
+    'power_heater1_%', 'power_heater1_W', 'temp_heater1_in_°C', 'temp_heater1_out_°C',
+    'power_heater2_%', 'power_heater2_W', 'temp_heater2_out_°C',
+    'valve1_status', 'flow_valve1_out_L/min', 'valve2_status', 'flow_valve2_out_L/min',
+    'level_tank_cm', 'temp_tank_bottom_°C', 'temp_tank_top_°C',
+    'power_pump2_%', 'flow_pump2_L/min',
+    'radiator_power_%', 'temp_radiator1_in_°C', 'temp_radiator1_out_°C',
+    'tick_jitter_ms', 'tick_overruns', 'tick_skipped',
+)
+shared_data_log = ColumnarLog(
+    SHARED_LOG_FIELDS,
+    integer=('power_pump1_%', 'power_heater1_%', 'power_heater2_%', 'power_pump2_%', 'radiator_power_%',
+             'tick_overruns', 'tick_skipped'),
+    labels={'valve1_status': ('close', 'open'), 'valve2_status': ('close', 'open')})
+
+shared_stream = None  # StreamWriter del ensayo en curso
+MEMORY_SAMPLES = 3600  # filas que quedan en memoria mientras se escribe a disco
+
+def start_stream(folder_path="test_data", fmt="csv", **options):
+    """Escribe las filas a disco durante el ensayo (ver data_writer.StreamWriter)."""
+    global shared_stream
+    if shared_stream is not None:
+        shared_stream.close()
+    shared_stream = StreamWriter(folder_path, "both_loops", DERIVED + SHARED_LOG_FIELDS, fmt=fmt,
+                                 text_columns=DERIVED + ('valve1_status', 'valve2_status'), **options)
+    return shared_stream
 
 def clear_data_log():
-    global shared_data_log
-    shared_data_log = []
+    global shared_stream
+    if shared_stream is not None:
+        shared_stream.close()
+        shared_stream = None
+    shared_data_log.clear()
+
+def log_shared_data(timestamp, data):
+    """Añade los datos de un lazo a la fila de ese timestamp (la crea si no existe)."""
+    epoch = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').timestamp()
+    position = shared_data_log.find(epoch)
+    if position is None:
+        shared_data_log.append(data, epoch=epoch)
+        # Una fila nueva significa que la anterior ya tiene los datos de ambos lazos
+        if shared_stream is None:
+            start_stream()
+        if len(shared_data_log) > 1:
+            shared_stream.write(shared_data_log[-2])
+            shared_data_log.trim(MEMORY_SAMPLES)  # lo escrito ya no hace falta en memoria
+    else:
+        shared_data_log.update(position, data)
 
 def export_to_csv():
+    global shared_stream
+    if shared_stream is not None:
+        if shared_data_log:
+            shared_stream.write(shared_data_log[-1])
+        filename = shared_stream.close()
+        shared_stream = None
+        print(f"[CSV] Data successfully saved to '{filename}'")
+        return filename
+
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     filename = f"test_data/both_loops_{timestamp}.csv"
-    df = pd.DataFrame(shared_data_log)
+    df = shared_data_log.to_dataframe()
     df.to_csv(filename, index=False, sep=';', decimal=',', encoding='utf-8-sig')
 
 
@@ -32,6 +90,8 @@ class SolarLoop:
         self.heater2 = Heater2()
         self.valves = Valves()
         self.tank = Tank()
+        self.sweeper = SweepScheduler({'pump1': self.pump1, 'heater1': self.heater1, 'heater2': self.heater2,
+                                       'valves': self.valves, 'tank': self.tank})
 
 
     def stop(self):
@@ -61,83 +121,75 @@ class SolarLoop:
             self.valves.close_valve(2)
 
     def append_to_data_log(self, timestamp):
-        self.pump1.get_flow()
-        time.sleep(0.1)
-        self.heater1.get_temperatures()
-        time.sleep(0.1)
-        self.heater2.get_temperatures()
-        time.sleep(0.5)
-
-        self.valves.get_flows()
-        time.sleep(0.1)
-        self.tank.get_level()
-        time.sleep(0.1)
-        self.tank.get_temperatures() 
+        # GET_ALL a todos los módulos y una sola espera (sweep.SweepScheduler)
+        snapshot = self.sweeper.run()
+        for name, error in snapshot.errors.items():
+            print(f"[SolarLoop] Error reading {name}: {error}")
+        # Los módulos que fallaron quedan vacíos en la fila; el resto se registra igual
+        pump1, heater1, heater2 = snapshot.fresh('pump1'), snapshot.fresh('heater1'), snapshot.fresh('heater2')
+        valves, tank = snapshot.fresh('valves'), snapshot.fresh('tank')
 
         now = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
 
-        # Try to find existing entry at this timestamp
-        existing_entry = next((d for d in shared_data_log if d["timestamp"] == timestamp), None)
-
         data = {
             'date': now.strftime('%Y-%m-%d'),
             'time': now.strftime('%H:%M:%S'),
             'timestamp': timestamp,
-            'power_pump1_%': self.pump1.power,
-            'flow_pump1_L/min': round(self.pump1.flow, 2),
-            'power_heater1_%': self.heater1.power,
-            'power_heater1_W': round((self.heater1.power * 40) / 100, 2),
-            'temp_heater1_in_°C': round(self.heater1.temp_in, 2),
-            'temp_heater1_out_°C': round(self.heater1.temp_out, 2),
-            'power_heater2_%': self.heater2.power,
-            'power_heater2_W': round((self.heater2.power * 40) / 100, 2),
-            'temp_heater2_out_°C': round(self.heater2.temp_out, 2),
-            'valve1_status': 'open' if self.valves.state_valve1 else 'close',
-            'flow_valve1_out_L/min': round(self.valves.flow_valve1_out, 2),
-            'valve2_status': 'open' if self.valves.state_valve2 else 'close',
-            'flow_valve2_out_L/min': round(self.valves.flow_valve2_out, 2),
-            'level_tank_cm': round(self.tank.level, 1),
-            'temp_tank_bottom_°C': round(self.tank.temp_bottom, 2),
-            'temp_tank_top_°C': round(self.tank.temp_top, 2)
+            'power_pump1_%': pump1['power'],
+            'flow_pump1_L/min': rounded(pump1['flow'], 2),
+            'power_heater1_%': heater1['power'],
+            'power_heater1_W': None if heater1['power'] is None else round((heater1['power'] * 40) / 100, 2),
+            'temp_heater1_in_°C': rounded(heater1['temp_in'], 2),
+            'temp_heater1_out_°C': rounded(heater1['temp_out'], 2),
+            'power_heater2_%': heater2['power'],
+            'power_heater2_W': None if heater2['power'] is None else round((heater2['power'] * 40) / 100, 2),
+            'temp_heater2_out_°C': rounded(heater2['temp_out'], 2),
+            'valve1_status': None if valves['state_valve1'] is None else ('open' if valves['state_valve1'] else 'close'),
+            'flow_valve1_out_L/min': rounded(valves['flow_valve1_out'], 2),
+            'valve2_status': None if valves['state_valve2'] is None else ('open' if valves['state_valve2'] else 'close'),
+            'flow_valve2_out_L/min': rounded(valves['flow_valve2_out'], 2),
+            'level_tank_cm': rounded(tank['level'], 1),
+            'temp_tank_bottom_°C': rounded(tank['temp_bottom'], 2),
+            'temp_tank_top_°C': rounded(tank['temp_top'], 2)
         }
 
-        if existing_entry:
-            existing_entry.update(data)
-        else:
-            shared_data_log.append(data)
+        log_shared_data(timestamp, data)
 
         if self.verbose:
             print("[SolarLoop] Logged data point.")
 
     # ---------- NEUE (ERSATZ-)FUNKTION: zeitbasierte Steuerung ----------
-    def run_synchronized_test(self, process_loop, duration_minutes, interval_seconds):
-        start_time = time.time()
-        end_time = start_time + duration_minutes * 60
-        next_time = start_time  # Zeitpunkt der nächsten Messung
-        i = 0
+    def run_synchronized_test(self, process_loop, duration_minutes, interval_seconds, policy="catch_up"):
+        """
+        Misst beide Loops alle interval_seconds (monotone Deadlines, ohne Drift).
+        :param policy: 'catch_up' (verpasste Messungen sofort nachholen, wie bisher) oder 'skip'
+        :return: scheduler.TickStats mit Jitter und Overruns
+        """
+        bus = get_bus()  # Uhr des Busses: echte Zeit oder plant_sim.SimClock
+        scheduler = PeriodicScheduler(interval_seconds, policy=policy, clock=bus.monotonic, sleep=bus.sleep)
 
         print(f"[SYNC] Starting synchronized test for {duration_minutes} minutes (interval {interval_seconds}s)")
 
-        while time.time() < end_time:
-            now = datetime.now()
-            timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+        for tick in scheduler.ticks(duration=duration_minutes * 60):
+            timestamp = datetime.fromtimestamp(bus.time()).strftime('%Y-%m-%d %H:%M:%S')
 
             # Messung SolarLoop
             self.append_to_data_log(timestamp)
-            time.sleep(0.1)  # kurzer Puffer
 
             # Messung ProcessLoop
             process_loop.append_to_data_log(timestamp)
 
-            i += 1
+            log_shared_data(timestamp, {
+                'tick_jitter_ms': round(tick.jitter * 1000, 3),
+                'tick_overruns': tick.overruns,
+                'tick_skipped': tick.skipped,
+            })
+
             if self.verbose or process_loop.verbose:
-                print(f"[SYNC] Measurement {i} at {timestamp}")
+                print(f"[SYNC] Measurement {tick.index + 1} at {timestamp} (jitter {tick.jitter * 1000:.1f} ms)")
 
-            # Berechne den exakten Zeitpunkt für die nächste Messung
-            next_time += interval_seconds
-            sleep_time = max(0, next_time - time.time())  # falls Messungen länger dauern als Interval, sofort weitermachen
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+        print(f"[SYNC] Timing: {scheduler.stats.as_dict()}")
+        return scheduler.stats
 
 # ----------------------------------------------------------------
 
@@ -147,6 +199,7 @@ class ProcessLoop:
         self.verbose = verbose
         self.pump2 = Pump(address=0x14)
         self.radiator1 = Radiator1()
+        self.sweeper = SweepScheduler({'pump2': self.pump2, 'radiator1': self.radiator1})
 
 
     def stop(self):
@@ -160,37 +213,37 @@ class ProcessLoop:
         self.radiator1.set_pwm_fan(value)
 
     def append_to_data_log(self, timestamp):
-        self.pump2.get_flow()  # Damit du auch die Pumpe im ProcessLoop abfragst
-        time.sleep(0.1)
-        self.radiator1.get_temperatures()
+        snapshot = self.sweeper.run()  # Damit du auch die Pumpe im ProcessLoop abfragst
+        for name, error in snapshot.errors.items():
+            print(f"[ProcessLoop] Error reading {name}: {error}")
+        pump2, radiator1 = snapshot.fresh('pump2'), snapshot.fresh('radiator1')
         
         now = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
 
-        existing_entry = next((d for d in shared_data_log if d["timestamp"] == timestamp), None)
-
         data = {
             'date': now.strftime('%Y-%m-%d'),
             'time': now.strftime('%H:%M:%S'),
             'timestamp': timestamp,
-            'power_pump2_%': self.pump2.power,
-            'flow_pump2_L/min': round(self.pump2.flow, 2),
-            'radiator_power_%': self.radiator1.power,
-            'temp_radiator1_in_°C': round(self.radiator1.temp_in, 2),
-            'temp_radiator1_out_°C': round(self.radiator1.temp_out, 2)
+            'power_pump2_%': pump2['power'],
+            'flow_pump2_L/min': rounded(pump2['flow'], 2),
+            'radiator_power_%': radiator1['power'],
+            'temp_radiator1_in_°C': rounded(radiator1['temp_in'], 2),
+            'temp_radiator1_out_°C': rounded(radiator1['temp_out'], 2)
         }
 
-        if existing_entry:
-            existing_entry.update(data)
-        else:
-            shared_data_log.append(data)
+        log_shared_data(timestamp, data)
 
         if self.verbose:
             print("[ProcessLoop] Logged data point.")
 
     def run_test(self, duration_minutes, interval_seconds):
         total = (duration_minutes * 60) // interval_seconds
-        for _ in range(total):
-            now = datetime.now()
+        bus = get_bus()
+        scheduler = PeriodicScheduler(interval_seconds, policy="catch_up", clock=bus.monotonic, sleep=bus.sleep)
+        for tick in scheduler.ticks(count=total):
+            now = datetime.fromtimestamp(bus.time())
             timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
             self.append_to_data_log(timestamp)
-            time.sleep(interval_seconds)
+            log_shared_data(timestamp, {'tick_jitter_ms': round(tick.jitter * 1000, 3),
+                                        'tick_overruns': tick.overruns, 'tick_skipped': tick.skipped})
+        return scheduler.stats
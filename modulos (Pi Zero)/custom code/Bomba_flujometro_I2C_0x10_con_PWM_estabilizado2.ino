@@ -5,6 +5,8 @@
 #define CMD_SET 0x01               // Comando para establecer un valor
 #define CMD_GET 0x02               // Comando para solicitar un valor
 #define RESP_FLOW 0x13             // Código de respuesta para el valor del flujo
+#define CMD_GET_ALL 0x04           // Comando para solicitar flujo + PWM en una sola trama
+#define RESP_ALL 0x16              // Código de respuesta para GET_ALL
 
 #define PUMP_PWM_PIN 23            // Pin PWM para la bomba
 const int sensorPin = 14;          // Pin del flujómetro
@@ -15,6 +17,7 @@ unsigned long lastMeasurement = 0;
 
 uint8_t value = 0;
 int pump_power = 0;
+uint8_t lastRequestCmd = 0;      // última orden recibida, decide la respuesta en requestEvent()
 
 //Inicializar el  PWM solo una vez en setup() en vez de en cada función:
 uint slice_num;
@@ -75,6 +78,8 @@ void receiveEvent(int bytes_msg) {
     uint8_t cmd = Wire.read();
     uint8_t len = Wire.read();
 
+    lastRequestCmd = cmd;
+
     if (cmd == CMD_SET && len == 1 && Wire.available()) {
         value = Wire.read();
         pump_power = constrain(value, 0, 100);
@@ -87,6 +92,16 @@ void receiveEvent(int bytes_msg) {
 void requestEvent() {
     uint16_t flowData = get_flowData();
 
+    if (lastRequestCmd == CMD_GET_ALL) {
+        // [ID, ALL, 3, flujo lo, flujo hi, PWM %]
+        uint8_t response_all[6] = {1, RESP_ALL, 3,
+                                   static_cast<uint8_t>(flowData & 0xFF),
+                                   static_cast<uint8_t>(flowData >> 8),
+                                   static_cast<uint8_t>(pump_power)};
+        Wire.write(response_all, 6);
+        return;
+    }
+
     uint8_t response[5] = {0};
     response[0] = 1;
     response[1] = RESP_FLOW;
@@ -10,6 +10,8 @@
 // Neue I2C-Befehle für PWM
 #define CMD_GET_PWM 0x03  // Befehl zum Abrufen des PWM-Werts
 #define RESP_PWM 0x15     // ID de respuesta para PWM
+#define CMD_GET_ALL 0x04  // temperatura + PWM en una sola trama
+#define RESP_ALL 0x16     // ID de respuesta para GET_ALL
 // Variable global de la última orden recibida
 uint8_t lastRequestCmd = 0;
 
@@ -99,6 +101,14 @@ void requestEvent() {
         Wire.write(response_pwm, 4);
         //Serial.print("PWM enviado: ");
         //Serial.println(heater_power);
+    } else if (lastRequestCmd == CMD_GET_ALL) {
+        uint16_t temp_out_scaled = static_cast<uint16_t>(temp_heater2_out * 100);
+        // [ID, ALL, 3, temp_out lo, temp_out hi, PWM %]
+        uint8_t response_all[6] = {1, RESP_ALL, 3,
+                                   (uint8_t)(temp_out_scaled & 0xFF),
+                                   (uint8_t)((temp_out_scaled >> 8) & 0xFF),
+                                   heater_power};
+        Wire.write(response_all, 6);
     } else if (lastRequestCmd == CMD_GET_TEMP) {
     uint16_t temp_heater2_out_scaled = static_cast<uint16_t>(temp_heater2_out * 100);
 
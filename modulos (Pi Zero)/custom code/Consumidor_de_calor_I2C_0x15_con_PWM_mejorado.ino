@@ -9,6 +9,8 @@
 #define RESP_TEMP       0x12
 #define CMD_GET_PWM     0x03
 #define RESP_PWM        0x15
+#define CMD_GET_ALL     0x04  // temperaturas + PWM en una sola trama
+#define RESP_ALL        0x16
 
 // guardar último orden
 uint8_t lastRequestCmd = 0;
@@ -99,6 +101,17 @@ void requestEvent() {
         Wire.write(response_pwm, 4);
         //Serial.print("PWM enviado: ");
         //Serial.println(fan_speed);
+    } else if (lastRequestCmd == CMD_GET_ALL) {
+        uint16_t temp_in_scaled = static_cast<uint16_t>(temp_radiator1_in * 100);
+        uint16_t temp_out_scaled = static_cast<uint16_t>(temp_radiator1_out * 100);
+        // [ID, ALL, 5, temp_in lo, temp_in hi, temp_out lo, temp_out hi, PWM %]
+        uint8_t response_all[8] = {1, RESP_ALL, 5,
+                                   (uint8_t)(temp_in_scaled & 0xFF),
+                                   (uint8_t)((temp_in_scaled >> 8) & 0xFF),
+                                   (uint8_t)(temp_out_scaled & 0xFF),
+                                   (uint8_t)((temp_out_scaled >> 8) & 0xFF),
+                                   fan_speed};
+        Wire.write(response_all, 8);
     } else if (lastRequestCmd == CMD_GET_TEMP) {
         uint16_t temp_radiator1_in_scaled = static_cast<uint16_t>(temp_radiator1_in * 100);
         uint16_t temp_radiator1_out_scaled = static_cast<uint16_t>(temp_radiator1_out * 100);
@@ -8,6 +8,8 @@
 #define CMD_GET_TEMP 0x02
 #define RESP_TEMP 0x12
 #define RESP_LEVEL 0x14
+#define CMD_GET_ALL 0x04  // temperaturas + distancia en una sola trama
+#define RESP_ALL 0x16
 
 // Definir SPI-Pins para sensopres MAX31865
 #define CS_SENSOR3 17 
@@ -159,6 +161,27 @@ void requestEvent() {
         //Serial.println(" °C");
     }
 
+    else if (last_cmd == CMD_GET_ALL) {
+        uint16_t temp_tank_bottom_scaled = static_cast<uint16_t>(temp_tank_bottom * 100);
+        uint16_t temp_tank_top_scaled = static_cast<uint16_t>(temp_tank_top * 100);
+        float rawDistance = measuredDistance;
+        if (rawDistance < 0) rawDistance = 0;
+        uint16_t distance_to_send = (uint16_t)(rawDistance * 10);
+
+        // [ID, ALL, 6, bottom lo, bottom hi, top lo, top hi, distancia lo, distancia hi]
+        uint8_t response[9] = {
+            0x00, RESP_ALL, 6,
+            (uint8_t)(temp_tank_bottom_scaled & 0xFF),
+            (uint8_t)((temp_tank_bottom_scaled >> 8) & 0xFF),
+            (uint8_t)(temp_tank_top_scaled & 0xFF),
+            (uint8_t)((temp_tank_top_scaled >> 8) & 0xFF),
+            (uint8_t)(distance_to_send & 0xFF),
+            (uint8_t)((distance_to_send >> 8) & 0xFF)
+        };
+
+        Wire.write(response, 9);
+    }
+
     else if (last_cmd == 0x03) { // Nivel del estanque
         //Serial.println("Sending raw distance response...");
         
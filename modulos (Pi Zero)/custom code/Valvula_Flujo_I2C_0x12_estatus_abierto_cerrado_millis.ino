@@ -7,6 +7,8 @@
 #define CMD_GET_VALVE_STATUS 0x03 // estatus de las valvulas
 #define RESP_FLOW     0x13  // respuesta para flujo
 #define RESP_VALVE_STATUS 0x14 // respuesta para valvulas
+#define CMD_GET_ALL   0x04  // flujos + estado de relés en una sola trama
+#define RESP_ALL      0x16  // respuesta para GET_ALL (con cabecera estándar de 3 bytes)
 
 // Pins para las válvulas
 #define RELAY_PIN_1 15
@@ -22,6 +24,7 @@ volatile uint16_t flowCount2 = 0;
 float flowRate1 = 0.0;
 float flowRate2 = 0.0;
 unsigned long lastMeasurement = 0;
+uint8_t lastCommand = 0;  // última orden recibida
 
 // Interrupt Service Routine para flujómetros
 void flow1ISR() {
@@ -97,7 +100,7 @@ void receiveEvent(int bytes_msg) {
         valve = Wire.read();  // Ventil-Daten lesen
     }
     
-    //lastCommand = cmd;
+    lastCommand = cmd;
 
     //Serial.print("Orden: ");
     //Serial.print(cmd);
@@ -130,6 +133,18 @@ void requestEvent() {
     if (digitalRead(RELAY_PIN_1)) valve_status |= 0x01;
     if (digitalRead(RELAY_PIN_2)) valve_status |= 0x02;
 
+    if (lastCommand == CMD_GET_ALL) {
+        // [ID, ALL, 5, flujo1 lo, flujo1 hi, flujo2 lo, flujo2 hi, estado]
+        uint8_t response_all[8] = {0, RESP_ALL, 5,
+                                   (uint8_t)(flow1_scaled & 0xFF),
+                                   (uint8_t)((flow1_scaled >> 8) & 0xFF),
+                                   (uint8_t)(flow2_scaled & 0xFF),
+                                   (uint8_t)((flow2_scaled >> 8) & 0xFF),
+                                   valve_status};
+        Wire.write(response_all, 8);
+        return;
+    }
+
     uint8_t response[7] = {0};
     response[0] = RESP_FLOW;
     response[1] = 5;